@@ -0,0 +1,108 @@
+# coding=utf-8
+
+"""
+比较声明式提取规则与基于xpaw Selector的逐条提取的耗时
+
+python benchmarks/bench_extraction.py [--pages N] [--results N]
+"""
+
+import time
+import random
+import argparse
+from urllib.request import urljoin
+
+from xpaw import Selector
+
+from metase.search_engines.baidu import Baidu
+from metase.search_engines.sogou import Sogou
+
+
+def selector_baidu(text):
+    selector = Selector(text)
+    for item in selector.css('div.result'):
+        title = item.css('h3>a')[0].text.strip()
+        text = None
+        abstract = item.css('div.c-abstract')
+        if len(abstract) > 0:
+            text = abstract[0].text.strip()
+        url = item.css('h3>a')[0].attr('href').strip()
+        if text is not None:
+            yield {'title': title, 'text': text, 'url': url}
+
+
+def selector_sogou(text):
+    selector = Selector(text)
+    for item in selector.css('div.vrwrap,div.rb'):
+        h = item.css('h3>a')
+        if len(h) <= 0:
+            continue
+        title = h[0].text.strip()
+        text = None
+        div_ft = item.css('div.ft')
+        if len(div_ft) > 0:
+            text = div_ft[0].text.strip()
+        else:
+            p_str = item.css('p.str_info')
+            if len(p_str) > 0:
+                text = p_str[0].text.strip()
+        url = urljoin('https://www.sogou.com/', item.css('h3>a')[0].attr('href').strip())
+        if text is not None:
+            yield {'title': title, 'text': text, 'url': url}
+
+
+def _words(n):
+    return ' '.join(random.choice(['meta', 'search', 'engine', '搜索', '引擎', 'python', 'result']) for _ in range(n))
+
+
+def baidu_page(results):
+    items = []
+    for i in range(results):
+        items.append('<div class="result c-container"><h3 class="t"><a href="http://www.baidu.com/link?url={}">'
+                     '{}</a></h3><div class="c-abstract"><span>{}</span> {}</div>'
+                     '<div class="f13"><span class="c-showurl">www.example.com</span></div></div>'
+                     .format(i, _words(6), _words(3), _words(30)))
+    return '<html><head><title>baidu</title></head><body><div id="content_left">{}</div>{}</body></html>' \
+        .format(''.join(items), '<div class="nav">{}</div>'.format(_words(200)))
+
+
+def sogou_page(results):
+    items = []
+    for i in range(results):
+        if i % 2 == 0:
+            body = '<div class="ft">{}</div>'.format(_words(30))
+        else:
+            body = '<p class="str_info">{}</p>'.format(_words(30))
+        items.append('<div class="vrwrap"><h3 class="vrTitle"><a href="/link?url={}">{}</a></h3>{}</div>'
+                     .format(i, _words(6), body))
+    return '<html><body><div class="results">{}</div></body></html>'.format(''.join(items))
+
+
+def bench(func, pages):
+    start_time = time.perf_counter()
+    records = 0
+    for p in pages:
+        records += len(list(func(p)))
+    return time.perf_counter() - start_time, records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--results', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cases = [
+        ('Baidu', [baidu_page(args.results) for _ in range(args.pages)], selector_baidu, Baidu.extraction.extract),
+        ('Sogou', [sogou_page(args.results) for _ in range(args.pages)], selector_sogou, Sogou.extraction.extract),
+    ]
+    for name, pages, legacy, rule in cases:
+        assert list(legacy(pages[0])) == list(rule(pages[0]))
+        t1, n1 = bench(legacy, pages)
+        t2, n2 = bench(rule, pages)
+        print('{:<8} selector: {:8.1f} pages/s ({} records)   rule: {:8.1f} pages/s ({} records)   speedup: {:.2f}x'
+              .format(name, len(pages) / t1, n1, len(pages) / t2, n2, t1 / t2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# coding=utf-8
+
+"""
+比较一次遍历的合并与原有合并排序流程的耗时，以及URL规范化和近似重复检测的额外耗时
+
+单次计时受机器负载影响较大，每种流程计时repeat轮取最短耗时
+
+python benchmarks/bench_merge.py [--engines N] [--results N] [--overlap R] [--rounds N] [--repeat N]
+"""
+
+import copy
+import math
+import time
+import random
+import argparse
+
+from metase.merge import merge_results, rank_results
+from metase.ranking import DefaultFuser
+from metase.dedup import canonicalize_url, NearDuplicateIndex
+from metase.config import DEFAULT_CONFIG
+
+
+_VOCABULARY = ['meta', 'search', 'engine', '搜索', '引擎', 'python', 'result', 'merge', 'rank', '结果', '合并',
+               'news', 'weather', 'map', 'video', 'image', '新闻', '天气', '地图', '视频']
+
+
+def legacy_merge(results, importance):
+    for s in results:
+        records = results[s]
+        for i in range(len(records)):
+            loc_score = (math.sqrt(i + 1) + 2) / (math.sqrt(i + 1))
+            records[i]['relevance'] = importance[s] * loc_score
+    mm = {}
+    for s in results:
+        for r in results[s]:
+            url = r['url']
+            relevance = r['relevance']
+            if url in mm:
+                o = mm[url]
+                if s not in o['record']['sources']:
+                    o['record']['relevance'] += relevance
+                    o['record']['sources'].append(s)
+                    if relevance > o['relevance']:
+                        o['relevance'] = relevance
+                        o['record']['title'] = r['title']
+                        o['record']['text'] = r['text']
+            else:
+                r['sources'] = [s]
+                mm[url] = {'record': r, 'relevance': relevance}
+    res = [o['record'] for o in mm.values()]
+    if len(res) > 0:
+        res.sort(key=lambda x: x['relevance'], reverse=True)
+        max_relevance = res[0]['relevance']
+        for i in range(len(res)):
+            res[i]['id'] = i + 1
+            relevance = math.ceil(res[i]['relevance'] * 10 / max_relevance)
+            if relevance > 10:
+                relevance = 10
+            res[i]['relevance'] = relevance
+    counts = {}
+    for s in results:
+        records = 0
+        for r in res:
+            if s in r['sources']:
+                records += 1
+        counts[s] = records
+    return res, counts
+
+
+_fuser = DefaultFuser({})
+
+
+def single_pass_merge(results, importance):
+    records, counts = merge_results(results, _fuser, importance)
+    return rank_results(records), counts
+
+
+def dedup_merge(results, importance, limit=None):
+    records, counts = merge_results(results, _fuser, importance, url_key=canonicalize_url,
+                                    near_duplicate=NearDuplicateIndex(), near_duplicate_limit=limit)
+    return rank_results(records), counts
+
+
+def limited_dedup_merge(results, importance):
+    return dedup_merge(results, importance, limit=DEFAULT_CONFIG['near_duplicate_max_records'])
+
+
+def _words(n):
+    return ' '.join(random.choice(_VOCABULARY) for _ in range(n))
+
+
+def make_results(engines, results, overlap):
+    shared = ['http://www.example.com/shared/{}'.format(i) for i in range(results)]
+    res = {}
+    for e in range(engines):
+        name = 'Engine{}'.format(e)
+        records = []
+        for i in range(results):
+            if random.random() < overlap:
+                url = random.choice(shared)
+            else:
+                url = 'http://www.example.com/{}/{}'.format(name, i)
+            records.append({'title': _words(6), 'text': _words(30), 'url': url})
+        res[name] = records
+    return res
+
+
+def bench(func, cases, importance, repeat=15):
+    best = None
+    for _ in range(repeat):
+        data = copy.deepcopy(cases)
+        start_time = time.perf_counter()
+        for c in data:
+            func(c, importance)
+        t = time.perf_counter() - start_time
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engines', type=int, default=8)
+    parser.add_argument('--results', type=int, default=500)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cases = [make_results(args.engines, args.results, args.overlap) for _ in range(args.rounds)]
+    importance = {s: random.randint(1, 3) for s in cases[0]}
+    assert legacy_merge(copy.deepcopy(cases[0]), importance) == single_pass_merge(copy.deepcopy(cases[0]), importance)
+    t1 = bench(legacy_merge, cases, importance, repeat=args.repeat)
+    t2 = bench(single_pass_merge, cases, importance, repeat=args.repeat)
+    t3 = bench(dedup_merge, cases, importance, repeat=1)
+    t4 = bench(limited_dedup_merge, cases, importance, repeat=1)
+    print('{} engines x {} results   legacy: {:8.2f} ms/merge   single pass: {:8.2f} ms/merge   speedup: {:.2f}x'
+          .format(args.engines, args.results, t1 * 1000 / args.rounds, t2 * 1000 / args.rounds, t1 / t2))
+    print('with URL canonicalization and near-duplicate detection: {:8.2f} ms/merge'.format(t3 * 1000 / args.rounds))
+    print('near-duplicate detection limited to top {} records:      {:8.2f} ms/merge'
+          .format(DEFAULT_CONFIG['near_duplicate_max_records'], t4 * 1000 / args.rounds))
+
+
+if __name__ == '__main__':
+    main()
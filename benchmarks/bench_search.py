@@ -0,0 +1,182 @@
+# coding=utf-8
+
+"""
+端到端的元搜索压测：启动模拟搜索引擎服务、若干slave节点和一个master节点，并发发送检索请求，
+统计吞吐量、延迟的p50/p90/p99以及master和slave节点每次检索消耗的CPU时间
+
+slave节点通过url_rewrites将搜索引擎的请求转发到模拟服务，master节点关闭结果缓存，每个查询词只使用一次
+
+python benchmarks/bench_search.py [--slaves N] [--queries N] [--concurrency N] [--sources S]
+    [--latency SECONDS] [--error-rate R] [--ban-rate R]
+"""
+
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from urllib.parse import urlencode
+
+from tornado.httpclient import AsyncHTTPClient, HTTPError
+
+from metase.run import run_server
+from mock_engines import Behavior, run_mock_engines, url_rewrites
+
+HOST = '127.0.0.1'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Port {} is not ready'.format(port))
+
+
+def cpu_time(pid):
+    """
+    :return: 进程的用户态和内核态CPU时间之和，只支持Linux
+    """
+    try:
+        with open('/proc/{}/stat'.format(pid)) as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if len(values) == 0:
+        return 0
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def server_config(port, **kwargs):
+    config = {
+        'host': HOST,
+        'port': port,
+        'log_level': 'warning',
+        # 只有部分搜索引擎的主页指向模拟服务，避免压测期间访问真实的搜索引擎主页
+        'cookie_refresh_interval': 10 ** 9
+    }
+    config.update(kwargs)
+    return config
+
+
+async def search(client, port, query, sources, data_source_results, stats):
+    url = 'http://{}:{}/api/v1/search?{}'.format(HOST, port, urlencode(
+        {'query': query, 'sources': sources, 'data_source_results': data_source_results}))
+    start_time = time.time()
+    try:
+        resp = await client.fetch(url, request_timeout=60)
+    except HTTPError as e:
+        stats['errors'] += 1
+        stats['status'][e.code] = stats['status'].get(e.code, 0) + 1
+        return
+    stats['latency'].append(time.time() - start_time)
+    data = json.loads(resp.body.decode('utf-8'))
+    stats['records'] += len(data['records'])
+
+
+async def run_load(port, queries, concurrency, sources, data_source_results, prefix):
+    client = AsyncHTTPClient(max_clients=concurrency, force_instance=True)
+    stats = {'latency': [], 'errors': 0, 'status': {}, 'records': 0}
+    queue = asyncio.Queue()
+    for i in range(queries):
+        queue.put_nowait('{} query {}'.format(prefix, i))
+
+    async def worker():
+        while not queue.empty():
+            query = queue.get_nowait()
+            await search(client, port, query, sources, data_source_results, stats)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    client.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--slaves', type=int, default=2)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--sources', default='Baidu,Google,Sogou,Bing')
+    parser.add_argument('--data-source-results', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--ban-rate', type=float, default=0.0)
+    parser.add_argument('--max-results', type=int, default=200)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    behavior = Behavior(latency=args.latency, latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+                        ban_rate=args.ban_rate, max_results=args.max_results)
+    mock_port = free_port()
+    rewrites = url_rewrites('{}:{}'.format(HOST, mock_port))
+    slave_ports = [free_port() for _ in range(args.slaves)]
+    master_port = free_port()
+
+    mock = ctx.Process(target=run_mock_engines, args=(mock_port, behavior, HOST), daemon=True)
+    slaves = [ctx.Process(target=run_server, daemon=True,
+                          args=(server_config(p, only_slave=True, url_rewrites=rewrites, page_cache_size=0),))
+              for p in slave_ports]
+    master = ctx.Process(target=run_server, daemon=True,
+                         args=(server_config(master_port, result_cache_size=0,
+                                             slaves=[{'address': '{}:{}'.format(HOST, p), 'allow': args.sources}
+                                                     for p in slave_ports]),))
+    processes = [mock, master] + slaves
+    for p in processes:
+        p.start()
+    try:
+        for port in [mock_port, master_port] + slave_ports:
+            wait_port(port)
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(run_load(master_port, args.warmup, args.concurrency, args.sources,
+                                         args.data_source_results, 'warmup'))
+        cpu_before = [cpu_time(p.pid) for p in [master] + slaves]
+        start_time = time.time()
+        stats = loop.run_until_complete(run_load(master_port, args.queries, args.concurrency, args.sources,
+                                                 args.data_source_results, 'bench'))
+        elapsed = time.time() - start_time
+        cpu_after = [cpu_time(p.pid) for p in [master] + slaves]
+    finally:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.join()
+
+    latency = stats['latency']
+    print('{} queries, concurrency {}, {} slaves, sources {}, mock latency {}s, error rate {}, ban rate {}'
+          .format(args.queries, args.concurrency, args.slaves, args.sources, args.latency, args.error_rate,
+                  args.ban_rate))
+    print('throughput: {:8.1f} queries/s   errors: {} {}'.format(len(latency) / elapsed, stats['errors'],
+                                                                   stats['status'] or ''))
+    print('latency:    p50 {:8.1f} ms   p90 {:8.1f} ms   p99 {:8.1f} ms'
+          .format(percentile(latency, 50) * 1000, percentile(latency, 90) * 1000, percentile(latency, 99) * 1000))
+    print('records:    {:8.1f} per query'.format(stats['records'] / max(len(latency), 1)))
+    if None in cpu_before or None in cpu_after:
+        print('cpu:        not available on {}'.format(sys.platform))
+    else:
+        used = [a - b for a, b in zip(cpu_after, cpu_before)]
+        print('cpu:        master {:6.2f} ms/query   slaves {:6.2f} ms/query'
+              .format(used[0] * 1000 / args.queries, sum(used[1:]) * 1000 / args.queries))
+
+
+if __name__ == '__main__':
+    main()
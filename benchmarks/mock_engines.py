@@ -0,0 +1,224 @@
+# coding=utf-8
+
+"""
+模拟搜索引擎的本地服务，返回与Baidu、Google、Sogou、Bing结构相同的检索页和获取真实URL的跳转
+
+所有搜索引擎共用一个端口，通过路径前缀区分，slave节点的url_rewrites将搜索引擎的地址指向该服务。
+同一个查询词在各个搜索引擎中的检索结果部分重叠，超过max_results后返回空页；
+每个请求按照配置的分布模拟延迟、服务端错误和BAN
+
+python benchmarks/mock_engines.py [--port PORT] [--latency SECONDS] [--error-rate R] [--ban-rate R]
+"""
+
+import zlib
+import random
+import asyncio
+import argparse
+from urllib.parse import quote
+
+from tornado.web import Application, RequestHandler
+from tornado.ioloop import IOLoop
+
+_VOCABULARY = ['meta', 'search', 'engine', '搜索', '引擎', 'python', 'result', 'merge', 'rank', '结果', '合并',
+               'news', 'weather', 'map', 'video', 'image', '新闻', '天气', '地图', '视频']
+
+# 搜索引擎代号: (检索页路径, 分页参数, 分页参数的含义, 每页检索结果数量)
+ENGINES = {
+    'Baidu': ('/s', 'pn', 'offset', 10),
+    'Google': ('/search', 'start', 'offset1', 10),
+    'Sogou': ('/web', 'page', 'page', 20),
+    'Bing': ('/search', 'first', 'offset1', 10)
+}
+
+# 搜索引擎代号: (slave节点请求的URL前缀, 模拟服务的路径前缀)
+URL_PREFIXES = {
+    'Baidu': ('http://www.baidu.com/', '/baidu/'),
+    'Google': ('https://www.google.com.hk/', '/google/'),
+    'Sogou': ('https://www.sogou.com/', '/sogou/'),
+    'Bing': ('https://www.bing.com/', '/bing/')
+}
+
+
+def url_rewrites(address):
+    """
+    :return: slave节点的url_rewrites配置
+    """
+    return {p: 'http://{}{}'.format(address, path) for p, path in URL_PREFIXES.values()}
+
+
+class Behavior:
+    """
+    latency: 延迟的中位数，按对数正态分布抽样
+    latency_sigma: 对数正态分布的sigma
+    error_rate: 返回500的比例
+    ban_rate: 返回403的比例
+    max_results: 每个查询词的检索结果总数
+    overlap: 检索结果来自各个搜索引擎共享的URL集合的比例
+    """
+
+    def __init__(self, latency=0.05, latency_sigma=0.5, error_rate=0.0, ban_rate=0.0, max_results=200,
+                 overlap=0.3):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.ban_rate = ban_rate
+        self.max_results = max_results
+        self.overlap = overlap
+
+    def delay(self):
+        if self.latency <= 0:
+            return 0
+        return min(random.lognormvariate(0, self.latency_sigma) * self.latency, self.latency * 20)
+
+    def failure(self):
+        """
+        :return: 需要模拟的错误状态码，None表示正常返回
+        """
+        r = random.random()
+        if r < self.error_rate:
+            return 500
+        if r < self.error_rate + self.ban_rate:
+            return 403
+        return None
+
+
+def _words(rng, n):
+    return ' '.join(rng.choice(_VOCABULARY) for _ in range(n))
+
+
+def make_records(name, query, offset, size, behavior):
+    """
+    根据搜索引擎、查询词和位置确定性地生成检索结果
+    """
+    records = []
+    qid = zlib.crc32(query.encode('utf-8'))
+    for i in range(offset, min(offset + size, behavior.max_results)):
+        rng = random.Random('{}:{}:{}'.format(name, qid, i))
+        if rng.random() < behavior.overlap:
+            url = 'http://site{}.example.com/{}/{}'.format(rng.randint(0, 9), qid, i + rng.randint(0, 5))
+            rng = random.Random(url)
+        else:
+            url = 'http://{}.example.com/{}/{}'.format(name.lower(), qid, i)
+        records.append((_words(rng, 6), _words(rng, 30), url))
+    return records
+
+
+def baidu_page(records):
+    items = ''.join('<div class="result c-container"><h3 class="t"><a href="http://www.baidu.com/link?url={}">'
+                    '{}</a></h3><div class="c-abstract">{}</div></div>'.format(quote(url, safe=''), title, text)
+                    for title, text, url in records)
+    return '<html><body><div id="content_left">{}</div></body></html>'.format(items)
+
+
+def google_page(records):
+    items = ''.join('<div class="g"><div class="r"><a href="{}"><h3>{}</h3></a></div>'
+                    '<div class="s"><span class="st">{}</span></div></div>'.format(url, title, text)
+                    for title, text, url in records)
+    return '<html><body><div id="search">{}</div></body></html>'.format(items)
+
+
+def sogou_page(records):
+    items = ''.join('<div class="vrwrap"><h3 class="vrTitle"><a href="/link?url={}">{}</a></h3>'
+                    '<div class="ft">{}</div></div>'.format(quote(url, safe=''), title, text)
+                    for title, text, url in records)
+    return '<html><body><div class="results">{}</div></body></html>'.format(items)
+
+
+def bing_page(records):
+    items = ''.join('<li class="b_algo"><h2><a href="{}">{}</a></h2><div class="b_caption"><p>{}</p></div></li>'
+                    .format(url, title, text) for title, text, url in records)
+    return '<html><body><ol id="b_results">{}</ol></body></html>'.format(items)
+
+
+PAGE_RENDERERS = {
+    'Baidu': baidu_page,
+    'Google': google_page,
+    'Sogou': sogou_page,
+    'Bing': bing_page
+}
+
+
+class MockHandler(RequestHandler):
+    def initialize(self, name, behavior):
+        self.name = name
+        self.behavior = behavior
+
+    async def simulate(self):
+        """
+        :return: 是否已经返回了错误
+        """
+        await asyncio.sleep(self.behavior.delay())
+        status = self.behavior.failure()
+        if status is not None:
+            self.send_error(status)
+            return True
+        return False
+
+
+class SearchPageHandler(MockHandler):
+    async def get(self):
+        if await self.simulate():
+            return
+        _, param, kind, size = ENGINES[self.name]
+        query = self.get_argument('wd', default=None) or self.get_argument('q', default=None) \
+            or self.get_argument('query', default='')
+        value = int(self.get_argument(param, default='0' if kind == 'offset' else '1'))
+        if kind == 'offset':
+            offset = value
+        elif kind == 'offset1':
+            offset = value - 1
+        else:
+            offset = (value - 1) * size
+        records = make_records(self.name, query, offset, size, self.behavior)
+        self.set_header('Content-Type', 'text/html; charset=utf-8')
+        self.write(PAGE_RENDERERS[self.name](records))
+
+
+class RedirectHandler(MockHandler):
+    async def get(self):
+        if await self.simulate():
+            return
+        self.redirect(self.get_argument('url'))
+
+
+class HomepageHandler(MockHandler):
+    def get(self):
+        self.set_cookie('MOCKID', str(random.randint(0, 1 << 30)))
+        self.write('<html><body>{}</body></html>'.format(self.name))
+
+
+def make_app(behavior):
+    handlers = []
+    for name, (search_path, _, _, _) in ENGINES.items():
+        path = URL_PREFIXES[name][1]
+        kwargs = dict(name=name, behavior=behavior)
+        handlers.append((path.rstrip('/') + search_path, SearchPageHandler, kwargs))
+        handlers.append((path + 'link', RedirectHandler, kwargs))
+        handlers.append((path, HomepageHandler, kwargs))
+    return Application(handlers)
+
+
+def run_mock_engines(port, behavior, host='127.0.0.1'):
+    make_app(behavior).listen(port, host)
+    IOLoop.current().start()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=9400)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--ban-rate', type=float, default=0.0)
+    parser.add_argument('--max-results', type=int, default=200)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    args = parser.parse_args()
+
+    behavior = Behavior(latency=args.latency, latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+                        ban_rate=args.ban_rate, max_results=args.max_results, overlap=args.overlap)
+    print('url_rewrites = {!r}'.format(url_rewrites('127.0.0.1:{}'.format(args.port))))
+    run_mock_engines(args.port, behavior)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# coding=utf-8
+
+import time
+import random
+
+
+class SlaveHealth:
+    """
+    记录slave节点的负载和健康状况
+
+    in_flight: 正在处理的下载任务数
+    latency: 下载任务耗时的指数加权移动平均
+    error_rate: 每个搜索引擎下载任务失败率的指数加权移动平均
+    """
+
+    def __init__(self, config):
+        self.decay = config.get('slave_ewma_decay')
+        self.eject_error_rate = config.get('slave_eject_error_rate')
+        self.eject_min_requests = config.get('slave_eject_min_requests')
+        self.eject_time = config.get('slave_eject_time')
+        self.in_flight = 0
+        self.latency = None
+        self.error_rate = {}
+        self.requests = {}
+        self.ejected_until = {}
+
+    def on_start(self):
+        self.in_flight += 1
+
+    def on_finish(self, name, latency=None, error=False):
+        """
+        :param latency: 任务耗时，任务被取消时为None
+        """
+        self.in_flight -= 1
+        if latency is None:
+            return
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.decay * (latency - self.latency)
+        rate = self.error_rate.get(name, 0)
+        rate += self.decay * ((1 if error else 0) - rate)
+        self.error_rate[name] = rate
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if error and rate >= self.eject_error_rate and self.requests[name] >= self.eject_min_requests \
+                and not self.is_ejected(name):
+            self.ejected_until[name] = time.time() + self.eject_time
+            # 恢复后给予重新证明自己的机会
+            self.error_rate[name] = self.eject_error_rate / 2
+            self.requests[name] = 0
+
+    def is_ejected(self, name):
+        t = self.ejected_until.get(name)
+        if t is None:
+            return False
+        if time.time() >= t:
+            del self.ejected_until[name]
+            return False
+        return True
+
+    def score(self, name):
+        """
+        负载评分，越小越好
+        """
+        latency = self.latency if self.latency is not None else 0
+        return (self.in_flight + 1) * (latency + 0.001) * (1 + 10 * self.error_rate.get(name, 0))
+
+
+class SlaveSelector:
+    """
+    为下载任务选择slave节点
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def select(self, slaves, name, exclude=None):
+        """
+        :param slaves: 允许处理该搜索引擎的slave节点
+        :param name: 搜索引擎代号
+        :param exclude: 不能选择的slave节点
+        :return: 选择的slave节点，没有可用的节点时返回None
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def candidates(slaves, name, exclude=None):
+        res = [s for s in slaves if s is not exclude]
+        healthy = [s for s in res if not s.health.is_ejected(name)]
+        # 所有节点都被剔除时依然选择其中之一
+        return healthy or res
+
+
+class RandomSelector(SlaveSelector):
+    def select(self, slaves, name, exclude=None):
+        candidates = self.candidates(slaves, name, exclude=exclude)
+        if len(candidates) <= 0:
+            return
+        return random.choice(candidates)
+
+
+class PowerOfTwoSelector(SlaveSelector):
+    """
+    随机选择两个节点，选择其中负载评分较低的节点
+    """
+
+    def select(self, slaves, name, exclude=None):
+        candidates = self.candidates(slaves, name, exclude=exclude)
+        if len(candidates) <= 0:
+            return
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = random.sample(candidates, 2)
+        if b.health.score(name) < a.health.score(name):
+            return b
+        return a
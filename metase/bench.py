@@ -0,0 +1,195 @@
+# coding=utf-8
+
+"""
+离线评测搜索引擎的检索结果提取
+
+语料库中每个搜索引擎一个目录，目录名为搜索引擎代号，目录中保存检索页的HTML，
+同名的JSON文件为可选的元信息：
+
+    corpus/
+        Baidu/
+            python.html
+            python.json
+        Sogou/
+            ...
+
+元信息的字段：
+    url: 检索页的URL
+    status: HTTP状态码，默认为200
+    encoding: 网页编码，默认根据网页内容判断
+    min_records: 至少应提取的检索结果数量，默认为1
+
+对每个检索页调用搜索引擎的extract_results，统计每秒处理的检索页数量、每个检索页提取时的内存峰值和各个字段的提取数量，
+提取的检索结果少于min_records的检索页通常意味着搜索引擎修改了页面结构。
+内存峰值由tracemalloc统计，只包括Python对象的内存，不包括lxml在C层分配的内存
+"""
+
+import os
+import json
+import time
+import logging
+import tracemalloc
+from os.path import join, isdir, splitext
+
+from xpaw import HttpResponse, HttpHeaders
+
+log = logging.getLogger(__name__)
+
+
+class CorpusPage:
+    def __init__(self, name, path, body, url=None, status=200, encoding=None, min_records=1):
+        self.name = name
+        self.path = path
+        self.body = body
+        self.url = url or 'file://{}'.format(os.path.abspath(path))
+        self.status = status
+        self.encoding = encoding
+        self.min_records = min_records
+
+    def response(self):
+        """
+        :return: 每次返回新的response，避免复用已解码的文本
+        """
+        headers = HttpHeaders({'Content-Type': 'text/html'})
+        return HttpResponse(self.url, self.status, body=self.body, headers=headers, encoding=self.encoding)
+
+
+def load_corpus(path, search_engines):
+    """
+    :param path: 语料库目录
+    :param search_engines: 搜索引擎代号到搜索引擎的dict，只加载其中的搜索引擎
+    :return: 搜索引擎代号到检索页列表的dict
+    """
+    corpus = {}
+    for name in sorted(os.listdir(path)):
+        d = join(path, name)
+        if not isdir(d):
+            continue
+        if name not in search_engines:
+            log.warning('Unknown search engine in corpus: %s', name)
+            continue
+        pages = []
+        for fname in sorted(os.listdir(d)):
+            base, ext = splitext(fname)
+            if ext not in ('.html', '.htm'):
+                continue
+            with open(join(d, fname), 'rb') as f:
+                body = f.read()
+            meta = {}
+            meta_file = join(d, base + '.json')
+            if os.path.isfile(meta_file):
+                with open(meta_file, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            pages.append(CorpusPage(name, join(d, fname), body,
+                                    url=meta.get('url'),
+                                    status=meta.get('status', 200),
+                                    encoding=meta.get('encoding'),
+                                    min_records=meta.get('min_records', 1)))
+        corpus[name] = pages
+    return corpus
+
+
+class EngineReport:
+    """
+    一个搜索引擎的评测结果
+
+    pages: 检索页数量
+    records: 提取的检索结果数量
+    seconds: 提取全部检索页的最短耗时
+    peak_memory: 每个检索页提取时内存峰值的列表，单位为字节
+    fields: 字段名到非空取值数量的dict
+    failures: (检索页路径, 原因)的列表
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.pages = 0
+        self.records = 0
+        self.seconds = None
+        self.peak_memory = []
+        self.fields = {}
+        self.failures = []
+
+    @property
+    def pages_per_second(self):
+        if not self.seconds:
+            return 0
+        return self.pages / self.seconds
+
+
+def bench_engine(search_engine, pages, repeat=3, trace_memory=True):
+    """
+    :param repeat: 计时的轮数，取最短耗时
+    :param trace_memory: 是否使用tracemalloc统计内存峰值，统计内存时单独提取一轮，不影响计时
+    """
+    report = EngineReport(search_engine.name)
+    report.pages = len(pages)
+    for p in pages:
+        try:
+            records = list(search_engine.extract_results(p.response()))
+        except Exception as e:
+            report.failures.append((p.path, 'error: {}'.format(e)))
+            continue
+        report.records += len(records)
+        for r in records:
+            for k, v in r.items():
+                report.fields.setdefault(k, 0)
+                if v:
+                    report.fields[k] += 1
+        if len(records) < p.min_records:
+            report.failures.append((p.path, '{} records, expected at least {}'.format(len(records), p.min_records)))
+
+    for _ in range(repeat):
+        responses = [p.response() for p in pages]
+        start_time = time.perf_counter()
+        for resp in responses:
+            try:
+                list(search_engine.extract_results(resp))
+            except Exception:
+                pass
+        t = time.perf_counter() - start_time
+        if report.seconds is None or t < report.seconds:
+            report.seconds = t
+
+    if trace_memory:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            for p in pages:
+                resp = p.response()
+                tracemalloc.clear_traces()
+                try:
+                    list(search_engine.extract_results(resp))
+                except Exception:
+                    pass
+                report.peak_memory.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+    return report
+
+
+def run_benchmark(search_engines, corpus, repeat=3, trace_memory=True):
+    """
+    :return: 各个搜索引擎的EngineReport列表
+    """
+    return [bench_engine(search_engines[name], pages, repeat=repeat, trace_memory=trace_memory)
+            for name, pages in corpus.items()]
+
+
+def format_reports(reports):
+    lines = []
+    for r in reports:
+        line = '{:<10} {:>5} pages {:>10.1f} pages/s {:>7} records'.format(r.name, r.pages, r.pages_per_second,
+                                                                           r.records)
+        if r.peak_memory:
+            line += '   peak memory: avg {:.1f} KiB, max {:.1f} KiB'.format(
+                sum(r.peak_memory) / len(r.peak_memory) / 1024, max(r.peak_memory) / 1024)
+        lines.append(line)
+        if r.fields:
+            lines.append('           fields: {}'.format(', '.join('{} {}/{}'.format(k, v, r.records)
+                                                               for k, v in sorted(r.fields.items()))))
+        for path, reason in r.failures:
+            lines.append('           FLAGGED {}: {}'.format(path, reason))
+    return '\n'.join(lines)
@@ -0,0 +1,214 @@
+# coding=utf-8
+
+import time
+import json
+import sqlite3
+from collections import OrderedDict
+
+
+def estimate_size(obj):
+    """
+    粗略估计对象占用的内存字节数，用于限制缓存的内存大小
+    """
+    if isinstance(obj, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return 56 + sum(estimate_size(i) for i in obj)
+    if isinstance(obj, str):
+        return 49 + len(obj)
+    if isinstance(obj, bytes):
+        return 33 + len(obj)
+    return 24
+
+
+class LRUCache:
+    """
+    带有过期时间的LRU缓存，按照估计的内存大小淘汰最久未使用的条目
+
+    max_size: 缓存的最大字节数
+    ttl: 默认的过期时间（秒）
+    sizeof: 估计条目大小的函数
+
+    缓存的值不能为None
+    """
+
+    def __init__(self, max_size, ttl=None, sizeof=estimate_size):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not None
+
+    def get(self, key, default=None, count=True):
+        value, stale = self.get_stale(key, count=count)
+        if value is None or stale:
+            return default
+        return value
+
+    def get_stale(self, key, grace=0, count=True):
+        """
+        查询缓存，允许返回过期时间不超过grace秒的条目
+        :return: (value, stale)，stale表示条目是否已经过期
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expire_time, _ = entry
+            now = time.time()
+            if expire_time is None or now < expire_time:
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value, False
+            if now < expire_time + grace:
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value, True
+            self._remove(key)
+        if count:
+            self.misses += 1
+        return None, False
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+        if key in self._data:
+            self._remove(key)
+        expire_time = time.time() + ttl if ttl is not None else None
+        self._data[key] = (value, expire_time, size)
+        self.size += size
+        while self.size > self.max_size:
+            self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        if key in self._data:
+            self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self.size -= size
+
+
+class SqliteCache:
+    """
+    基于SQLite的持久化缓存，同一台机器上的多个进程可以共享
+
+    path: 数据库文件路径
+    ttl: 默认的过期时间（秒）
+    max_entries: 最多保存的条目数，超出时删除最早过期的条目，None表示不限制
+    purge_interval: 写入时清理过期条目的最小间隔（秒）
+
+    缓存的值需要能够序列化为JSON，不能为None。
+    读写都是同步的SQLite操作，在IOLoop中调用时会阻塞IOLoop，其他进程持有写锁时最多等待1秒
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None, purge_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        self._conn = sqlite3.connect(path, timeout=1, isolation_level=None)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expire_time REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS cache_expire_time ON cache (expire_time)')
+        self.purge()
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def get(self, key, default=None):
+        value, _ = self.get_with_expire_time(key)
+        if value is None:
+            return default
+        return value
+
+    def get_with_expire_time(self, key):
+        """
+        :return: (value, expire_time)，未命中时value为None，expire_time为None表示不会过期
+        """
+        row = self._conn.execute('SELECT value, expire_time FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None, None
+        value, expire_time = row
+        if expire_time is not None and time.time() >= expire_time:
+            self.delete(key)
+            return None, None
+        return json.loads(value), expire_time
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expire_time = time.time() + ttl if ttl is not None else None
+        self._conn.execute('INSERT OR REPLACE INTO cache (key, value, expire_time) VALUES (?, ?, ?)',
+                           (key, json.dumps(value), expire_time))
+        if time.time() - self._last_purge_time >= self.purge_interval:
+            self.purge()
+
+    def purge(self):
+        """
+        删除过期的条目，条目数超过max_entries时删除最早过期的条目
+        """
+        now = time.time()
+        self._last_purge_time = now
+        self._conn.execute('DELETE FROM cache WHERE expire_time <= ?', (now,))
+        if self.max_entries is not None:
+            n = len(self) - self.max_entries
+            if n > 0:
+                # 不会过期的条目最后删除
+                self._conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                                   'ORDER BY expire_time IS NULL, expire_time LIMIT ?)', (n,))
+
+    def delete(self, key):
+        self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._conn.execute('DELETE FROM cache')
+
+    def close(self):
+        self._conn.close()
+
+
+class LayeredCache:
+    """
+    两级缓存，先查询内存中的缓存，未命中时查询共享的缓存，
+    共享缓存中的条目以剩余的过期时间加入内存中的缓存
+
+    memory: 内存中的缓存，例如LRUCache
+    shared: 共享的缓存，例如SqliteCache
+    """
+
+    def __init__(self, memory, shared=None):
+        self.memory = memory
+        self.shared = shared
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is None and self.shared is not None:
+            value, expire_time = self.shared.get_with_expire_time(key)
+            if value is not None:
+                ttl = None
+                if expire_time is not None:
+                    ttl = max(expire_time - time.time(), 0)
+                self.memory.set(key, value, ttl=ttl)
+        if value is None:
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl=ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl=ttl)
@@ -0,0 +1,305 @@
+# coding=utf-8
+
+"""
+master与slave之间下载任务和结果的二进制编码
+
+每个消息以 MAGIC + 版本号 + 消息类型 开头，消息体使用msgpack格式的子集编码（nil, bool, int, str, bin, array），
+下载请求和检索结果按照固定的字段顺序编码为array，只传输必要的字段
+
+解码时检查嵌套深度、长度和各个字段的类型，格式错误的消息只会引发CodecError
+"""
+
+import struct
+
+from tornado.httputil import HTTPInputError
+from xpaw import HttpRequest, HttpHeaders
+
+from metase.errors import CodecError
+
+MAGIC = b'MS'
+VERSION = 1
+
+KIND_REQUEST = 1
+KIND_TASKS = 2
+KIND_RESULT = 3
+KIND_BATCH_RESULT = 4
+
+RESULT_FIELDS = ('title', 'text', 'url')
+
+MAX_DEPTH = 16
+
+_HEADER = struct.Struct('>2sBB')
+_LENGTH = struct.Struct('>I')
+
+
+def _pack(obj, buf):
+    if obj is None:
+        buf.append(0xc0)
+    elif obj is True:
+        buf.append(0xc3)
+    elif obj is False:
+        buf.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            buf.append(obj)
+        elif -0x20 <= obj < 0:
+            buf.append(obj & 0xff)
+        elif -0x8000000000000000 <= obj <= 0x7fffffffffffffff:
+            buf.append(0xd3)
+            buf.extend(struct.pack('>q', obj))
+        else:
+            raise CodecError('Integer out of range: {}'.format(obj))
+    elif isinstance(obj, str):
+        b = obj.encode('utf-8')
+        n = len(b)
+        if n < 32:
+            buf.append(0xa0 | n)
+        elif n < 0x100:
+            buf.append(0xd9)
+            buf.append(n)
+        elif n < 0x10000:
+            buf.append(0xda)
+            buf.extend(struct.pack('>H', n))
+        else:
+            buf.append(0xdb)
+            buf.extend(struct.pack('>I', n))
+        buf.extend(b)
+    elif isinstance(obj, (bytes, bytearray)):
+        buf.append(0xc6)
+        buf.extend(struct.pack('>I', len(obj)))
+        buf.extend(obj)
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            buf.append(0x90 | n)
+        else:
+            buf.append(0xdd)
+            buf.extend(struct.pack('>I', n))
+        for i in obj:
+            _pack(i, buf)
+    else:
+        raise CodecError('Unsupported type: {}'.format(type(obj).__name__))
+
+
+def _unpack(data, pos, depth=0):
+    try:
+        b = data[pos]
+    except IndexError:
+        raise CodecError('Unexpected end of data')
+    pos += 1
+    if b < 0x80:
+        return b, pos
+    if b >= 0xe0:
+        return b - 0x100, pos
+    if 0xa0 <= b <= 0xbf:
+        return _unpack_str(data, pos, b & 0x1f)
+    if 0x90 <= b <= 0x9f:
+        return _unpack_array(data, pos, b & 0x0f, depth)
+    if b == 0xc0:
+        return None, pos
+    if b == 0xc2:
+        return False, pos
+    if b == 0xc3:
+        return True, pos
+    if b == 0xd3:
+        return struct.unpack_from('>q', data, pos)[0], pos + 8
+    if b == 0xd9:
+        return _unpack_str(data, pos + 1, data[pos])
+    if b == 0xda:
+        return _unpack_str(data, pos + 2, struct.unpack_from('>H', data, pos)[0])
+    if b == 0xdb:
+        return _unpack_str(data, pos + 4, struct.unpack_from('>I', data, pos)[0])
+    if b == 0xc6:
+        n = struct.unpack_from('>I', data, pos)[0]
+        pos += 4
+        if pos + n > len(data):
+            raise CodecError('Unexpected end of data')
+        return bytes(data[pos:pos + n]), pos + n
+    if b == 0xdd:
+        return _unpack_array(data, pos + 4, struct.unpack_from('>I', data, pos)[0], depth)
+    raise CodecError('Unsupported type byte: 0x{:02x}'.format(b))
+
+
+def _unpack_str(data, pos, n):
+    if pos + n > len(data):
+        raise CodecError('Unexpected end of data')
+    return bytes(data[pos:pos + n]).decode('utf-8'), pos + n
+
+
+def _unpack_array(data, pos, n, depth):
+    if depth >= MAX_DEPTH:
+        raise CodecError('Nesting is too deep')
+    # 每个元素至少占一个字节
+    if pos + n > len(data):
+        raise CodecError('Unexpected end of data')
+    res = []
+    for i in range(n):
+        v, pos = _unpack(data, pos, depth + 1)
+        res.append(v)
+    return res, pos
+
+
+def _encode(kind, obj):
+    buf = bytearray(_HEADER.pack(MAGIC, VERSION, kind))
+    _pack(obj, buf)
+    return bytes(buf)
+
+
+def _decode(kind, data):
+    if len(data) < _HEADER.size:
+        raise CodecError('Message is too short')
+    magic, version, k = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise CodecError('Bad magic')
+    if version != VERSION:
+        raise CodecError('Unsupported version: {}'.format(version))
+    if k != kind:
+        raise CodecError('Unexpected message kind: {}'.format(k))
+    try:
+        obj, pos = _unpack(data, _HEADER.size)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise CodecError(str(e))
+    if pos != len(data):
+        raise CodecError('Trailing data')
+    return obj
+
+
+def _request_to_list(request):
+    headers = None
+    if request.headers is not None:
+        headers = [[k, v] for k, v in request.headers.get_all()]
+    body = request.body
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return [request.url, request.method, headers, body, request.allow_redirects]
+
+
+def _check_type(name, value, types):
+    if not isinstance(value, types):
+        raise CodecError('Bad {}: {}'.format(name, type(value).__name__))
+
+
+def _list_to_request(obj):
+    if not isinstance(obj, list) or len(obj) != 5:
+        raise CodecError('Bad request')
+    url, method, headers, body, allow_redirects = obj
+    _check_type('url', url, str)
+    _check_type('method', method, str)
+    _check_type('headers', headers, (list, type(None)))
+    _check_type('body', body, (bytes, type(None)))
+    _check_type('allow_redirects', allow_redirects, bool)
+    if headers is not None:
+        h = HttpHeaders()
+        for i in headers:
+            if not isinstance(i, list) or len(i) != 2 or not isinstance(i[0], str) or not isinstance(i[1], str):
+                raise CodecError('Bad header')
+            try:
+                h.add(i[0], i[1])
+            except HTTPInputError as e:
+                raise CodecError(str(e))
+        headers = h
+    try:
+        return HttpRequest(url, method=method, headers=headers, body=body, allow_redirects=allow_redirects)
+    except ValueError as e:
+        raise CodecError('Bad url: {}'.format(e))
+
+
+def _result_to_obj(rtype, result):
+    if rtype == 'page':
+        return [[r.get(f) for f in RESULT_FIELDS] for r in result]
+    return result
+
+
+def _obj_to_result(rtype, obj):
+    if rtype == 'page':
+        _check_type('result', obj, list)
+        res = []
+        for r in obj:
+            if not isinstance(r, list) or len(r) != len(RESULT_FIELDS):
+                raise CodecError('Bad record')
+            for f, v in zip(RESULT_FIELDS, r):
+                _check_type(f, v, (str, type(None)))
+            res.append(dict(zip(RESULT_FIELDS, r)))
+        return res
+    _check_type('location', obj, (str, type(None)))
+    return obj
+
+
+def encode_request(request):
+    return _encode(KIND_REQUEST, _request_to_list(request))
+
+
+def decode_request(data):
+    return _list_to_request(_decode(KIND_REQUEST, data))
+
+
+def encode_tasks(tasks):
+    """
+    :param tasks: (name, rtype, request)的列表
+    """
+    return _encode(KIND_TASKS, [[name, rtype, _request_to_list(req)] for name, rtype, req in tasks])
+
+
+def decode_tasks(data):
+    obj = _decode(KIND_TASKS, data)
+    _check_type('tasks', obj, list)
+    tasks = []
+    for t in obj:
+        if not isinstance(t, list) or len(t) != 3:
+            raise CodecError('Bad task')
+        name, rtype, req = t
+        _check_type('name', name, str)
+        _check_type('rtype', rtype, str)
+        tasks.append((name, rtype, _list_to_request(req)))
+    return tasks
+
+
+def encode_result(rtype, result):
+    return _encode(KIND_RESULT, _result_to_obj(rtype, result))
+
+
+def decode_result(rtype, data):
+    return _obj_to_result(rtype, _decode(KIND_RESULT, data))
+
+
+def encode_batch_result(index, rtype, result=None, error=None):
+    """
+    编码批量任务中一个任务的结果，带有长度前缀以便在流中分帧
+    """
+    body = _encode(KIND_BATCH_RESULT, [index, error, _result_to_obj(rtype, result) if error is None else None])
+    return _LENGTH.pack(len(body)) + body
+
+
+class BatchResultReader:
+    """
+    从流式返回的数据中解析批量任务的结果
+    """
+
+    def __init__(self, rtypes):
+        self.rtypes = rtypes
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        """
+        :return: (index, result, error)的列表
+        """
+        self._buffer.extend(chunk)
+        res = []
+        while len(self._buffer) >= _LENGTH.size:
+            n = _LENGTH.unpack_from(self._buffer)[0]
+            end = _LENGTH.size + n
+            if len(self._buffer) < end:
+                break
+            obj = _decode(KIND_BATCH_RESULT, bytes(self._buffer[_LENGTH.size:end]))
+            del self._buffer[:end]
+            if not isinstance(obj, list) or len(obj) != 3:
+                raise CodecError('Bad batch result')
+            index, error, obj = obj
+            if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(self.rtypes):
+                raise CodecError('Bad task index: {}'.format(index))
+            _check_type('error', error, (int, type(None)))
+            result = None
+            if error is None:
+                result = _obj_to_result(self.rtypes[index], obj)
+            res.append((index, result, error))
+        return res
@@ -1,10 +1,14 @@
 # coding=utf-8
 
+import os
 import logging
 
 from metase import __version__
 from metase.utils import load_config, iter_settings
 from metase.run import run_server
+from metase.errors import UsageError
+from metase.search_engine import load_search_engines
+from metase.bench import load_corpus, run_benchmark, format_reports
 
 log = logging.getLogger(__name__)
 
@@ -75,7 +79,9 @@ class RunCommand(Command):
             Option(name='daemon', cli=['-d', '--daemon'], action='store_true', short_desc='run in daemon mode'),
             Option(name='log_level', cli=['-l', '--log-level'], metavar='LEVEL', short_desc='log level'),
             Option(name='log_file', cli=['--log-file'], metavar='FILE', short_desc='log file'),
-            Option(name='pid_file', cli=['--pid-file'], metavar='FILE', short_desc='PID file')]
+            Option(name='pid_file', cli=['--pid-file'], metavar='FILE', short_desc='PID file'),
+            Option(name='workers', cli=['--workers'], metavar='N', type=int,
+                   short_desc='number of worker processes, 0 for the number of CPUs')]
 
     @property
     def name(self):
@@ -119,6 +125,46 @@ class RunSlaveCommand(RunCommand):
         super().run(args)
 
 
+class BenchExtractCommand(Command):
+    @property
+    def name(self):
+        return "bench-extract"
+
+    @property
+    def syntax(self):
+        return "[options] <corpus>"
+
+    @property
+    def short_desc(self):
+        return "Benchmark result extraction on a corpus of saved result pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', metavar='corpus', nargs='?', help='corpus directory')
+        parser.add_argument('-e', '--engines', dest='engines', metavar='ENGINES',
+                            help='comma-separated search engines, default to all engines in the corpus')
+        parser.add_argument('-r', '--repeat', dest='repeat', metavar='N', type=int, default=3,
+                            help='number of timed rounds')
+        parser.add_argument('--no-memory', dest='trace_memory', action='store_false',
+                            help='do not trace memory with tracemalloc')
+
+    def process_arguments(self, args):
+        if args.corpus is None:
+            raise UsageError('missing corpus directory', print_help=True)
+        if not os.path.isdir(args.corpus):
+            raise UsageError('{} is not a directory'.format(args.corpus))
+
+    def run(self, args):
+        search_engines = load_search_engines()
+        corpus = load_corpus(args.corpus, search_engines)
+        if args.engines:
+            names = [i.strip() for i in args.engines.split(',')]
+            corpus = {k: v for k, v in corpus.items() if k in names}
+        reports = run_benchmark(search_engines, corpus, repeat=args.repeat, trace_memory=args.trace_memory)
+        print(format_reports(reports))
+        if any(r.failures for r in reports):
+            self.exitcode = 1
+
+
 class VersionCommand(Command):
     @property
     def name(self):
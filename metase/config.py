@@ -2,13 +2,96 @@
 
 DEFAULT_CONFIG = {
     'daemon': False,
+    'workers': 1,
+    'max_worker_restarts': 100,
     'log_level': 'info',
     'log_format': '%(asctime)s %(name)s [%(levelname)s] %(message)s',
     'log_dateformat': '[%Y-%m-%d %H:%M:%S %z]',
     'max_clients': 100,
+    'slave_max_connections': 20,
+    'slave_batch_size': 50,
+    'slave_batch_delay': 0.005,
+    'slave_selector': 'metase.balancer.PowerOfTwoSelector',
+    'slave_ewma_decay': 0.2,
+    'slave_eject_error_rate': 0.5,
+    'slave_eject_min_requests': 5,
+    'slave_eject_time': 30,
+    'hedge_percentile': 95,
+    'hedge_min_samples': 20,
+    'hedge_budget': 0.05,
+    'hedge_burst': 10,
     'timeout': 10,
+    'latency_window': 200,
+    'engine_timeouts': {},
+    'page_stage_share': 0.6,
+    'adaptive_timeout_percentile': 99,
+    'adaptive_timeout_factor': 1.5,
+    'adaptive_timeout_min': 1,
+    'adaptive_timeout_min_samples': 20,
+    'early_stop_ratio': 0.8,
+    'early_stop_ratios': {},
+    # 分批下载检索页时第一批的页数，None表示一次下载全部检索页
+    'page_wave_size': None,
+    'page_wave_min_ratio': 0.5,
+    'page_wave_max_duplicate_ratio': 0.8,
+    'engine_max_results': {},
     'host': '0.0.0.0',
     'port': 9281,
     'api_version': '1',
-    'api_secret': ''
+    'api_secret': '',
+    'result_cache_size': 64 * 1024 * 1024,
+    'result_cache_ttl': 10 * 60,
+    'result_cache_recent_ttl': 60,
+    'result_cache_partial_ttl': 30,
+    'extract_executor': None,
+    'extract_workers': None,
+    'extract_max_pending': 100,
+    'page_cache_size': 64 * 1024 * 1024,
+    'page_cache_ttl': 5 * 60,
+    'page_cache_stale_ttl': 60,
+    'real_url_cache_size': 32 * 1024 * 1024,
+    'real_url_cache_ttl': 24 * 60 * 60,
+    'real_url_cache_negative_ttl': 10 * 60,
+    # 多个进程共享的SQLite缓存文件，内存中未命中时在IOLoop中同步查询
+    'real_url_cache_file': None,
+    'real_url_cache_file_max_entries': 1000000,
+    'real_url_cache_file_purge_interval': 60,
+    'max_resolve_tokens': 100,
+    # resolve_token的有效期，应长于result_cache_ttl，避免缓存的检索结果中的token已经失效
+    'resolve_token_ttl': 60 * 60,
+    'cookie_store': 'metase.cookies.MemoryCookieStore',
+    'cookie_store_file': None,
+    'cookie_store_url': None,
+    'cookie_store_poll_interval': 30,
+    'cookie_store_reload_interval': 5,
+    'cookie_sessions': 3,
+    'cookie_refresh_interval': 5 * 60,
+    'cookie_refresh_jitter': 0.2,
+    'canonicalize_urls': True,
+    # 近似重复检测在IOLoop中同步执行，耗时随参与检测的记录数和文本相似程度增长，
+    # 8个搜索引擎各500条检索结果全部参与检测时每次合并需要1秒以上，因此只对评分最高的near_duplicate_max_records条检测
+    'near_duplicate': False,
+    'near_duplicate_max_records': 200,
+    'near_duplicate_threshold': 0.8,
+    'near_duplicate_bands': 8,
+    'near_duplicate_rows': 4,
+    'fusion': 'default',
+    'fusers': {
+        'default': 'metase.ranking.DefaultFuser',
+        'rrf': 'metase.ranking.RRFFuser',
+        'combsum': 'metase.ranking.CombSumFuser',
+        'combmnz': 'metase.ranking.CombMNZFuser',
+        'learned': 'metase.ranking.LearnedFuser'
+    },
+    'rrf_k': 60,
+    'fusion_weights_file': None,
+    'result_session_size': 64 * 1024 * 1024,
+    'result_session_ttl': 5 * 60,
+    'default_page_size': 10,
+    'max_page_size': 100,
+    'metrics': True,
+    'loop_lag_interval': 1,
+    'trace_file': None,
+    'trace_sample_rate': 1,
+    'url_rewrites': {}
 }
@@ -0,0 +1,272 @@
+# coding=utf-8
+
+"""
+搜索引擎的Cookie会话
+
+每个搜索引擎维护cookie_sessions个Cookie会话，检索请求轮流使用各个会话，
+Cookie可以保存在本进程内存中、多个进程共享的文件中，或者由master节点通过HTTP接口统一下发
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import hashlib
+import functools
+
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+
+log = logging.getLogger(__name__)
+
+
+class CookieStore:
+    """
+    保存搜索引擎的Cookie会话，会话中的Cookie为名称到值的dict
+
+    shared: 是否在多个进程之间共享，共享时每个搜索引擎只由一个工作进程刷新Cookie
+    refreshable: 是否由本进程定时刷新Cookie
+    """
+
+    shared = False
+    refreshable = True
+
+    def __init__(self, config):
+        self.config = config
+
+    async def get(self, name, index):
+        """
+        :param name: 搜索引擎代号
+        :param index: 会话编号
+        :return: Cookie的dict
+        """
+        raise NotImplementedError
+
+    async def update(self, name, index, cookies):
+        """
+        将新的Cookie合并到会话中
+        """
+        raise NotImplementedError
+
+    async def dump(self):
+        """
+        :return: {搜索引擎代号: {会话编号: Cookie的dict}}，会话编号为字符串
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryCookieStore(CookieStore):
+    def __init__(self, config):
+        super().__init__(config)
+        self._cookies = {}
+
+    async def get(self, name, index):
+        return self._cookies.get(name, {}).get(str(index), {})
+
+    async def update(self, name, index, cookies):
+        _merge(self._cookies, name, index, cookies)
+
+    async def dump(self):
+        return self._cookies
+
+
+class FileCookieStore(CookieStore):
+    """
+    将Cookie以JSON格式保存在文件中，读写时对文件加锁，用于同一台机器上的多个工作进程
+
+    文件的加锁和读写在线程池中执行，不阻塞IOLoop；
+    读取时最多每cookie_store_reload_interval秒检查一次文件是否修改，文件修改后才重新读取
+    """
+
+    shared = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.path = config.get('cookie_store_file')
+        if not self.path:
+            raise ValueError('cookie_store_file is required')
+        self.reload_interval = config.get('cookie_store_reload_interval')
+        self._cookies = {}
+        self._mtime = None
+        self._check_time = None
+
+    async def get(self, name, index):
+        await self._reload()
+        return self._cookies.get(name, {}).get(str(index), {})
+
+    async def update(self, name, index, cookies):
+        self._cookies, self._mtime = await _run_in_executor(self._update_file, name, index, cookies)
+
+    async def dump(self):
+        await self._reload()
+        return self._cookies
+
+    async def _reload(self):
+        now = time.time()
+        if self._check_time is not None and now - self._check_time < self.reload_interval:
+            return
+        # 读取期间的其他请求使用当前的Cookie
+        self._check_time = now
+        res = await _run_in_executor(self._read_file, self._mtime)
+        if res is not None:
+            self._cookies, self._mtime = res
+
+    def _read_file(self, mtime):
+        """
+        :return: (cookies, mtime)，文件不存在或没有修改时返回None
+        """
+        import fcntl
+
+        try:
+            if os.stat(self.path).st_mtime == mtime:
+                return
+            f = open(self.path, 'r')
+        except FileNotFoundError:
+            return
+        with f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                return _loads(f.read()), os.fstat(f.fileno()).st_mtime
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _update_file(self, name, index, cookies):
+        """
+        :return: 合并后文件中的(cookies, mtime)
+        """
+        import fcntl
+
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                data = _loads(f.read())
+                _merge(data, name, index, cookies)
+                f.seek(0)
+                f.truncate()
+                json.dump(data, f)
+                f.flush()
+                return data, os.fstat(f.fileno()).st_mtime
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class HttpCookieStore(CookieStore):
+    """
+    定时从master节点的Cookie接口拉取Cookie，由master节点负责刷新
+
+    响应中新设置的Cookie只保存在本进程，下次拉取时被master节点的Cookie覆盖
+    """
+
+    shared = True
+    refreshable = False
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.url = config.get('cookie_store_url')
+        if not self.url:
+            raise ValueError('cookie_store_url is required')
+        self.api_secret = config.get('api_secret')
+        self.poll_interval = config.get('cookie_store_poll_interval')
+        self._cookies = {}
+        self._client = AsyncHTTPClient(force_instance=True)
+        self._poll_task = None
+
+    async def get(self, name, index):
+        if self._poll_task is None:
+            self._poll_task = asyncio.ensure_future(self._poll())
+        return self._cookies.get(name, {}).get(str(index), {})
+
+    async def update(self, name, index, cookies):
+        _merge(self._cookies, name, index, cookies)
+
+    async def dump(self):
+        return self._cookies
+
+    def close(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+        self._client.close()
+
+    async def _poll(self):
+        while True:
+            try:
+                await self.pull()
+            except Exception as e:
+                log.warning('Failed to pull cookies from %s: %s', self.url, e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def pull(self):
+        timestamp = str(int(time.time()))
+        nonce = str(random.randint(0, 1e8))
+        s = (self.api_secret + 'cookies' + 'cookies' + timestamp + nonce).encode('utf-8')
+        signature = hashlib.sha256(s).hexdigest()
+        url = '{}?name=cookies&rtype=cookies&timestamp={}&nonce={}&signature={}'.format(self.url, timestamp, nonce,
+                                                                                        signature)
+        resp = await self._client.fetch(HTTPRequest(url, request_timeout=self.config.get('timeout')))
+        self._cookies = _loads(resp.body.decode('utf-8'))
+
+
+class CookieRefresher:
+    """
+    定时通过主页刷新搜索引擎的Cookie会话
+
+    每个会话独立调度，间隔加入随机抖动，避免同时访问搜索引擎的主页
+    """
+
+    def __init__(self, store, interval, jitter=0.2):
+        self.store = store
+        self.interval = interval
+        self.jitter = jitter
+        self._handles = {}
+
+    def start(self, search_engine, sessions):
+        for i in range(sessions):
+            # 首次刷新分散在一个抖动区间内
+            delay = random.uniform(0, self.interval * self.jitter)
+            self._schedule(search_engine, i, delay)
+
+    def stop(self):
+        for h in self._handles.values():
+            h.cancel()
+        self._handles.clear()
+
+    def _schedule(self, search_engine, index, delay):
+        self._handles[(search_engine.name, index)] = asyncio.get_event_loop().call_later(
+            delay, lambda: asyncio.ensure_future(self._refresh(search_engine, index)))
+
+    async def _refresh(self, search_engine, index):
+        try:
+            cookies = await search_engine.refresh_cookies()
+            await self.store.update(search_engine.name, index, cookies)
+        except Exception as e:
+            log.warning('Failed to refresh cookies of %s: %s', search_engine.name, e)
+        finally:
+            delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self._schedule(search_engine, index, delay)
+
+
+def _run_in_executor(func, *args):
+    return asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+def _loads(s):
+    if not s.strip():
+        return {}
+    try:
+        data = json.loads(s)
+    except ValueError as e:
+        log.warning('Invalid cookie data: %s', e)
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return data
+
+
+def _merge(data, name, index, cookies):
+    sessions = data.setdefault(name, {})
+    sessions.setdefault(str(index), {}).update(cookies)
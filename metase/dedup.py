@@ -0,0 +1,138 @@
+# coding=utf-8
+
+"""
+检索结果去重
+
+(1) URL规范化：忽略scheme、www.和移动站的前缀、默认端口、末尾的斜杠、跟踪参数和fragment
+
+(2) 近似重复检测：对标题和摘要的字符shingle计算MinHash签名，签名分段后落在同一个桶中的记录作为候选，
+再计算shingle集合的Jaccard相似度确认，每条记录只与少量候选比较，整体耗时接近线性
+"""
+
+import re
+import sys
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+HOST_PREFIXES = ('www.', 'm.', 'wap.', 'mobile.', '3g.')
+
+TRACKING_PARAMS = frozenset(['fbclid', 'gclid', 'msclkid', 'yclid', 'spm', '_ga'])
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+_non_word_reg = re.compile(r'[\W_]+')
+
+
+@lru_cache(maxsize=65536)
+def canonicalize_url(url):
+    """
+    :return: 用于判断两个URL是否指向同一个网页的key
+    """
+    try:
+        s = urlsplit(url.strip())
+        port = s.port
+    except ValueError:
+        return url
+    host = s.hostname or ''
+    for p in HOST_PREFIXES:
+        if host.startswith(p) and host.count('.') > 1:
+            host = host[len(p):]
+            break
+    if port is not None and port != DEFAULT_PORTS.get(s.scheme.lower()):
+        host = '{}:{}'.format(host, port)
+    path = s.path.rstrip('/')
+    key = host + path
+    if s.query:
+        params = [(k, v) for k, v in parse_qsl(s.query, keep_blank_values=True)
+                  if k not in TRACKING_PARAMS and not k.startswith('utm_')]
+        if len(params) > 0:
+            key += '?' + urlencode(sorted(params))
+    return key
+
+
+def shingles(text, size=3):
+    """
+    :return: 文本中长度为size的字符片段的集合，忽略大小写、全角半角、空白和标点的差异
+    """
+    text = _non_word_reg.sub('', unicodedata.normalize('NFKC', text).lower())
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+@lru_cache(maxsize=None)
+def _hash_bins(num_perm):
+    width = sys.hash_info.width
+    step = (1 << width) // num_perm
+    low = -(1 << (width - 1))
+    return [(low + i * step, low + (i + 1) * step) for i in range(num_perm)]
+
+
+def minhash(features, num_perm):
+    """
+    单次置换的MinHash：哈希值按取值范围均分到num_perm个桶中，每个桶取最小值，空桶为None
+
+    排序后二分查找每个桶的最小值，使用内置的hash函数，签名只在同一个进程内可比较
+    """
+    hs = sorted(map(hash, features))
+    n = len(hs)
+    sig = []
+    i = 0
+    for low, high in _hash_bins(num_perm):
+        i = bisect_left(hs, low, i)
+        sig.append(hs[i] if i < n and hs[i] < high else None)
+    return sig
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateIndex:
+    """
+    检测标题和摘要近似重复的检索结果
+
+    threshold: 判定为近似重复的Jaccard相似度阈值
+    bands, rows: MinHash签名分为bands段，每段rows个值，任意一段完全相同的记录作为候选
+    min_features: shingle数量少于该值的文本不参与检测，避免误判过短的文本
+    max_candidates: 每条记录最多比较的候选记录数，避免大量相似文本落在同一个桶中时退化为两两比较
+    """
+
+    def __init__(self, threshold=0.8, bands=8, rows=4, shingle_size=3, min_features=10, max_candidates=20):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        self.min_features = min_features
+        self.max_candidates = max_candidates
+        self._buckets = {}
+        self._features = []
+
+    def find_or_add(self, text, value):
+        """
+        :return: 已加入的近似重复文本对应的value，没有近似重复时加入该文本并返回None
+        """
+        features = shingles(text, self.shingle_size)
+        if len(features) < self.min_features:
+            return
+        sig = minhash(features, self.bands * self.rows)
+        keys = [(b, tuple(sig[b * self.rows:(b + 1) * self.rows])) for b in range(self.bands)]
+        checked = set()
+        for k in keys:
+            for i in self._buckets.get(k, ()):
+                if i in checked:
+                    continue
+                if len(checked) >= self.max_candidates:
+                    break
+                checked.add(i)
+                other, v = self._features[i]
+                if jaccard(features, other) >= self.threshold:
+                    return v
+        i = len(self._features)
+        self._features.append((features, value))
+        for k in keys:
+            self._buckets.setdefault(k, []).append(i)
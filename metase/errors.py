@@ -15,3 +15,21 @@ class BanError(Exception):
     """
     Ban error
     """
+
+
+class FetchError(Exception):
+    """
+    Fetch error on slave
+    """
+
+
+class CodecError(Exception):
+    """
+    Wire format error
+    """
+
+
+class OverloadError(Exception):
+    """
+    Too many pending tasks
+    """
@@ -0,0 +1,71 @@
+# coding=utf-8
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from xpaw import HttpResponse, HttpHeaders
+
+from metase.errors import OverloadError
+
+_search_engines = None
+
+
+def _init_worker():
+    global _search_engines
+    from metase.search_engine import load_search_engines
+    _search_engines = load_search_engines()
+
+
+def _extract_in_worker(name, url, status, headers, body):
+    resp = HttpResponse(url, status, headers=HttpHeaders(headers), body=body)
+    return list(_search_engines[name].extract_results(resp))
+
+
+class ExtractExecutor:
+    """
+    提取检索结果页中的数据，可以在进程池或线程池中执行以免阻塞IOLoop
+
+    executor: process: 进程池，thread: 线程池，None: 在IOLoop中直接执行
+    workers: 进程或线程的数量
+    max_pending: 最多等待和正在执行的提取任务数，超过时抛出OverloadError
+    """
+
+    def __init__(self, search_engines, executor=None, workers=None, max_pending=None):
+        self.search_engines = search_engines
+        self.executor_type = executor
+        self.max_pending = max_pending
+        self.pending = 0
+        if executor == 'process':
+            # 使用spawn避免子进程继承服务监听的socket
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        elif executor == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+        elif executor is None:
+            self._executor = None
+        else:
+            raise ValueError('Unknown extract executor: {}'.format(executor))
+
+    async def extract(self, name, response):
+        if self._executor is None:
+            return list(self.search_engines[name].extract_results(response))
+        if self.max_pending and self.pending >= self.max_pending:
+            raise OverloadError('Too many pending extractions')
+        self.pending += 1
+        try:
+            loop = asyncio.get_event_loop()
+            if self.executor_type == 'process':
+                headers = list(response.headers.get_all()) if response.headers is not None else []
+                return await loop.run_in_executor(self._executor, _extract_in_worker, name, response.url,
+                                                  response.status, headers, response.body)
+            return await loop.run_in_executor(self._executor, self._extract, name, response)
+        finally:
+            self.pending -= 1
+
+    def _extract(self, name, response):
+        return list(self.search_engines[name].extract_results(response))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
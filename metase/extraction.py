@@ -0,0 +1,102 @@
+# coding=utf-8
+
+from lxml import etree
+from lxml.cssselect import LxmlHTMLTranslator
+
+_css_translator = LxmlHTMLTranslator()
+
+
+def _compile_css(css, first=False):
+    xpath = _css_translator.css_to_xpath(css)
+    if first:
+        xpath = '({})[1]'.format(xpath)
+    return etree.XPath(xpath, smart_strings=False)
+
+
+def _node_text(node):
+    return etree.tostring(node, encoding='unicode', method='text', with_tail=False)
+
+
+class Field:
+    """
+    检索结果中的一个字段
+
+    selectors: CSS选择器，或者(CSS选择器, 属性名)，依次尝试直到匹配，
+        匹配CSS选择器的第一个节点，提取其文本或属性，提取属性时属性值为空视为不匹配
+    required: 字段缺失时是否丢弃该条检索结果
+    process: 去掉首尾空白后调用的处理函数
+    """
+
+    def __init__(self, *selectors, required=True, process=None):
+        self.selectors = []
+        for s in selectors:
+            if isinstance(s, str):
+                s = (s, None)
+            self.selectors.append(s)
+        self.required = required
+        self.process = process
+        self._compiled = None
+
+    def compile(self):
+        if self._compiled is None:
+            self._compiled = [(_compile_css(css, first=True), attr) for css, attr in self.selectors]
+        return self._compiled
+
+    def extract(self, item):
+        for xpath, attr in self.compile():
+            nodes = xpath(item)
+            if len(nodes) <= 0:
+                continue
+            if attr is None:
+                value = _node_text(nodes[0])
+            else:
+                value = nodes[0].get(attr)
+                if not value:
+                    continue
+            value = value.strip()
+            if self.process is not None:
+                value = self.process(value)
+            return value
+
+
+class ExtractionRule:
+    """
+    声明式的检索结果提取规则，编译为XPath后对解析的HTML一次遍历完成提取
+
+    container: 每条检索结果所在节点的CSS选择器
+    fields: 字段名到Field的dict
+    """
+
+    def __init__(self, container, **fields):
+        self.container = container
+        self.fields = fields
+        self._container_xpath = None
+
+    def compile(self):
+        if self._container_xpath is None:
+            self._container_xpath = _compile_css(self.container)
+            for f in self.fields.values():
+                f.compile()
+        return self
+
+    def extract(self, text):
+        """
+        :param text: HTML文本
+        :return: 检索结果的dict
+        """
+        if not text or not text.strip():
+            return
+        self.compile()
+        root = etree.fromstring(text, parser=etree.HTMLParser())
+        if root is None:
+            return
+        for item in self._container_xpath(root):
+            res = {}
+            for name, f in self.fields.items():
+                value = f.extract(item)
+                if value is None and f.required:
+                    res = None
+                    break
+                res[name] = value
+            if res is not None:
+                yield res
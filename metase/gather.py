@@ -5,9 +5,21 @@ import time
 
 
 class GatherTask:
+    """
+    等待一组子任务完成
+
+    early_stop: 完成的子任务比例达到ratio后，最多再等待已完成子任务中的最长耗时（至少min_wait秒）
+    timeout: 超时时间
+    callback: 每个子任务完成时调用
+    ratio: 提前结束的完成比例
+    min_wait: 提前结束前的最少等待时间，默认为timeout的1/4
+
+    outcome: 结束的原因，complete: 全部完成，early_stop: 提前结束，timeout: 超时
+    """
+
     NO_RESULT = object()
 
-    def __init__(self, n, early_stop=False, timeout=None):
+    def __init__(self, n, early_stop=False, timeout=None, callback=None, ratio=0.8, min_wait=None):
         self._done = asyncio.Future()
         self.result = []
         for i in range(n):
@@ -15,18 +27,25 @@ class GatherTask:
         self.completed = 0
         self.early_stop = early_stop
         self.timeout = timeout
+        self.ratio = ratio
+        if min_wait is None and timeout:
+            min_wait = timeout / 4
+        self.min_wait = min_wait
         self.start_time = None
         self.task_log = []
         self._early_stop_future = None
+        self.callback = callback
+        self.outcome = None
 
-    async def _complete_delay(self, timeout):
+    async def _complete_delay(self, timeout, outcome):
         await asyncio.sleep(timeout)
         if not self.is_done():
+            self.outcome = outcome
             self._done.set_result(True)
 
     async def done(self):
         if self.timeout is not None:
-            asyncio.ensure_future(self._complete_delay(self.timeout))
+            asyncio.ensure_future(self._complete_delay(self.timeout, 'timeout'))
         self.start_time = time.time()
         await self._done
 
@@ -39,21 +58,24 @@ class GatherTask:
             self.task_log.append(dict(index=index, completed_time=time.time()))
             self.result[index] = result
             self.completed += 1
+            if self.callback is not None:
+                self.callback(index, result)
             if self.completed >= len(self.result):
+                self.outcome = 'complete'
                 self._done.set_result(True)
             else:
                 if self.early_stop:
                     self._try_early_stop()
 
     def _try_early_stop(self):
-        if len(self.task_log) / len(self.result) >= 0.8:
+        if len(self.task_log) / len(self.result) >= self.ratio:
             max_t = 0
             for t in self.task_log:
                 max_t = max(max_t, t['completed_time'] - self.start_time)
-            if self.timeout:
-                max_t = max(max_t, self.timeout / 4)
+            if self.min_wait:
+                max_t = max(max_t, self.min_wait)
             if self._early_stop_future is None:
-                self._early_stop_future = asyncio.ensure_future(self._complete_delay(max_t))
+                self._early_stop_future = asyncio.ensure_future(self._complete_delay(max_t, 'early_stop'))
 
     def update_result(self, index, result):
         assert 0 <= index < len(self.result)
@@ -0,0 +1,27 @@
+# coding=utf-8
+
+
+class HedgeBudget:
+    """
+    限制对冲请求的比例
+
+    每个请求增加ratio个令牌，每个对冲请求消耗一个令牌，令牌数不超过burst
+    """
+
+    def __init__(self, ratio, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0
+        self.requests = 0
+        self.hedges = 0
+
+    def on_request(self):
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def acquire(self):
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.hedges += 1
+            return True
+        return False
@@ -0,0 +1,29 @@
+# coding=utf-8
+
+from collections import deque
+
+
+class LatencyWindow:
+    """
+    最近若干次请求耗时的滑动窗口
+    """
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, latency):
+        self._samples.append(latency)
+
+    def percentile(self, p):
+        """
+        :param p: 百分位数，0~100
+        :return: 耗时的百分位数，没有样本时返回None
+        """
+        if len(self._samples) <= 0:
+            return
+        samples = sorted(self._samples)
+        i = int(round(p / 100 * (len(samples) - 1)))
+        return samples[min(max(i, 0), len(samples) - 1)]
@@ -0,0 +1,112 @@
+# coding=utf-8
+
+import math
+import heapq
+from operator import itemgetter
+
+from metase.ranking import Fuser
+
+
+def merge_results(results, fuser, weights, url_key=None, near_duplicate=None, near_duplicate_limit=None):
+    """
+    一次遍历根据URL合并多个搜索引擎的检索结果，保留相关性评分最高的标题和内容，同时统计每个搜索引擎在合并结果中的记录数
+
+    :param results: 搜索引擎代号到检索结果列表的dict
+    :param fuser: 排名融合策略
+    :param weights: 搜索引擎代号到搜索源权重的dict
+    :param url_key: 计算URL去重key的函数，None表示按URL原文去重
+    :param near_duplicate: 不为None时使用该NearDuplicateIndex合并标题和摘要近似重复的检索结果
+    :param near_duplicate_limit: 只对评分最高的near_duplicate_limit条检索结果做近似重复检测，None表示不限制
+    :return: (未排序的合并结果, 搜索引擎代号到记录数的dict)
+    """
+    # key -> [检索结果, 单个来源的最高评分, 与sources对应的各来源评分]，各来源评分只在合并近似重复时需要
+    merged = {}
+    counts = {}
+    keep_scores = near_duplicate is not None
+    for s, records in results.items():
+        weight = weights[s]
+        n = 0
+        for r, score in zip(records, fuser.rank_scores(len(records))):
+            relevance = weight * score
+            key = r['url'] if url_key is None else url_key(r['url'])
+            o = merged.get(key)
+            if o is None:
+                r['relevance'] = relevance
+                r['sources'] = [s]
+                merged[key] = [r, relevance, [relevance] if keep_scores else None]
+                n += 1
+            elif s not in o[0]['sources']:
+                _add_source(o, s, relevance, r)
+                n += 1
+        counts[s] = n
+
+    entries = merged.values()
+    if keep_scores:
+        entries = _merge_near_duplicates(entries, counts, near_duplicate, near_duplicate_limit)
+    res = [o[0] for o in entries]
+    # 默认的combine直接返回评分之和，不需要逐条调用
+    if type(fuser).combine is not Fuser.combine:
+        combine = fuser.combine
+        for r in res:
+            r['relevance'] = combine(r['relevance'], len(r['sources']))
+    return res, counts
+
+
+def rank_results(records, top_k=None):
+    """
+    按相关性评分排序，评分归一化为1到10，只需要前top_k条检索结果时使用堆选择代替完整排序
+
+    :return: 排序后的检索结果
+    """
+    key = itemgetter('relevance')
+    if top_k is not None and top_k < len(records):
+        res = heapq.nlargest(top_k, records, key=key)
+    else:
+        res = sorted(records, key=key, reverse=True)
+    if len(res) > 0:
+        max_relevance = res[0]['relevance']
+        ceil = math.ceil
+        i = 0
+        for r in res:
+            i += 1
+            r['id'] = i
+            relevance = ceil(r['relevance'] * 10 / max_relevance)
+            r['relevance'] = relevance if relevance < 10 else 10
+    return res
+
+
+def _add_source(o, s, relevance, r):
+    record = o[0]
+    record['relevance'] += relevance
+    record['sources'].append(s)
+    if o[2] is not None:
+        o[2].append(relevance)
+    if relevance > o[1]:
+        o[1] = relevance
+        record['title'] = r['title']
+        record['text'] = r['text']
+
+
+def _merge_near_duplicates(entries, counts, index, limit=None):
+    res = []
+    if limit is not None and len(entries) > limit:
+        entries = sorted(entries, key=lambda o: o[0]['relevance'], reverse=True)
+        res.extend(entries[limit:])
+        entries = entries[:limit]
+    for o in entries:
+        r = o[0]
+        target = index.find_or_add('{} {}'.format(r.get('title') or '', r.get('text') or ''), o)
+        if target is None:
+            res.append(o)
+            continue
+        record = target[0]
+        # 优先保留已获取真实URL的检索结果的URL，省去近似重复记录的resolve请求
+        if 'resolve_token' in record and 'resolve_token' not in r:
+            record['url'] = r['url']
+            del record['resolve_token']
+        for s, relevance in zip(r['sources'], o[2]):
+            if s in record['sources']:
+                counts[s] -= 1
+            else:
+                _add_source(target, s, relevance, r)
+    return res
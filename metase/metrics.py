@@ -0,0 +1,295 @@
+# coding=utf-8
+
+"""
+Prometheus文本格式的监控指标
+
+指标只在IOLoop所在的线程中更新，因此不需要加锁，更新操作只是对dict中的数值做加法；
+需要从其他对象读取的数值（例如slave节点正在处理的任务数、缓存命中数）在导出时通过回调函数获取
+"""
+
+import math
+import time
+import asyncio
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(v):
+    if v == math.inf:
+        return '+Inf'
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = ['{}="{}"'.format(k, _escape(v)) for k, v in zip(names, values)]
+    if extra is not None:
+        pairs.append('{}="{}"'.format(extra[0], _escape(extra[1])))
+    if len(pairs) == 0:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    """
+    监控指标的基类
+
+    name: 指标名称
+    documentation: 指标说明
+    labelnames: 标签名称
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._callback = None
+
+    def labels(self, *values):
+        """
+        :return: 标签取值对应的子指标，按顺序给出各个标签的取值
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError('Incorrect label count')
+            child = self._new_child()
+            self._children[values] = child
+        return child
+
+    def set_callback(self, callback):
+        """
+        导出时调用callback获取数值，callback返回标签取值的tuple到数值的dict
+        """
+        self._callback = callback
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        if self._callback is not None:
+            for values, v in self._callback().items():
+                yield self.name, _format_labels(self.labelnames, values), v
+        for values, child in self._children.items():
+            for suffix, extra, v in child.samples():
+                yield self.name + suffix, _format_labels(self.labelnames, values, extra), v
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.type)]
+        for name, labels, v in self._samples():
+            lines.append('{}{} {}'.format(name, labels, _format_value(v)))
+        return '\n'.join(lines)
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield '', None, self.value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        total = 0
+        for b, c in zip(self.buckets, self.counts):
+            total += c
+            yield '_bucket', ('le', _format_value(float(b))), total
+        total += self.counts[-1]
+        yield '_bucket', ('le', '+Inf'), total
+        yield '_sum', None, self.sum
+        yield '_count', None, total
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames=labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames=labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames=labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames=labelnames, buckets=buckets))
+
+    def render(self):
+        return '\n'.join(m.render() for m in self._metrics) + '\n'
+
+
+class LoopLagMonitor:
+    """
+    定时检测IOLoop的延迟，即定时回调实际执行时间与预期时间的差
+    """
+
+    def __init__(self, gauge, histogram, interval=1):
+        self.gauge = gauge
+        self.histogram = histogram
+        self.interval = interval
+        self._handle = None
+        self._expected = None
+
+    def start(self):
+        self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._expected = time.monotonic() + self.interval
+        self._handle = asyncio.get_event_loop().call_later(self.interval, self._check)
+
+    def _check(self):
+        lag = max(time.monotonic() - self._expected, 0)
+        self.gauge.set(lag)
+        self.histogram.observe(lag)
+        self._schedule()
+
+
+class ServiceMetrics(Registry):
+    """
+    元搜索服务的监控指标
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.search_duration = self.histogram('metase_search_duration_seconds', 'Duration of meta search requests')
+        self.fetch_duration = self.histogram('metase_fetch_duration_seconds',
+                                             'Duration of fetches dispatched to slaves', ['engine', 'stage'])
+        self.fetch_total = self.counter('metase_fetch_total',
+                                        'Fetches dispatched to slaves', ['engine', 'stage', 'result'])
+        self.hedged_total = self.counter('metase_hedged_fetch_total', 'Hedged page fetches', ['engine'])
+        self.upstream_duration = self.histogram('metase_upstream_fetch_duration_seconds',
+                                                'Duration of fetches from search engines', ['engine', 'rtype'])
+        self.upstream_total = self.counter('metase_upstream_fetch_total',
+                                           'Fetches from search engines by result: ok, empty, ban, http_error, error',
+                                           ['engine', 'rtype', 'result'])
+        self.gather_total = self.counter('metase_gather_total',
+                                         'Finished gather tasks by outcome: complete, early_stop, timeout',
+                                         ['level', 'outcome'])
+        self.slave_in_flight = self.gauge('metase_slave_in_flight', 'Fetches in flight per slave', ['slave'])
+        self.slave_connections = self.gauge('metase_slave_connections_in_use',
+                                            'Connections in use per slave', ['slave'])
+        self.slave_waiting = self.gauge('metase_slave_connections_waiting',
+                                        'Requests waiting for a connection per slave', ['slave'])
+        self.slave_requests = self.counter('metase_slave_pool_requests_total',
+                                           'Requests sent through the connection pool per slave', ['slave'])
+        self.slave_avg_wait = self.gauge('metase_slave_pool_avg_wait_seconds',
+                                         'Average time waiting for a connection per slave', ['slave'])
+        self.slave_max_wait = self.gauge('metase_slave_pool_max_wait_seconds',
+                                         'Maximum time waiting for a connection per slave', ['slave'])
+        self.cache_requests = self.counter('metase_cache_requests_total', 'Cache lookups by result',
+                                           ['cache', 'result'])
+        self.loop_lag = self.gauge('metase_event_loop_lag_seconds', 'Latest event loop lag')
+        self.loop_lag_distribution = self.histogram('metase_event_loop_lag_distribution_seconds',
+                                                    'Distribution of event loop lag',
+                                                    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+    def bind(self, server):
+        """
+        设置从服务中读取数值的回调函数
+        """
+
+        def slaves():
+            res = {}
+            for slave_list in server.slave_map.values():
+                for s in slave_list:
+                    res[s.address] = s
+            return res
+
+        def pool_stats(key):
+            return lambda: {(k,): s.pool.stats()[key] for k, s in slaves().items()}
+
+        self.slave_in_flight.set_callback(lambda: {(k,): s.health.in_flight for k, s in slaves().items()})
+        self.slave_connections.set_callback(pool_stats('in_use'))
+        self.slave_waiting.set_callback(pool_stats('waiting'))
+        self.slave_requests.set_callback(pool_stats('requests'))
+        self.slave_avg_wait.set_callback(pool_stats('avg_wait_time'))
+        self.slave_max_wait.set_callback(pool_stats('max_wait_time'))
+
+        def caches():
+            res = {}
+            for name, cache in (('result', server.result_cache), ('page', server.page_cache),
+                                ('real_url', getattr(server.real_url_cache, 'memory', None)),
+                                ('session', server.result_sessions)):
+                if cache is not None:
+                    res[(name, 'hit')] = cache.hits
+                    res[(name, 'miss')] = cache.misses
+            return res
+
+        self.cache_requests.set_callback(caches)
+
+    def on_gather(self, level, task):
+        self.gather_total.labels(level, task.outcome or 'timeout').inc()
@@ -0,0 +1,142 @@
+# coding=utf-8
+
+"""
+排名融合策略
+
+检索结果在每个搜索引擎中的评分为 搜索源权重 * 排名评分，同一条检索结果在多个搜索引擎中的评分相加，
+再由融合策略的combine得到最终的相关性评分
+"""
+
+import json
+import math
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class Fuser:
+    """
+    排名融合策略的基类
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def source_weight(self, search_engine):
+        """
+        :return: 搜索源的权重
+        """
+        return search_engine.source_importance
+
+    def rank_scores(self, n):
+        """
+        :return: 长度至少为n的列表，第i个元素为排名i（从0开始）的评分
+        """
+        raise NotImplementedError
+
+    def combine(self, score, hits):
+        """
+        :param score: 各个搜索引擎中的评分之和
+        :param hits: 包含该检索结果的搜索引擎数量
+        :return: 最终的相关性评分
+        """
+        return score
+
+
+class CachedRankFuser(Fuser):
+    """
+    排名评分只与排名有关，计算后缓存
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._scores = []
+
+    def rank_score(self, i):
+        raise NotImplementedError
+
+    def rank_scores(self, n):
+        for i in range(len(self._scores), n):
+            self._scores.append(self.rank_score(i))
+        return self._scores
+
+
+class DefaultFuser(CachedRankFuser):
+    """
+    搜索源权重为source_importance，排名评分为 (sqrt(i + 1) + 2) / sqrt(i + 1)
+    """
+
+    def rank_score(self, i):
+        return (math.sqrt(i + 1) + 2) / math.sqrt(i + 1)
+
+
+class RRFFuser(CachedRankFuser):
+    """
+    Reciprocal Rank Fusion，排名评分为 1 / (k + i + 1)
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.k = config.get('rrf_k')
+
+    def rank_score(self, i):
+        return 1 / (self.k + i + 1)
+
+
+class CombSumFuser(Fuser):
+    """
+    CombSUM，排名评分为按检索结果数量归一化的排名 1 - i / n
+    """
+
+    def rank_scores(self, n):
+        return [1 - i / n for i in range(n)]
+
+
+class CombMNZFuser(CombSumFuser):
+    """
+    CombMNZ，在CombSUM的基础上乘以包含该检索结果的搜索引擎数量
+    """
+
+    def combine(self, score, hits):
+        return score * hits
+
+
+class LearnedFuser(DefaultFuser):
+    """
+    使用离线根据点击日志学习的权重，启动时从fusion_weights_file加载，JSON格式：
+
+    {"sources": {搜索引擎代号: 权重}, "positions": [排名0的评分, 排名1的评分, ...]}
+
+    没有学习到权重的搜索引擎使用source_importance，超出positions的排名使用最后一个评分，
+    没有positions时使用DefaultFuser的排名评分
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.weights = {}
+        self.positions = []
+        path = config.get('fusion_weights_file')
+        if path:
+            self.load(path)
+        else:
+            log.info('No fusion weights file, use the default weights')
+
+    def load(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.weights = {k: float(v) for k, v in (data.get('sources') or {}).items()}
+        self.positions = [float(i) for i in (data.get('positions') or [])]
+        self._scores = []
+
+    def source_weight(self, search_engine):
+        w = self.weights.get(search_engine.name)
+        if w is None:
+            return search_engine.source_importance
+        return w
+
+    def rank_score(self, i):
+        if len(self.positions) == 0:
+            return super().rank_score(i)
+        if i < len(self.positions):
+            return self.positions[i]
+        return self.positions[-1]
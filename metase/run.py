@@ -4,6 +4,8 @@ import os
 import logging
 
 from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+from tornado.process import fork_processes
 
 from metase.utils import configure_logger, configure_tornado_logger, daemonize
 from metase.config import DEFAULT_CONFIG
@@ -24,12 +26,21 @@ def run_server(config):
 
     pid_file = config.get('pid_file')
     _write_pid_file(pid_file)
+    # fork出的工作进程也会执行finally，只有写入PID文件的主进程退出时才删除
+    pid = os.getpid()
     try:
+        sockets = None
+        workers = config.get('workers')
+        if workers != 1:
+            # 多个工作进程共享监听的socket，崩溃的工作进程会被重启
+            sockets = bind_sockets(config.get('port'), config.get('host'), reuse_port=True)
+            config['worker_id'] = fork_processes(workers, max_restarts=config.get('max_worker_restarts'))
         server = MseServer(config)
-        server.on_start()
+        server.on_start(sockets=sockets)
         IOLoop.current().start()
     finally:
-        _remove_pid_file(pid_file)
+        if os.getpid() == pid:
+            _remove_pid_file(pid_file)
 
 
 def _write_pid_file(pid_file):
@@ -4,8 +4,9 @@ import inspect
 from http.cookies import SimpleCookie
 
 from xpaw import HttpHeaders, HttpResponse, HttpRequest
+from xpaw.errors import HttpError
 
-from metase.utils import walk_modules
+from metase.utils import walk_modules, rewrite_url
 
 
 class SearchEngine:
@@ -15,20 +16,39 @@ class SearchEngine:
     name: 搜索引擎代号
     fake_url: 检索结果中的URL是否是虚假的
     source_importance: 搜索源的相对权重，1: 一般，2: 重要，3: 非常重要
+    extraction: 检索结果的提取规则，没有重写extract_results时使用
+    page_size: 每个检索页的检索结果数量
+    max_results: 搜索引擎最多返回的检索结果数量，None表示没有限制，超出的检索页不会下载
+    homepage_url: 设置后检索请求轮流使用Cookie会话，并定时通过主页刷新Cookie
+    default_cookies: 每个Cookie会话默认携带的Cookie
 
     加载引擎前注入如下属性：
     downloader: HTTP客户端
     extension: 拓展
     config: 配置
+    cookie_store: Cookie会话的存储
     """
 
     name = ''
     fake_url = False
     source_importance = 1
+    extraction = None
+    page_size = 10
+    max_results = None
+    homepage_url = None
+    default_cookies = None
 
     downloader = None
     extension = None
     config = None
+    cookie_store = None
+
+    _cookie_index = 0
+
+    def start(self):
+        """
+        服务启动时调用，例如开始定时任务
+        """
 
     def search_url(self, query):
         raise NotImplemented
@@ -54,17 +74,63 @@ class SearchEngine:
             text: 摘要
             url: 网页URL
         """
-        raise NotImplemented
+        if self.extraction is None:
+            raise NotImplemented
+        return self.extraction.extract(response.text)
 
-    def before_request(self, request: HttpRequest):
+    async def before_request(self, request: HttpRequest):
         """
         请求前的处理函数
         """
-
-    def after_request(self, response: HttpResponse):
+        if self.homepage_url is None:
+            return
+        index = self.next_cookie_session()
+        request.meta['cookie_session'] = index
+        values = dict(self.default_cookies or {})
+        values.update(await self.cookie_store.get(self.name, index))
+        if len(values) > 0:
+            cookies = SimpleCookie()
+            for k, v in values.items():
+                cookies[k] = v
+            self.set_cookie_header(request, cookies)
+
+    async def after_request(self, response: HttpResponse):
         """
         请求后的处理函数
         """
+        if self.homepage_url is None:
+            return
+        index = response.meta.get('cookie_session')
+        if index is None:
+            return
+        cookies = self.get_cookies_in_response(response)
+        if len(cookies) > 0:
+            await self.cookie_store.update(self.name, index, {k: v.value for k, v in cookies.items()})
+
+    def next_cookie_session(self):
+        """
+        轮流选择Cookie会话
+        """
+        index = self._cookie_index % self.config.get('cookie_sessions')
+        self._cookie_index = index + 1
+        return index
+
+    def homepage_request(self):
+        return HttpRequest(self.homepage_url)
+
+    async def refresh_cookies(self):
+        """
+        避免被BAN，通过主页获取新的Cookie
+        :return: Cookie的dict
+        """
+        req = self.homepage_request()
+        req.url = rewrite_url(req.url, self.config.get('url_rewrites'))
+        await self.extension.handle_request(req)
+        try:
+            resp = await self.downloader.fetch(req)
+        except HttpError as e:
+            resp = e.response
+        return {k: v.value for k, v in self.get_cookies_in_response(resp).items()}
 
     def get_cookies_in_response(self, response: HttpResponse):
         cookies = SimpleCookie()
@@ -4,8 +4,9 @@ import logging
 from urllib.request import quote
 
 from metase.search_engine import SearchEngine
+from metase.extraction import ExtractionRule, Field
 
-from xpaw import Selector, HttpRequest
+from xpaw import HttpRequest
 
 log = logging.getLogger(__name__)
 
@@ -17,6 +18,11 @@ class Ask(SearchEngine):
 
     page_size = 10
 
+    extraction = ExtractionRule('li.algo-result',
+                                title=Field('a.algo-title'),
+                                text=Field('span.algo-summary'),
+                                url=Field(('a.algo-title', 'href')))
+
     def search_url(self, query):
         return 'https://www.search.ask.com/web?q={}'.format(quote(query))
 
@@ -27,15 +33,3 @@ class Ask(SearchEngine):
         for num in range(0, max_records, self.page_size):
             url = 'https://www.search.ask.com/web?q={}&page={}'.format(quote(query), num // self.page_size + 1)
             yield HttpRequest(url)
-
-    def extract_results(self, response):
-        selector = Selector(response.text)
-        for item in selector.css('li.algo-result'):
-            title = item.css('a.algo-title')[0].text.strip()
-            text = None
-            span = item.css('span.algo-summary')
-            if len(span) > 0:
-                text = span[0].text.strip()
-            url = item.css('a.algo-title')[0].attr('href').strip()
-            if text is not None:
-                yield {'title': title, 'text': text, 'url': url}
@@ -2,12 +2,11 @@
 
 import logging
 from urllib.request import quote
-from http.cookies import SimpleCookie
-import asyncio
 
 from metase.search_engine import SearchEngine
+from metase.extraction import ExtractionRule, Field
 
-from xpaw import Selector, HttpRequest
+from xpaw import HttpRequest
 
 import time
 from datetime import datetime, timedelta
@@ -21,10 +20,12 @@ class Baidu(SearchEngine):
     source_importance = 2
 
     page_size = 10
+    homepage_url = 'http://www.baidu.com/'
 
-    def __init__(self):
-        self.cookies = SimpleCookie()
-        asyncio.ensure_future(self.update_cookies())
+    extraction = ExtractionRule('div.result',
+                                title=Field('h3>a'),
+                                text=Field('div.c-abstract'),
+                                url=Field(('h3>a', 'href')))
 
     def search_url(self, query):
         return 'https://www.baidu.com/s?wd={}'.format(quote(query))
@@ -57,36 +58,3 @@ class Baidu(SearchEngine):
         for num in range(0, max_records, self.page_size):
             url = '{}&pn={}'.format(raw_url, num)
             yield HttpRequest(url)
-
-    def extract_results(self, response):
-        selector = Selector(response.text)
-        for item in selector.css('div.result'):
-            title = item.css('h3>a')[0].text.strip()
-            text = None
-            abstract = item.css('div.c-abstract')
-            if len(abstract) > 0:
-                text = abstract[0].text.strip()
-            url = item.css('h3>a')[0].attr('href').strip()
-            if text is not None:
-                yield {'title': title, 'text': text, 'url': url}
-
-    def before_request(self, request):
-        self.set_cookie_header(request, self.cookies)
-
-    def after_request(self, response):
-        self.cookies.update(self.get_cookies_in_response(response))
-
-    async def update_cookies(self):
-        """
-        避免被BAN，定时通过主页刷新Cookie
-        """
-        while True:
-            try:
-                req = HttpRequest('http://www.baidu.com/')
-                await self.extension.handle_request(req)
-                resp = await self.downloader.fetch(req)
-                self.cookies.update(self.get_cookies_in_response(resp))
-            except Exception as e:
-                log.warning('Failed to update cookies: %s', e)
-            finally:
-                await asyncio.sleep(5 * 60)
@@ -4,8 +4,9 @@ import logging
 from urllib.request import quote
 
 from metase.search_engine import SearchEngine
+from metase.extraction import ExtractionRule, Field
 
-from xpaw import Selector, HttpRequest
+from xpaw import HttpRequest
 
 log = logging.getLogger(__name__)
 
@@ -17,6 +18,11 @@ class Bing(SearchEngine):
 
     page_size = 10
 
+    extraction = ExtractionRule('li.b_algo',
+                                title=Field('h2>a'),
+                                text=Field('div.b_caption>p'),
+                                url=Field(('h2>a', 'href')))
+
     def search_url(self, query):
         return 'https://www.bing.com/search?q={}'.format(quote(query))
 
@@ -49,15 +55,3 @@ class Bing(SearchEngine):
         for num in range(0, max_records, self.page_size):
             url = '{}&first={}'.format(raw_url, num + 1)
             yield HttpRequest(url)
-
-    def extract_results(self, response):
-        selector = Selector(response.text)
-        for item in selector.css('li.b_algo'):
-            title = item.css('h2>a')[0].text.strip()
-            text = None
-            span = item.css('div.b_caption>p')
-            if len(span) > 0:
-                text = span[0].text.strip()
-            url = item.css('h2>a')[0].attr('href').strip()
-            if text is not None:
-                yield {'title': title, 'text': text, 'url': url}
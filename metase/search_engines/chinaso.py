@@ -2,13 +2,11 @@
 
 import logging
 from urllib.request import quote, urljoin
-import asyncio
-from http.cookies import SimpleCookie
 
-from xpaw import Selector, HttpRequest
-from xpaw.errors import HttpError
+from xpaw import HttpRequest
 
 from metase.search_engine import SearchEngine
+from metase.extraction import ExtractionRule, Field
 
 log = logging.getLogger(__name__)
 
@@ -19,10 +17,13 @@ class Chinaso(SearchEngine):
     source_importance = 2
 
     page_size = 10
+    homepage_url = 'http://www.chinaso.com/search/pagesearch.htm?q={}'.format(quote('中国搜索'))
 
-    def __init__(self):
-        self.cookies = SimpleCookie()
-        asyncio.ensure_future(self.update_cookies())
+    extraction = ExtractionRule('li.reItem',
+                                title=Field('h2>a'),
+                                text=Field('div.reNewsWrapper', process=lambda x: x.split('\n')[0]),
+                                url=Field(('h2>a', 'href'),
+                                          process=lambda x: urljoin('http://www.chinaso.com/search/', x)))
 
     def search_url(self, query):
         return 'http://www.chinaso.com/search/pagesearch.htm?q={}'.format(quote(query))
@@ -37,40 +38,5 @@ class Chinaso(SearchEngine):
                                                                                            quote(query))
             yield HttpRequest(url)
 
-    def before_request(self, request):
-        self.set_cookie_header(request, self.cookies)
-
-    def after_request(self, response):
-        self.cookies.update(self.get_cookies_in_response(response))
-
-    def extract_results(self, response):
-        selector = Selector(response.text)
-        for item in selector.css('li.reItem'):
-            a = item.css('h2>a')
-            if len(a) <= 0:
-                continue
-            title = a[0].text.strip()
-            text = None
-            div = item.css('div.reNewsWrapper')
-            if len(div) > 0:
-                text = div[0].text.strip().split('\n')[0]
-            url = urljoin('http://www.chinaso.com/search/', item.css('h2>a')[0].attr('href').strip())
-            if text is not None:
-                yield {'title': title, 'text': text, 'url': url}
-
-    async def update_cookies(self):
-        while True:
-            try:
-                url = 'http://www.chinaso.com/search/pagesearch.htm?q={}'.format(quote('中国搜索'))
-                try:
-                    req = HttpRequest(url, allow_redirects=False)
-                    await self.extension.handle_request(req)
-                    resp = await self.downloader.fetch(req)
-                except HttpError as e:
-                    resp = e.response
-                cookies = self.get_cookies_in_response(resp)
-                self.cookies.update(cookies)
-            except Exception as e:
-                log.warning('Failed to update cookies: %s', e)
-            finally:
-                await asyncio.sleep(5 * 60)
+    def homepage_request(self):
+        return HttpRequest(self.homepage_url, allow_redirects=False)
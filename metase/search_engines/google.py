@@ -4,8 +4,9 @@ import logging
 from urllib.request import quote
 
 from metase.search_engine import SearchEngine
+from metase.extraction import ExtractionRule, Field
 
-from xpaw import Selector, HttpRequest
+from xpaw import HttpRequest
 
 log = logging.getLogger(__name__)
 
@@ -17,6 +18,11 @@ class Google(SearchEngine):
 
     page_size = 10
 
+    extraction = ExtractionRule('div.g',
+                                title=Field('h3'),
+                                text=Field('span.st'),
+                                url=Field(('div.r>a', 'href')))
+
     def search_url(self, query):
         return 'https://www.google.com.hk/search?q={}'.format(quote(query))
 
@@ -54,15 +60,3 @@ class Google(SearchEngine):
         for num in range(0, max_records, self.page_size):
             url = '{}&start={}'.format(raw_url, num + 1)
             yield HttpRequest(url)
-
-    def extract_results(self, response):
-        selector = Selector(response.text)
-        for item in selector.css('div.g'):
-            title = item.css('h3')[0].text.strip()
-            text = None
-            span_st = item.css('span.st')
-            if len(span_st) > 0:
-                text = span_st[0].text.strip()
-            url = item.css('div.r>a')[0].attr('href').strip()
-            if text is not None:
-                yield {'title': title, 'text': text, 'url': url}
@@ -2,11 +2,10 @@
 
 import logging
 from urllib.request import quote, urljoin
-import asyncio
-from http.cookies import SimpleCookie
 
 from metase.search_engine import SearchEngine
-from xpaw import Selector, HttpRequest
+from metase.extraction import ExtractionRule, Field
+from xpaw import HttpRequest
 
 log = logging.getLogger(__name__)
 
@@ -17,11 +16,13 @@ class Sogou(SearchEngine):
     source_importance = 2
 
     page_size = 20
+    homepage_url = 'https://www.sogou.com/'
+    default_cookies = {'com_sohu_websearch_ITEM_PER_PAGE': str(page_size)}
 
-    def __init__(self):
-        self.cookies = SimpleCookie()
-        self.cookies['com_sohu_websearch_ITEM_PER_PAGE'] = str(self.page_size)
-        asyncio.ensure_future(self.update_cookies())
+    extraction = ExtractionRule('div.vrwrap,div.rb',
+                                title=Field('h3>a'),
+                                text=Field('div.ft', 'p.str_info'),
+                                url=Field(('h3>a', 'href'), process=lambda x: urljoin('https://www.sogou.com/', x)))
 
     def search_url(self, query):
         return 'https://www.sogou.com/web?query={}'.format(quote(query))
@@ -60,43 +61,3 @@ class Sogou(SearchEngine):
         for num in range(0, max_records, self.page_size):
             url = '{}&page={}&ie=utf8'.format(raw_url, num // self.page_size + 1)
             yield HttpRequest(url)
-
-    def before_request(self, request):
-        self.set_cookie_header(request, self.cookies)
-
-    def after_request(self, response):
-        self.cookies.update(self.get_cookies_in_response(response))
-
-    def extract_results(self, response):
-        selector = Selector(response.text)
-        for item in selector.css('div.vrwrap,div.rb'):
-            h = item.css('h3>a')
-            if len(h) <= 0:
-                continue
-            title = h[0].text.strip()
-            text = None
-            div_ft = item.css('div.ft')
-            if len(div_ft) > 0:
-                text = div_ft[0].text.strip()
-            else:
-                p_str = item.css('p.str_info')
-                if len(p_str) > 0:
-                    text = p_str[0].text.strip()
-            url = urljoin('https://www.sogou.com/', item.css('h3>a')[0].attr('href').strip())
-            if text is not None:
-                yield {'title': title, 'text': text, 'url': url}
-
-    async def update_cookies(self):
-        """
-        避免被BAN，定时通过主页刷新Cookie
-        """
-        while True:
-            try:
-                req = HttpRequest('https://www.sogou.com/')
-                await self.extension.handle_request(req)
-                resp = await self.downloader.fetch(req)
-                self.cookies.update(self.get_cookies_in_response(resp))
-            except Exception as e:
-                log.warning('Failed to update cookies: %s', e)
-            finally:
-                await asyncio.sleep(5 * 60)
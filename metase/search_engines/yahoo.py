@@ -5,11 +5,24 @@ from urllib.request import quote, unquote
 import re
 
 from metase.search_engine import SearchEngine
+from metase.extraction import ExtractionRule, Field
 
-from xpaw import Selector, HttpRequest
+from xpaw import HttpRequest
 
 log = logging.getLogger(__name__)
 
+yahoo_url_reg = re.compile(r'/RU=(.+?)/')
+
+
+def get_real_url(url):
+    """
+    :return: 跳转链接中的真实URL，没有时返回None，只丢弃该条检索结果
+    """
+    m = yahoo_url_reg.search(url)
+    if m is None:
+        return
+    return unquote(m.group(1))
+
 
 class Yahoo(SearchEngine):
     name = 'Yahoo'
@@ -18,6 +31,11 @@ class Yahoo(SearchEngine):
 
     page_size = 10
 
+    extraction = ExtractionRule('div.algo-sr',
+                                title=Field('h3>a'),
+                                text=Field('p.lh-l'),
+                                url=Field(('h3>a', 'href'), process=get_real_url))
+
     def search_url(self, query):
         return 'https://hk.search.yahoo.com/search?p={}'.format(quote(query))
 
@@ -54,18 +72,3 @@ class Yahoo(SearchEngine):
         for num in range(0, max_records, self.page_size):
             url = '{}&b={}'.format(raw_url, num + 1)
             yield HttpRequest(url)
-
-    yahoo_url_reg = re.compile(r'/RU=(.+?)/')
-
-    def extract_results(self, response):
-        selector = Selector(response.text)
-        for item in selector.css('div.algo-sr'):
-            title = item.css('h3>a')[0].text.strip()
-            text = None
-            p_lh_l = item.css('p.lh-l')
-            if len(p_lh_l) > 0:
-                text = p_lh_l[0].text.strip()
-            url = item.css('h3>a')[0].attr('href').strip()
-            url = unquote(self.yahoo_url_reg.search(url).group(1))
-            if text is not None:
-                yield {'title': title, 'text': text, 'url': url}
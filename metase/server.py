@@ -2,17 +2,23 @@
 
 import logging
 from collections import defaultdict
-import pickle
 import asyncio
 import re
-import random
 from urllib.request import urljoin
 import math
 import time
 import hashlib
+import hmac
+import base64
 import inspect
+import json
+import zlib
+import os
+import binascii
 
 from tornado.web import Application, RequestHandler
+from tornado.httpserver import HTTPServer
+from tornado.process import cpu_count
 
 from xpaw import Downloader, HttpRequest
 from xpaw.errors import HttpError, ClientError
@@ -23,6 +29,19 @@ from xpaw.renderer import ChromeRenderer
 from metase.search_engine import load_search_engines, SearchEngine
 from metase.slave import Slave
 from metase.gather import GatherTask
+from metase.cache import LRUCache, SqliteCache, LayeredCache
+from metase.errors import CodecError, OverloadError
+from metase.executor import ExtractExecutor
+from metase.cookies import CookieRefresher
+from metase.merge import merge_results, rank_results
+from metase.dedup import canonicalize_url, NearDuplicateIndex
+from metase.metrics import ServiceMetrics, LoopLagMonitor
+from metase.tracing import Tracer, NOOP_SPAN, SPAN_KIND_CLIENT
+from metase import codec
+from metase.singleflight import SingleFlight
+from metase.latency import LatencyWindow
+from metase.hedging import HedgeBudget
+from metase.utils import canonical_url, load_object, rewrite_url
 
 log = logging.getLogger(__name__)
 
@@ -43,22 +62,118 @@ class MseServer:
         self.api_version = self.config.get('api_version')
         self.downloader = Downloader(max_clients=config.get('max_clients'), renderer=ChromeRenderer())
         self.extension = ExtensionManager(UserAgentMiddleware(user_agent=':desktop'))
+        self.cookie_store = load_object(self.config.get('cookie_store'))(self.config)
+        self.cookie_refresher = CookieRefresher(self.cookie_store, self.config.get('cookie_refresh_interval'),
+                                                jitter=self.config.get('cookie_refresh_jitter'))
         self.search_engines = self._load_search_engines()
+        self.fusers = self._load_fusers()
+        self.extractor = ExtractExecutor(self.search_engines,
+                                         executor=self.config.get('extract_executor'),
+                                         workers=self.config.get('extract_workers'),
+                                         max_pending=self.config.get('extract_max_pending'))
+        self.fetch_flight = SingleFlight()
         self.slave_map = self._make_slave_map()
+        self.slave_selector = load_object(self.config.get('slave_selector'))(self.config)
+        self.latency = defaultdict(lambda: LatencyWindow(self.config.get('latency_window')))
+        self.hedge_budget = HedgeBudget(self.config.get('hedge_budget'), burst=self.config.get('hedge_burst'))
+        self.result_cache = self._make_result_cache()
+        self.page_cache = self._make_page_cache()
+        self.page_refreshing = set()
+        self.real_url_cache = self._make_real_url_cache()
+        self.search_flight = SingleFlight()
+        self.result_sessions = LRUCache(self.config.get('result_session_size'),
+                                        ttl=self.config.get('result_session_ttl'))
+        self.metrics = ServiceMetrics()
+        self.metrics.bind(self)
+        self.loop_lag_monitor = LoopLagMonitor(self.metrics.loop_lag, self.metrics.loop_lag_distribution,
+                                               interval=self.config.get('loop_lag_interval'))
+        self.tracer = Tracer(self.config)
+        if not self.config.get('api_secret'):
+            log.warning('api_secret is not set: requests to slaves are not authenticated '
+                        'and deferred real-url resolution (resolve_top) is disabled')
 
-    def on_start(self):
+    def on_start(self, sockets=None):
+        """
+        :param sockets: 多进程模式下各工作进程共享的监听socket
+        """
+        for name, se in self.search_engines.items():
+            if self.is_engine_owner(name):
+                se.start()
+            if se.homepage_url is not None and self.cookie_store.refreshable \
+                    and (not self.cookie_store.shared or self.is_engine_owner(name)):
+                self.cookie_refresher.start(se, self.config.get('cookie_sessions'))
         apis = [
-            ('/api/v{}/fetch'.format(self.api_version), FetchHanlder, dict(server=self))
+            ('/api/v{}/fetch'.format(self.api_version), FetchHanlder, dict(server=self)),
+            ('/api/v{}/batch_fetch'.format(self.api_version), BatchFetchHandler, dict(server=self))
         ]
+        if self.config.get('metrics'):
+            apis.append(('/metrics', MetricsHandler, dict(server=self)))
+            self.loop_lag_monitor.start()
         if not self.config.get('only_slave'):
             apis.append(('/api/v{}/search'.format(self.api_version), SearchHandler, dict(server=self)))
+            apis.append(('/api/v{}/resolve'.format(self.api_version), ResolveHandler, dict(server=self)))
+            apis.append(('/api/v{}/cookies'.format(self.api_version), CookieHandler, dict(server=self)))
         app = Application(apis, compress_response=True)
         host = self.config.get('host')
         port = self.config.get('port')
-        app.listen(port, host)
-        log.info('meta search service is available on %s:%s', host, port)
+        if sockets is None:
+            app.listen(port, host)
+        else:
+            server = HTTPServer(app)
+            server.add_sockets(sockets)
+        worker_id = self.config.get('worker_id')
+        if worker_id is None:
+            log.info('meta search service is available on %s:%s', host, port)
+        else:
+            log.info('meta search service is available on %s:%s (worker %s)', host, port, worker_id)
+
+    def is_engine_owner(self, name):
+        """
+        多进程模式下每个搜索引擎的定时任务（例如刷新共享的Cookie）只由一个工作进程负责
+        """
+        worker_id = self.config.get('worker_id')
+        if worker_id is None:
+            return True
+        workers = self.config.get('workers') or cpu_count()
+        return zlib.crc32(name.encode('utf-8')) % workers == worker_id
 
     async def meta_search(self, query, **kwargs):
+        sources, request_params, resolve_top, fusion, max_records = self._search_params(kwargs)
+        span = kwargs.get('span') or NOOP_SPAN
+
+        start_time = time.time()
+        cache_key = self._result_cache_key(query, sources, request_params, resolve_top, fusion, max_records)
+        if self.result_cache is not None:
+            cached = self.result_cache.get(cache_key)
+            span.set_attribute('cache_hit', cached is not None)
+            if cached is not None:
+                req_meta = dict(cached['meta']['request'])
+                req_meta['query'] = query
+                resp_meta = dict(cached['meta']['response'])
+                resp_meta['duration'] = round(time.time() - start_time, 3)
+                resp_meta['cache'] = self._result_cache_meta(True)
+                return {
+                    'meta': {
+                        'request': req_meta,
+                        'response': resp_meta
+                    },
+                    'records': cached['records']
+                }
+
+        callback = kwargs.get('callback')
+        if callback is not None:
+            return await self._search(query, sources, request_params, cache_key, resolve_top=resolve_top,
+                                      fusion=fusion, max_records=max_records, callback=callback, span=span)
+        # 加入其他请求正在进行的检索时，各个阶段的span只记录在发起检索的请求中
+        span.set_attribute('shared', cache_key in self.search_flight)
+        return await self.search_flight.do(cache_key, self._search, query, sources, request_params, cache_key,
+                                           resolve_top=resolve_top, fusion=fusion, max_records=max_records, span=span)
+
+    def _search_params(self, kwargs):
+        """
+        归一化meta_search的参数
+        :return: (sources, request_params, resolve_top, fusion, max_records)
+        """
         sources = kwargs.get('sources')
         if sources is None:
             sources = [i for i in self.search_engines]
@@ -71,12 +186,115 @@ class MseServer:
             data_source_results = 10
         if data_source_results > 500:
             data_source_results = 500
-        recent_days = kwargs.get('recent_days')
-        site = kwargs.get('site')
         request_params = dict(data_source_results=data_source_results,
-                              recent_days=recent_days,
-                              site=site)
+                              recent_days=kwargs.get('recent_days'),
+                              site=kwargs.get('site'))
+        fusion = kwargs.get('fusion')
+        if fusion is None:
+            fusion = self.config.get('fusion')
+        if fusion not in self.fusers:
+            raise ValueError('fusion: {}'.format(fusion))
+        resolve_top = kwargs.get('resolve_top')
+        if not self.config.get('api_secret'):
+            # 没有设置api_secret时resolve_token可以被伪造，不推迟获取真实URL
+            resolve_top = None
+        return sources, request_params, resolve_top, fusion, kwargs.get('max_records')
 
+    async def search_page(self, query, page, page_size, session=None, span=NOOP_SPAN, **kwargs):
+        """
+        分页获取检索结果，第一次检索的合并结果保存在会话中，后续分页直接从会话中获取，
+        超出已获取的检索结果时增加data_source_results重新检索，并将新的检索结果追加到会话中，已返回的分页不变
+        :param page: 页码，从1开始
+        :param page_size: 每页的检索结果数量
+        :param session: 会话ID，为None、会话已过期或会话的检索参数与本次不同时重新检索
+        :param span: 追踪耗时的span
+        :param kwargs: meta_search的参数
+        """
+        start_time = time.time()
+        key = self._result_cache_key(query, *self._search_params(kwargs))
+        sess = None
+        if session is not None:
+            sess = self.result_sessions.get(session)
+            if sess is not None and sess['key'] != key:
+                sess = None
+        span.set_attribute('session_hit', sess is not None)
+        if sess is None:
+            packed_results = await self.meta_search(query, span=span.child('meta_search'), **kwargs)
+            session = binascii.hexlify(os.urandom(16)).decode('ascii')
+            sess = {
+                'query': query,
+                'key': key,
+                'kwargs': kwargs,
+                'meta': packed_results['meta'],
+                'records': list(packed_results['records']),
+                'data_source_results': packed_results['meta']['request']['data_source_results'],
+                'exhausted': False
+            }
+        end = page * page_size
+        while len(sess['records']) < end and not sess['exhausted']:
+            await self._extend_session(sess, span=span)
+        self.result_sessions.set(session, sess)
+        records = sess['records'][end - page_size:end]
+
+        req_meta = dict(sess['meta']['request'])
+        req_meta['query'] = query
+        req_meta['data_source_results'] = sess['data_source_results']
+        req_meta['max_records'] = len(records)
+        req_meta['page'] = page
+        req_meta['page_size'] = page_size
+        req_meta['session'] = session
+        resp_meta = dict(sess['meta']['response'])
+        resp_meta['duration'] = round(time.time() - start_time, 3)
+        resp_meta['total_records'] = len(sess['records'])
+        resp_meta['has_more'] = end < len(sess['records']) or not sess['exhausted']
+        return {
+            'meta': {
+                'request': req_meta,
+                'response': resp_meta
+            },
+            'records': records
+        }
+
+    async def _extend_session(self, sess, span=NOOP_SPAN):
+        """
+        加倍data_source_results重新检索，已下载的检索页可以从slave节点的缓存中获取
+        """
+        data_source_results = sess['data_source_results']
+        if data_source_results >= 500:
+            sess['exhausted'] = True
+            return
+        data_source_results = min(data_source_results * 2, 500)
+        kwargs = dict(sess['kwargs'])
+        kwargs['data_source_results'] = data_source_results
+        kwargs['span'] = span.child('meta_search', data_source_results=data_source_results)
+        packed_results = await self.meta_search(sess['query'], **kwargs)
+        records = sess['records']
+        seen = set(r['url'] for r in records)
+        added = 0
+        for r in packed_results['records']:
+            if r['url'] not in seen:
+                # 复制检索结果，避免修改结果缓存中的数据
+                r = dict(r)
+                r['id'] = len(records) + 1
+                records.append(r)
+                added += 1
+        sess['data_source_results'] = data_source_results
+        sess['meta'] = packed_results['meta']
+        if added == 0 or data_source_results >= 500:
+            sess['exhausted'] = True
+
+    async def _search(self, query, sources, request_params, cache_key, resolve_top=None, fusion=None,
+                      max_records=None, callback=None, span=NOOP_SPAN):
+        """
+        向各个搜索引擎下发检索请求并合并检索结果
+        :param resolve_top: 不为None时只获取每个搜索引擎前resolve_top条检索结果的真实URL，
+            其余检索结果带有resolve_token，通过resolve接口获取真实URL
+        :param fusion: 排名融合策略的名称
+        :param max_records: 不为None时只返回相关性最高的max_records条检索结果
+        :param callback: 每个搜索引擎的检索完成后以当前已合并的检索结果调用
+        :param span: 追踪耗时的span，每个搜索引擎、检索页、slave节点请求、真实URL和合并排序记录为子span
+        """
+        data_source_results = request_params['data_source_results']
         start_time = time.time()
         req = {}
         for s in sources:
@@ -86,40 +304,224 @@ class MseServer:
                 req[s].append(r)
 
         req_index = [i for i in req.keys()]
-        task = GatherTask(len(req_index), self.config.get('timeout'))
+        req_meta = {
+            'data_source_results': data_source_results,
+            'query': query,
+            'sources': sources,
+            'fusion': fusion
+        }
+
+        on_result = None
+        if callback is not None:
+            def on_result(index, result):
+                partial = self._collect_results(req_index, task.result, data_source_results, copy=True)
+                resp_meta = {
+                    'duration': round(time.time() - start_time, 3),
+                    'partial': True
+                }
+                callback(self._pack_results(query, partial, fusion=fusion, max_records=max_records,
+                                            request_meta=dict(req_meta), response_meta=resp_meta))
+
+        timeout = self.config.get('timeout')
+        deadline = start_time + timeout
+        task = GatherTask(len(req_index), early_stop=True, timeout=timeout, callback=on_result,
+                          ratio=self.config.get('early_stop_ratio'), min_wait=0)
+        gather_span = span.child('gather', engines=len(req_index))
         for i in range(len(req_index)):
-            asyncio.ensure_future(self._process_req_list(req[req_index[i]], req_index[i], task, i))
+            engine_span = gather_span.child('engine', engine=req_index[i], pages=len(req[req_index[i]]))
+            asyncio.ensure_future(self._process_req_list(req[req_index[i]], req_index[i], task, i, deadline,
+                                                         resolve=resolve_top is None, span=engine_span))
         await task.done()
+        self.metrics.on_gather('search', task)
+        gather_span.set_attribute('outcome', task.outcome or 'timeout')
+        gather_span.end()
+
+        res = self._collect_results(req_index, task.result, data_source_results)
+        if resolve_top is not None:
+            resolve_span = span.child('resolve_top', n=resolve_top)
+            await self._resolve_top(res, resolve_top, deadline)
+            resolve_span.end()
+        duration = time.time() - start_time
+        resp_meta = {
+            'duration': round(duration, 3)
+        }
+        packed_results = self._pack_results(query, res, fusion=fusion, max_records=max_records,
+                                            request_meta=req_meta, response_meta=resp_meta, span=span)
+        if self.result_cache is not None:
+            ttl = self._result_cache_ttl(request_params, task.result, packed_results)
+            if ttl is not None:
+                self.result_cache.set(cache_key, packed_results, ttl=ttl)
+            resp_meta['cache'] = self._result_cache_meta(False)
+        return packed_results
+
+    def _result_cache_ttl(self, request_params, results, packed_results):
+        """
+        没有检索结果时不缓存，避免slave节点故障期间缓存空结果；
+        部分搜索引擎未完成或没有返回检索结果时使用result_cache_partial_ttl
+        :param results: 各个搜索引擎的检索结果，未完成的为GatherTask.NO_RESULT
+        :return: 过期时间，None表示不缓存
+        """
+        if len(packed_results['records']) == 0:
+            return
+        if request_params['recent_days'] == 1:
+            ttl = self.config.get('result_cache_recent_ttl')
+        else:
+            ttl = self.config.get('result_cache_ttl')
+        for r in results:
+            if r is GatherTask.NO_RESULT or not r:
+                return min(ttl, self.config.get('result_cache_partial_ttl'))
+        return ttl
+
+    async def _resolve_top(self, results, n, deadline):
+        """
+        获取每个搜索引擎前n条检索结果的真实URL，并为所有虚假URL的检索结果添加resolve_token
+        """
+        records = []
+        for name in results:
+            if self.search_engines[name].fake_url:
+                for i in range(len(results[name])):
+                    r = results[name][i]
+                    r['resolve_token'] = self._make_resolve_token(name, r['url'])
+                    if i < n:
+                        records.append((name, r))
+        if len(records) <= 0:
+            return
+        t = GatherTask(len(records), timeout=max(deadline - time.time(), 0))
+        for i in range(len(records)):
+            name, r = records[i]
+            asyncio.ensure_future(self._get_real_url(r, name, t, i))
+        await t.done()
+        self.metrics.on_gather('resolve', t)
+
+    def _make_resolve_token(self, name, url):
+        expire_time = int(time.time() + self.config.get('resolve_token_ttl'))
+        data = base64.urlsafe_b64encode(json.dumps([name, url, expire_time]).encode('utf-8')).decode('ascii')
+        return '{}.{}'.format(data, self._sign_resolve_token(data))
+
+    def parse_resolve_token(self, token):
+        """
+        :return: (name, url)，token无效、已过期或没有设置api_secret时返回None
+        """
+        if not self.config.get('api_secret'):
+            return
+        try:
+            data, signature = token.rsplit('.', 1)
+            if not hmac.compare_digest(signature, self._sign_resolve_token(data)):
+                return
+            name, url, expire_time = json.loads(base64.urlsafe_b64decode(data.encode('ascii')).decode('utf-8'))
+        except (ValueError, TypeError):
+            return
+        if name not in self.search_engines or time.time() >= expire_time:
+            return
+        return name, url
+
+    def _sign_resolve_token(self, data):
+        secret = self.config.get('api_secret').encode('utf-8')
+        return hmac.new(secret, data.encode('ascii'), hashlib.sha256).hexdigest()[:16]
+
+    async def resolve_urls(self, tokens):
+        """
+        根据resolve_token批量获取真实URL
+        :return: token到真实URL的dict，无效的token或未能获取真实URL时为None
+        """
+        res = {}
+        records = []
+        for token in tokens:
+            res[token] = None
+            parsed = self.parse_resolve_token(token)
+            if parsed is not None:
+                name, url = parsed
+                records.append((token, name, {'url': url, 'resolve_token': token}))
+        if len(records) > 0:
+            t = GatherTask(len(records), timeout=self.config.get('timeout'))
+            for i in range(len(records)):
+                _, name, r = records[i]
+                asyncio.ensure_future(self._get_real_url(r, name, t, i))
+            await t.done()
+            self.metrics.on_gather('resolve', t)
+            for token, _, r in records:
+                if 'resolve_token' not in r:
+                    res[token] = r['url']
+        return res
 
+    @staticmethod
+    def _collect_results(req_index, results, data_source_results, copy=False):
+        """
+        整理各个搜索引擎的检索结果，未完成的搜索引擎不包含在内
+        :param copy: 是否复制检索结果，避免合并时修改仍在处理中的检索结果
+        """
         res = {}
         for i in range(len(req_index)):
+            resp = results[i]
+            if resp is GatherTask.NO_RESULT:
+                if copy:
+                    continue
+                resp = None
             k = req_index[i]
             res[k] = []
-            resp = task.result[i]
-            if resp and resp is not GatherTask.NO_RESULT:
-                for r in resp:
-                    res[k].append(r)
-            if len(res[k]) > data_source_results:
-                res[k] = res[k][:data_source_results]
+            if resp:
+                for r in resp[:data_source_results]:
+                    res[k].append(dict(r) if copy else r)
+        return res
 
-        duration = time.time() - start_time
-        req_meta = {
-            'data_source_results': data_source_results,
-            'query': query,
-            'sources': sources
-        }
-        resp_meta = {
-            'duration': round(duration, 3)
+    def _make_result_cache(self):
+        size = self.config.get('result_cache_size')
+        if not size:
+            return
+        return LRUCache(size, ttl=self.config.get('result_cache_ttl'))
+
+    def _make_page_cache(self):
+        size = self.config.get('page_cache_size')
+        if not size:
+            return
+        return LRUCache(size, ttl=self.config.get('page_cache_ttl'))
+
+    def _make_real_url_cache(self):
+        size = self.config.get('real_url_cache_size')
+        if not size:
+            return
+        ttl = self.config.get('real_url_cache_ttl')
+        shared = None
+        cache_file = self.config.get('real_url_cache_file')
+        if cache_file:
+            shared = SqliteCache(cache_file, ttl=ttl, max_entries=self.config.get('real_url_cache_file_max_entries'),
+                                 purge_interval=self.config.get('real_url_cache_file_purge_interval'))
+        return LayeredCache(LRUCache(size, ttl=ttl), shared)
+
+    @staticmethod
+    def _result_cache_key(query, sources, request_params, resolve_top=None, fusion=None, max_records=None):
+        """
+        归一化查询参数作为检索结果缓存的key
+        """
+        site = request_params.get('site')
+        if site:
+            site = site.strip().lower()
+        return (' '.join(query.lower().split()),
+                tuple(sorted(set(sources))),
+                request_params.get('data_source_results'),
+                request_params.get('recent_days'),
+                site or None,
+                resolve_top,
+                fusion,
+                max_records)
+
+    def _result_cache_meta(self, hit):
+        return {
+            'hit': hit,
+            'hits': self.result_cache.hits,
+            'misses': self.result_cache.misses
         }
-        packed_results = self._pack_results(query, res, request_meta=req_meta, response_meta=resp_meta)
-        return packed_results
 
     def _load_search_engines(self):
         SearchEngine.downloader = self.downloader
         SearchEngine.extension = self.extension
         SearchEngine.config = self.config
+        SearchEngine.cookie_store = self.cookie_store
         return load_search_engines()
 
+    def _load_fusers(self):
+        return {k: load_object(v)(self.config) for k, v in self.config.get('fusers').items()}
+
     def _make_slave_map(self):
         slaves = self.config.get('slaves')
         # 没有配置slave的情况下将自身设置为slave
@@ -140,95 +542,287 @@ class MseServer:
                 slave_map[a.strip()].append(slave)
         return slave_map
 
-    async def _process_req_list(self, req_list, name, task, index):
+    async def _process_req_list(self, req_list, name, task, index, deadline, resolve=True, span=NOOP_SPAN):
+        """
+        下载一个搜索引擎的检索页，设置page_wave_size时分批下载，每批的数量加倍，
+        某一批中出现提取结果为空或过少的页、或者大部分URL重复时不再下载后续的检索页，下载失败的页不影响后续的批次
+        """
+        se = self.search_engines[name]
+        max_results = (self.config.get('engine_max_results') or {}).get(name, se.max_results)
+        if max_results is not None:
+            req_list = req_list[:math.ceil(max_results / se.page_size)]
         if len(req_list) <= 0:
+            span.end()
             task.set_result(index, [])
-        t = GatherTask(len(req_list), early_stop=True, timeout=self.config.get('timeout'))
-        for i in range(len(req_list)):
-            asyncio.ensure_future(self._get_response(req_list[i], name, t, i))
-        await t.done()
-
+            return
+        timeout = self._engine_timeout(name, deadline - time.time())
+        engine_deadline = time.time() + timeout
+        wave = self.config.get('page_wave_size') or len(req_list)
         res = []
-        for rlist in t.result:
-            if rlist and rlist is not GatherTask.NO_RESULT:
+        seen = set()
+        start = 0
+        while start < len(req_list):
+            remaining = engine_deadline - time.time()
+            if remaining <= 0:
+                break
+            batch = req_list[start:start + wave]
+            wave_span = span.child('wave', pages=len(batch))
+            t = GatherTask(len(batch), early_stop=True, timeout=remaining, ratio=self._early_stop_ratio(name))
+            for i in range(len(batch)):
+                asyncio.ensure_future(self._get_response(batch[i], name, t, i, engine_deadline, resolve=resolve,
+                                                         span=wave_span.child('page', url=batch[i].url)))
+            await t.done()
+            self.metrics.on_gather('engine', t)
+            wave_span.set_attribute('outcome', t.outcome or 'timeout')
+            wave_span.end()
+
+            more = True
+            total = 0
+            new = 0
+            for rlist in t.result:
+                # 未完成或下载失败的页不能说明已经没有更多的检索结果
+                if rlist is GatherTask.NO_RESULT or rlist is None:
+                    continue
+                if len(rlist) < se.page_size * self.config.get('page_wave_min_ratio'):
+                    more = False
                 for r in rlist:
+                    total += 1
+                    if r['url'] not in seen:
+                        seen.add(r['url'])
+                        new += 1
                     res.append(r)
+            if total > 0 and 1 - new / total > self.config.get('page_wave_max_duplicate_ratio'):
+                more = False
+            if not more:
+                break
+            start += len(batch)
+            wave *= 2
+        span.set_attribute('results', len(res))
+        span.end()
         task.set_result(index, res)
 
-    async def _get_response(self, request, name, task, index):
+    async def _get_response(self, request, name, task, index, deadline, resolve=True, span=NOOP_SPAN):
         async def _fetch():
             slave = self._slave_available(name)
             if slave is None:
+                span.set_error('No available slave')
                 return
             try:
-                resp = await slave.fetch(request, name)
+                resp = await self._hedged_fetch(slave, request, name, span=span)
             except Exception as e:
                 log.warning('Failed request %s on slave %s: %s', request.url, slave, e)
+                self.metrics.fetch_total.labels(name, 'page', 'error').inc()
+                span.set_error(e)
                 return
             else:
+                self.metrics.fetch_total.labels(name, 'page', 'ok').inc()
                 res = resp['data']
+                span.set_attribute('results', len(res))
                 if len(res) == 0:
-                    return
-                if self.search_engines[name].fake_url:
+                    return res
+                if self.search_engines[name].fake_url and resolve:
                     task.update_result(index, res)
-                    t = GatherTask(len(res), early_stop=True, timeout=self.config.get('timeout'))
+                    timeout = self._stage_timeout(name, 'url', deadline - time.time())
+                    t = GatherTask(len(res), early_stop=True, timeout=timeout, ratio=self._early_stop_ratio(name))
+                    url_span = span.child('real_urls', urls=len(res))
                     for i in range(len(res)):
-                        asyncio.ensure_future(self._get_real_url(res[i], name, t, i))
+                        asyncio.ensure_future(self._get_real_url(res[i], name, t, i, span=url_span))
                     await t.done()
+                    self.metrics.on_gather('url', t)
+                    url_span.set_attribute('outcome', t.outcome or 'timeout')
+                    url_span.end()
                 return res
 
         result = await _fetch()
+        span.end()
         task.set_result(index, result)
 
+    def _engine_timeout(self, name, remaining):
+        """
+        搜索引擎的超时时间：优先使用engine_timeouts中的配置，否则根据各个阶段近期的耗时估计，不超过总请求的剩余时间
+        """
+        remaining = max(remaining, 0)
+        timeout = (self.config.get('engine_timeouts') or {}).get(name)
+        if timeout is None:
+            timeout = self._stage_timeout(name, 'page', remaining)
+            if self.search_engines[name].fake_url:
+                page_share = self.config.get('page_stage_share')
+                timeout = min(timeout, remaining * page_share) + self._stage_timeout(name, 'url', remaining)
+        return min(timeout, remaining)
+
+    def _stage_timeout(self, name, stage, remaining):
+        """
+        根据近期耗时的adaptive_timeout_percentile百分位数估计某个阶段的超时时间，样本不足时使用剩余时间
+        :param stage: page: 下载检索页，url: 获取真实URL
+        """
+        remaining = max(remaining, 0)
+        window = self.latency[(name, stage)]
+        if len(window) < self.config.get('adaptive_timeout_min_samples'):
+            return remaining
+        timeout = window.percentile(self.config.get('adaptive_timeout_percentile'))
+        timeout = max(timeout * self.config.get('adaptive_timeout_factor'), self.config.get('adaptive_timeout_min'))
+        return min(timeout, remaining)
+
+    def _early_stop_ratio(self, name):
+        ratio = (self.config.get('early_stop_ratios') or {}).get(name)
+        if ratio is None:
+            ratio = self.config.get('early_stop_ratio')
+        return ratio
+
+    async def _hedged_fetch(self, slave, request, name, span=NOOP_SPAN):
+        """
+        下载检索页，超过该搜索引擎近期耗时的hedge_percentile百分位数仍未返回时，向另一个slave节点发送相同的请求，
+        使用先返回的结果
+
+        耗时窗口只记录第一个请求自身的耗时，对冲请求先返回时第一个请求继续在后台完成，
+        避免对冲后较短的耗时压低对冲阈值和自适应超时时间
+        """
+        start_time = time.time()
+        self.hedge_budget.on_request()
+        window = self.latency[(name, 'page')]
+        primary = self._traced(slave.fetch, slave, request, name, span=span.child('slave', kind=SPAN_KIND_CLIENT,
+                                                                                    slave=slave.address))
+        primary.add_done_callback(lambda f: self._observe_latency(window, f, start_time))
+        futures = [primary]
+        percentile = self.config.get('hedge_percentile')
+        if percentile and len(window) >= self.config.get('hedge_min_samples'):
+            done, _ = await asyncio.wait(futures, timeout=window.percentile(percentile))
+            if not done:
+                backup_slave = self.slave_selector.select(self.slave_map[name], name, exclude=slave)
+                if backup_slave is not None and self.hedge_budget.acquire():
+                    log.debug('Hedge request %s on slave %s', request.url, backup_slave)
+                    self.metrics.hedged_total.labels(name).inc()
+                    backup_span = span.child('slave', kind=SPAN_KIND_CLIENT, slave=backup_slave.address, hedge=True)
+                    futures.append(self._traced(backup_slave.fetch, backup_slave, request, name, span=backup_span,
+                                                coalesce=False))
+        try:
+            resp = await self._first_success(futures)
+        finally:
+            # 对冲时第一个请求继续完成以记录其耗时
+            hedged = len(futures) > 1
+            for f in futures:
+                if not f.done() and not (hedged and f is primary):
+                    f.cancel()
+        self.metrics.fetch_duration.labels(name, 'page').observe(time.time() - start_time)
+        return resp
+
+    @staticmethod
+    def _observe_latency(window, future, start_time):
+        if not future.cancelled() and future.exception() is None:
+            window.add(time.time() - start_time)
+
+    @staticmethod
+    def _traced(fetch, slave, request, name, span=NOOP_SPAN, **kwargs):
+        """
+        :return: 调用slave节点下载的future，完成或被取消时结束span
+        """
+
+        def on_done(f):
+            if f.cancelled():
+                span.set_attribute('cancelled', True)
+            elif f.exception() is not None:
+                span.set_error(f.exception())
+            span.end()
+
+        future = asyncio.ensure_future(fetch(request, name, span=span, **kwargs))
+        future.add_done_callback(on_done)
+        return future
+
+    @staticmethod
+    async def _first_success(futures):
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+                error = f.exception()
+        raise error
+
     def _slave_available(self, name):
         """
         选择一个可用的工作节点
         """
         if name not in self.slave_map or len(self.slave_map[name]) <= 0:
             return
-        return random.choice(self.slave_map[name])
+        return self.slave_selector.select(self.slave_map[name], name)
+
+    async def _get_real_url(self, result, name, task, index, span=NOOP_SPAN):
+        span = span.child('real_url', kind=SPAN_KIND_CLIENT, url=result['url'])
 
-    async def _get_real_url(self, result, name, task, index):
         async def _get():
+            fake_url = result['url']
+            if self.real_url_cache is not None:
+                real_url = self.real_url_cache.get(fake_url)
+                span.set_attribute('cache_hit', real_url is not None)
+                if real_url is not None:
+                    # 空字符串表示之前未能获取到真实URL
+                    if real_url:
+                        result['url'] = real_url
+                        result.pop('resolve_token', None)
+                    return
             slave = self._slave_available(name)
             if slave is None:
+                span.set_error('No available slave')
                 return
+            span.set_attribute('slave', slave.address)
             try:
-                real_url_req = HttpRequest(result['url'], allow_redirects=False)
-                resp = await slave.fetch_url(real_url_req, name)
+                real_url_req = HttpRequest(fake_url, allow_redirects=False)
+                start_time = time.time()
+                resp = await slave.fetch_url(real_url_req, name, span=span)
+                duration = time.time() - start_time
+                self.latency[(name, 'url')].add(duration)
+                self.metrics.fetch_duration.labels(name, 'url').observe(duration)
+                self.metrics.fetch_total.labels(name, 'url', 'ok').inc()
                 location = resp['data']
                 if location is not None:
-                    result['url'] = urljoin(result['url'], location)
+                    result['url'] = urljoin(fake_url, location)
+                    result.pop('resolve_token', None)
+                if self.real_url_cache is not None:
+                    if location is not None:
+                        self.real_url_cache.set(fake_url, result['url'])
+                    else:
+                        self.real_url_cache.set(fake_url, '', ttl=self.config.get('real_url_cache_negative_ttl'))
             except Exception as e:
                 log.warning('Failed to get real location %s: %s', result['url'], e)
+                self.metrics.fetch_total.labels(name, 'url', 'error').inc()
+                span.set_error(e)
 
         await _get()
+        span.end()
         task.set_result(index)
 
-    def _pack_results(self, query, results, request_meta=None, response_meta=None):
+    def _pack_results(self, query, results, fusion=None, max_records=None, request_meta=None, response_meta=None,
+                      span=NOOP_SPAN):
         """
         对检索结果打包成接口的返回格式
         :param query: 查询词
         :param results: 多引擎检索结果
+        :param fusion: 排名融合策略的名称
+        :param max_records: 返回的最大检索结果数量
         :param request_meta: request元信息
         :param response_meta: response元信息
+        :param span: 追踪耗时的span
         """
         if request_meta is None:
             request_meta = {}
         if response_meta is None:
             response_meta = {}
 
-        merged_results = self._merge_search_results(results)
-        request_meta['max_records'] = len(merged_results)
+        merge_span = span.child('merge')
+        merged_results, source_counts = self._merge_search_results(results, fusion=fusion)
+        merge_span.set_attribute('records', len(merged_results))
+        merge_span.end()
+        rank_span = span.child('rank')
+        records = rank_results(merged_results, top_k=max_records)
+        rank_span.end()
+        request_meta['max_records'] = len(records)
         response_meta['merged_records'] = len(merged_results)
         response_meta['sources'] = {}
         for s in results:
-            records = 0
-            for r in merged_results:
-                if s in r['sources']:
-                    records += 1
             response_meta['sources'][s] = {
-                'records': records,
+                'records': source_counts[s],
                 'url': self.search_engines[s].search_url(query),
             }
 
@@ -237,54 +831,31 @@ class MseServer:
                 'request': request_meta,
                 'response': response_meta
             },
-            'records': merged_results
+            'records': records
         }
         return res
 
-    def _merge_search_results(self, results):
-        """
-        根据URL合并多个搜索引擎的检索结果，保留相关性评分最高的标题和内容
+    def _merge_search_results(self, results, fusion=None):
         """
-        self._compute_relevance(results)
-        mm = {}
-        for s in results:
-            for r in results[s]:
-                url = r['url']
-                relevance = r['relevance']
-                if url in mm:
-                    o = mm[url]
-                    if s not in o['record']['sources']:
-                        o['record']['relevance'] += relevance
-                        o['record']['sources'].append(s)
-                        if relevance > o['relevance']:
-                            o['relevance'] = relevance
-                            o['record']['title'] = r['title']
-                            o['record']['text'] = r['text']
-                else:
-                    r['sources'] = [s]
-                    mm[url] = {'record': r, 'relevance': relevance}
-        res = [o['record'] for o in mm.values()]
-        if len(res) > 0:
-            res.sort(key=lambda x: x['relevance'], reverse=True)
-            max_relevance = res[0]['relevance']
-            for i in range(len(res)):
-                res[i]['id'] = i + 1
-                relevance = math.ceil(res[i]['relevance'] * 10 / max_relevance)
-                if relevance > 10:
-                    relevance = 10
-                res[i]['relevance'] = relevance
-        return res
+        根据规范化的URL合并多个搜索引擎的检索结果，保留相关性评分最高的标题和内容，可选合并近似重复的检索结果
 
-    def _compute_relevance(self, results):
+        带有resolve_token的检索结果尚未获取真实URL，其虚假URL只会与同一个虚假URL合并，
+        但可以与近似重复的检索结果合并，此时保留真实URL
+        :param fusion: 排名融合策略的名称
+        :return: (未排序的合并结果, 每个搜索引擎在合并结果中的记录数)
         """
-        根据搜索引擎添加检索结果的相关性评分
-        """
-        for s in results:
-            imp = self.search_engines[s].source_importance
-            records = results[s]
-            for i in range(len(records)):
-                loc_score = (math.sqrt(i + 1) + 2) / (math.sqrt(i + 1))
-                records[i]['relevance'] = imp * loc_score
+        fuser = self.fusers[fusion or self.config.get('fusion')]
+        weights = {s: fuser.source_weight(self.search_engines[s]) for s in results}
+        url_key = canonicalize_url if self.config.get('canonicalize_urls') else None
+        near_duplicate = None
+        near_duplicate_limit = None
+        if self.config.get('near_duplicate'):
+            near_duplicate_limit = self.config.get('near_duplicate_max_records')
+            near_duplicate = NearDuplicateIndex(threshold=self.config.get('near_duplicate_threshold'),
+                                                bands=self.config.get('near_duplicate_bands'),
+                                                rows=self.config.get('near_duplicate_rows'))
+        return merge_results(results, fuser, weights, url_key=url_key, near_duplicate=near_duplicate,
+                             near_duplicate_limit=near_duplicate_limit)
 
 
 class SearchHandler(RequestHandler):
@@ -307,23 +878,208 @@ class SearchHandler(RequestHandler):
         if recent_days is not None:
             recent_days = int(recent_days)
         site = self.get_argument('site', default=None)
-        packed_results = await self.server.meta_search(query,
-                                                       sources=sources,
-                                                       data_source_results=data_source_results,
-                                                       recent_days=recent_days,
-                                                       site=site)
+        resolve_top = self.get_argument('resolve_top', default=None)
+        if resolve_top is not None:
+            resolve_top = int(resolve_top)
+        fusion = self.get_argument('fusion', default=None)
+        if fusion is not None and fusion not in self.server.fusers:
+            self.send_error(400)
+            return
+        max_records = self.get_argument('max_records', default=None)
+        if max_records is not None:
+            max_records = int(max_records)
+            if max_records <= 0:
+                self.send_error(400)
+                return
+        page = self.get_argument('page', default=None)
+        if page is not None:
+            page = int(page)
+            page_size = int(self.get_argument('page_size', default=self.server.config.get('default_page_size')))
+            if page <= 0 or page_size <= 0 or page_size > self.server.config.get('max_page_size'):
+                self.send_error(400)
+                return
+        stream = self.get_argument('stream', default=None)
+        if stream is not None and (stream not in ('ndjson', 'sse') or page is not None):
+            self.send_error(400)
+            return
+        debug = self.get_argument('debug', default=None) == '1'
+        span = self.server.tracer.start_trace('search', debug=debug, query=query)
+        if stream is not None:
+            await self._stream_search(stream, query, debug, span,
+                                      sources=sources,
+                                      data_source_results=data_source_results,
+                                      recent_days=recent_days,
+                                      site=site,
+                                      resolve_top=resolve_top,
+                                      fusion=fusion,
+                                      max_records=max_records)
+        elif page is not None:
+            packed_results = await self.server.search_page(query, page, page_size,
+                                                           session=self.get_argument('session', default=None),
+                                                           span=span,
+                                                           sources=sources,
+                                                           data_source_results=data_source_results,
+                                                           recent_days=recent_days,
+                                                           site=site,
+                                                           resolve_top=resolve_top,
+                                                           fusion=fusion)
+            self.write(self._finish_trace(span, packed_results, debug))
+        else:
+            packed_results = await self.server.meta_search(query,
+                                                           sources=sources,
+                                                           data_source_results=data_source_results,
+                                                           recent_days=recent_days,
+                                                           site=site,
+                                                           resolve_top=resolve_top,
+                                                           fusion=fusion,
+                                                           max_records=max_records,
+                                                           span=span)
+            self.write(self._finish_trace(span, packed_results, debug))
+        duration = time.time() - start_time
+        self.server.metrics.search_duration.observe(duration)
         log.info('meta search is done, arguments: %s, remote ip: %s, duration: %s',
-                 self.request.query, self.request.remote_ip, round(time.time() - start_time, 3))
-        self.write(packed_results)
+                 self.request.query, self.request.remote_ip, round(duration, 3))
+        self.finish()
+
+    async def _stream_search(self, stream, query, debug, span, **kwargs):
+        """
+        每个搜索引擎的检索完成后返回当前已合并的检索结果，最后返回完整的检索结果
+        :param stream: ndjson或sse
+        :param debug: 是否在完整的检索结果中返回耗时
+        """
+        if stream == 'sse':
+            self.set_header('Content-Type', 'text/event-stream')
+            self.set_header('Cache-Control', 'no-cache')
+        else:
+            self.set_header('Content-Type', 'application/x-ndjson')
+        queue = asyncio.Queue()
+        search = asyncio.ensure_future(self.server.meta_search(query, callback=queue.put_nowait, span=span,
+                                                              **kwargs))
+        search.add_done_callback(lambda f: queue.put_nowait(None))
+        while True:
+            packed_results = await queue.get()
+            if packed_results is None:
+                break
+            self._write_event(stream, 'partial', packed_results)
+            await self.flush()
+        self._write_event(stream, 'final', self._finish_trace(span, search.result(), debug))
+
+    def _finish_trace(self, span, packed_results, debug):
+        """
+        结束追踪，debug时在response元信息的timing中返回各个阶段的耗时
+        """
+        self.server.tracer.finish(span)
+        if not debug:
+            return packed_results
+        # 检索结果可能来自结果缓存，复制元信息后再添加耗时
+        resp_meta = dict(packed_results['meta']['response'])
+        resp_meta['timing'] = span.timing()
+        return {
+            'meta': {
+                'request': packed_results['meta']['request'],
+                'response': resp_meta
+            },
+            'records': packed_results['records']
+        }
+
+    def _write_event(self, stream, event, packed_results):
+        data = json.dumps(packed_results, ensure_ascii=False)
+        if stream == 'sse':
+            self.write('event: {}\ndata: {}\n\n'.format(event, data))
+        else:
+            self.write('{{"event": "{}", "data": {}}}\n'.format(event, data))
+
+
+class MetricsHandler(RequestHandler):
+    """
+    以Prometheus文本格式导出监控指标
+    """
+
+    def initialize(self, server):
+        self.server = server
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(self.server.metrics.render())
+
+
+class ResolveHandler(RequestHandler):
+    """
+    根据检索结果中的resolve_token批量获取真实URL
+    """
+
+    def initialize(self, server):
+        self.server = server
+
+    def set_default_headers(self):
+        self.set_header('Access-Control-Allow-Origin', '*')
+        self.set_header('Access-Control-Allow-Headers', 'X-Requested-With')
+        self.set_header('Access-Control-Allow-Methods', 'POST, PUT, GET, DELETE, OPTIONS')
+
+    async def get(self):
+        tokens = [i for i in self.get_argument('tokens').split(',') if i]
+        await self._resolve(tokens)
+
+    async def post(self):
+        try:
+            tokens = json.loads(self.request.body)
+        except ValueError:
+            self.send_error(400)
+            return
+        if not isinstance(tokens, list) or not all(isinstance(i, str) for i in tokens):
+            self.send_error(400)
+            return
+        await self._resolve(tokens)
+
+    async def _resolve(self, tokens):
+        max_tokens = self.server.config.get('max_resolve_tokens')
+        if len(tokens) > max_tokens:
+            self.send_error(400)
+            return
+        res = await self.server.resolve_urls(tokens)
+        self.write({'data': res})
+        self.finish()
+
+
+class CookieHandler(RequestHandler):
+    """
+    向slave节点下发各个搜索引擎的Cookie会话
+    """
+
+    def initialize(self, server):
+        self.server = server
+
+    async def get(self):
+        if not self.verify_request():
+            self.send_error(403)
+            return
+        self.write(await self.server.cookie_store.dump())
         self.finish()
 
+    def verify_request(self):
+        t = int(time.time())
+        timestamp = self.get_argument('timestamp')
+        nonce = self.get_argument('nonce')
+        signature = self.get_argument('signature')
+
+        s = (self.server.config.get('api_secret') + 'cookies' + 'cookies' + timestamp + nonce).encode('utf-8')
+        h = hashlib.sha256(s).hexdigest()
+        if h != signature:
+            return False
+        if abs(t - int(timestamp)) > 600:
+            return False
+        return True
+
 
 class FetchHanlder(RequestHandler):
     def initialize(self, server):
+        self.server = server
         self.config = server.config
         self.downloader = server.downloader
         self.extension = server.extension
         self.search_engines = server.search_engines
+        self.page_cache = server.page_cache
+        self.extractor = server.extractor
         self.api_secret = self.config.get('api_secret')
 
     async def post(self):
@@ -333,39 +1089,118 @@ class FetchHanlder(RequestHandler):
 
         name = self.get_argument('name')
         rtype = self.get_argument('rtype')
-        req = pickle.loads(self.request.body)
+        if rtype not in ('url', 'page'):
+            self.send_error(400)
+            return
+        try:
+            req = codec.decode_request(self.request.body)
+        except CodecError as e:
+            log.warning('Failed to decode request: %s', e)
+            self.send_error(400)
+            return
+        try:
+            result = await self._handle(req, name, rtype)
+        except (ClientError, OverloadError):
+            self.send_error(503)
+            return
+        self.set_header('Content-Type', 'application/octet-stream')
+        self.write(codec.encode_result(rtype, result))
+        self.finish()
+
+    async def _handle(self, req, name, rtype):
+        """
+        处理一个下载任务，优先从缓存中获取检索页的提取结果
+        """
+        cache_key = None
+        if rtype == 'page' and self.page_cache is not None:
+            cache_key = (name, canonical_url(req.url))
+            result, stale = self.page_cache.get_stale(cache_key, grace=self.config.get('page_cache_stale_ttl'))
+            if result is not None:
+                log.info('cached: %s', req.url)
+                if stale and cache_key not in self.server.page_refreshing:
+                    # 在调度刷新之前标记，避免同时到达的请求重复刷新
+                    self.server.page_refreshing.add(cache_key)
+                    asyncio.ensure_future(self._refresh_page(req, name, cache_key))
+                return result
+
+        result, cacheable = await self._fetch_result(req, name, rtype)
+        if cache_key is not None and cacheable:
+            self.page_cache.set(cache_key, result)
+        return result
+
+    async def _fetch_result(self, req, name, rtype):
+        """
+        下载网页并提取数据
+        :return: (result, cacheable)，cacheable表示提取的检索结果是否可以缓存
+        """
         await self._before_request(req, name)
         log.info('request: %s', req.url)
+        cacheable = False
+        status = 'ok'
+        start_time = time.time()
         try:
             resp = await self.downloader.fetch(req)
         except HttpError as e:
             resp = e.response
             log.info('Http Error: %s, %s', resp.status, resp.url)
+            status = self._http_error_status(resp.status)
         except ClientError as e:
             log.warning('Failed to request %s: %s', req.url, e)
-            self.send_error(503)
-            return
+            self._observe_upstream(name, rtype, 'error', start_time)
+            raise
         else:
             log.info('response: %s', resp.url)
+            resp.request = req
             await self._after_request(resp, name)
+            cacheable = True
 
         if rtype == 'url':
             result = self._get_location(resp)
-        elif rtype == 'page':
-            result = []
+        else:
             try:
-                for r in self.search_engines[name].extract_results(resp):
-                    result.append(r)
+                result = await self.extractor.extract(name, resp)
+            except OverloadError:
+                raise
             except Exception as e:
+                result = []
                 log.warning('Failed to extract results from %s: %s', name, e)
-        else:
-            self.send_error(400)
-            return
+                cacheable = False
+            if len(result) == 0:
+                cacheable = False
+                if status == 'ok':
+                    status = 'empty'
+        self._observe_upstream(name, rtype, status, start_time)
+        return result, cacheable
 
-        self.write({'data': result})
-        self.finish()
+    @staticmethod
+    def _http_error_status(code):
+        if 300 <= code < 400:
+            # 获取真实URL时不跟随跳转
+            return 'ok'
+        if code in (403, 429):
+            return 'ban'
+        return 'http_error'
+
+    def _observe_upstream(self, name, rtype, status, start_time):
+        metrics = self.server.metrics
+        metrics.upstream_duration.labels(name, rtype).observe(time.time() - start_time)
+        metrics.upstream_total.labels(name, rtype, status).inc()
+
+    async def _refresh_page(self, req, name, cache_key):
+        """
+        后台刷新已过期的缓存页面，调用前需要将cache_key加入page_refreshing
+        """
+        try:
+            result, cacheable = await self._fetch_result(req, name, 'page')
+            if cacheable:
+                self.page_cache.set(cache_key, result)
+        except Exception as e:
+            log.warning('Failed to refresh cached page %s: %s', req.url, e)
+        finally:
+            self.server.page_refreshing.discard(cache_key)
 
     async def _before_request(self, req, name):
+        req.url = rewrite_url(req.url, self.config.get('url_rewrites'))
         req.timeout = self.config.get('timeout')
         await self.extension.handle_request(req)
         r = self.search_engines[name].before_request(req)
@@ -401,3 +1236,43 @@ class FetchHanlder(RequestHandler):
         res = self.location_reg.search(resp.text)
         if res:
             return res.group(1)
+
+
+class BatchFetchHandler(FetchHanlder):
+    """
+    批量处理下载任务，每个任务完成后立即返回该任务的结果
+    """
+
+    async def post(self):
+        if not self.verify_request():
+            self.send_error(403)
+            return
+
+        try:
+            tasks = codec.decode_tasks(self.request.body)
+        except CodecError as e:
+            log.warning('Failed to decode tasks: %s', e)
+            self.send_error(400)
+            return
+        for name, rtype, _ in tasks:
+            if rtype not in ('url', 'page') or name not in self.search_engines:
+                self.send_error(400)
+                return
+
+        self.set_header('Content-Type', 'application/octet-stream')
+        futures = [self._handle_task(i, name, rtype, req) for i, (name, rtype, req) in enumerate(tasks)]
+        for f in asyncio.as_completed(futures):
+            index, result, error = await f
+            self.write(codec.encode_batch_result(index, tasks[index][1], result=result, error=error))
+            await self.flush()
+        self.finish()
+
+    async def _handle_task(self, index, name, rtype, req):
+        try:
+            result = await self._handle(req, name, rtype)
+        except (ClientError, OverloadError):
+            return index, None, 503
+        except Exception as e:
+            log.warning('Failed to handle %s request %s: %s', rtype, req.url, e)
+            return index, None, 500
+        return index, result, None
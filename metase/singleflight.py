@@ -0,0 +1,31 @@
+# coding=utf-8
+
+import asyncio
+
+
+class SingleFlight:
+    """
+    合并相同key的并发调用，在第一次调用完成前到达的调用共享同一个结果
+    """
+
+    def __init__(self):
+        self._futures = {}
+
+    def __len__(self):
+        return len(self._futures)
+
+    def __contains__(self, key):
+        return key in self._futures
+
+    async def do(self, key, func, *args, **kwargs):
+        fut = self._futures.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(func(*args, **kwargs))
+            self._futures[key] = fut
+            fut.add_done_callback(lambda f: self._forget(key, f))
+        # 单个调用者被取消时不影响其他等待的调用者
+        return await asyncio.shield(fut)
+
+    def _forget(self, key, fut):
+        if self._futures.get(key) is fut:
+            del self._futures[key]
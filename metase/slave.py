@@ -1,13 +1,18 @@
 # coding=utf-8
 
-import json
-import pickle
 import time
 import random
 import hashlib
 import logging
+import asyncio
 
-from xpaw import HttpRequest
+from tornado.httpclient import HTTPRequest
+from tornado.curl_httpclient import CurlAsyncHTTPClient
+
+from metase.errors import FetchError
+from metase.balancer import SlaveHealth
+from metase.tracing import NOOP_SPAN
+from metase import codec
 
 log = logging.getLogger(__name__)
 
@@ -15,26 +20,61 @@ log = logging.getLogger(__name__)
 class Slave:
     def __init__(self, address, server):
         self.address = address
-        self.downloader = server.downloader
+        self.fetch_flight = server.fetch_flight
         self.config = server.config
+        self.pool = ConnectionPool(self.config.get('slave_max_connections'))
+        self.health = SlaveHealth(self.config)
         self.api_version = self.config.get('api_version')
         self.timeout = self.config.get('timeout')
         self.api_url = 'http://{}/api/v{}/fetch'.format(self.address, self.api_version)
+        self.batch_api_url = 'http://{}/api/v{}/batch_fetch'.format(self.address, self.api_version)
         self.api_secret = self.config.get('api_secret')
+        self.batch_size = self.config.get('slave_batch_size') or 1
+        self.batch_delay = self.config.get('slave_batch_delay')
+        self._batch = []
+        self._batch_handle = None
 
     def __str__(self):
         return repr(self.address)
 
-    async def fetch(self, request, name):
-        return await self._fetch(request, name, 'page')
+    async def fetch(self, request, name, coalesce=True, span=NOOP_SPAN):
+        """
+        :param coalesce: 是否与正在进行的相同检索页请求共享一次下载
+        :param span: 记录排队和批量等待耗时的span
+        """
+        if coalesce:
+            # 返回副本避免调用者之间互相修改检索结果
+            key = (name, 'page', request.url)
+            span.set_attribute('coalesced', key in self.fetch_flight)
+            resp = await self.fetch_flight.do(key, self._fetch, request, name, 'page', span)
+        else:
+            resp = await self._fetch(request, name, 'page', span)
+        return {'data': [dict(r) for r in resp['data']]}
+
+    async def fetch_url(self, request, name, span=NOOP_SPAN):
+        return await self._fetch(request, name, 'url', span)
 
-    async def fetch_url(self, request, name):
-        return await self._fetch(request, name, 'url')
+    async def _fetch(self, request, name, rtype, span=NOOP_SPAN):
+        self.health.on_start()
+        start_time = time.time()
+        try:
+            if self.batch_size > 1:
+                res = await self._submit(request, name, rtype, span)
+            else:
+                res = await self._fetch_one(request, name, rtype, span)
+        except asyncio.CancelledError:
+            self.health.on_finish(name)
+            raise
+        except Exception:
+            self.health.on_finish(name, time.time() - start_time, error=True)
+            raise
+        self.health.on_finish(name, time.time() - start_time)
+        return res
 
-    async def _fetch(self, request, name, rtype):
-        body = pickle.dumps(request)
+    async def _fetch_one(self, request, name, rtype, span=NOOP_SPAN):
+        body = codec.encode_request(request)
         timeout = self.config.get('timeout')
-        req_headers = {'Content-Type': 'application/octet-stream'}
+        req_headers = {'Content-Type': 'application/octet-stream', 'Connection': 'keep-alive'}
 
         timestamp = str(int(time.time()))
         nonce = str(random.randint(0, 1e8))
@@ -42,12 +82,126 @@ class Slave:
 
         url = '{}?name={}&rtype={}&timestamp={}&nonce={}&signature={}'.format(self.api_url, name, rtype, timestamp,
                                                                               nonce, signature)
-        req = HttpRequest(url, method='POST', headers=req_headers, body=body, timeout=timeout)
-        resp = await self.downloader.fetch(req)
-        real_resp = json.loads(resp.body)
-        return real_resp
+        req = HTTPRequest(url, method='POST', headers=req_headers, body=body,
+                          connect_timeout=timeout, request_timeout=timeout)
+        resp = await self.pool.fetch(req, span=span)
+        return {'data': codec.decode_result(rtype, resp.body)}
+
+    def _submit(self, request, name, rtype, span=NOOP_SPAN):
+        """
+        将下载任务加入批量请求，凑满batch_size或等待batch_delay秒后发送
+        """
+        future = asyncio.Future()
+        self._batch.append((name, rtype, request, future, span.child('batch_wait')))
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+        elif self._batch_handle is None:
+            self._batch_handle = asyncio.get_event_loop().call_later(self.batch_delay, self._flush_batch)
+        return future
+
+    def _flush_batch(self):
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._batch_handle = None
+        batch, self._batch = self._batch, []
+        for i in batch:
+            i[4].set_attribute('batch_size', len(batch))
+            i[4].end()
+        if len(batch) > 0:
+            asyncio.ensure_future(self._fetch_batch(batch))
+
+    async def _fetch_batch(self, batch):
+        futures = [i[3] for i in batch]
+        body = codec.encode_tasks([(name, rtype, request) for name, rtype, request, _, _ in batch])
+        timeout = self.config.get('timeout')
+        req_headers = {'Content-Type': 'application/octet-stream', 'Connection': 'keep-alive'}
+
+        timestamp = str(int(time.time()))
+        nonce = str(random.randint(0, 1e8))
+        signature = self.sign(body, 'batch', 'batch', timestamp, nonce)
+
+        url = '{}?name=batch&rtype=batch&timestamp={}&nonce={}&signature={}'.format(self.batch_api_url, timestamp,
+                                                                                    nonce, signature)
+        reader = codec.BatchResultReader([rtype for _, rtype, _, _, _ in batch])
+
+        def on_chunk(chunk):
+            for index, result, error in reader.feed(chunk):
+                f = futures[index]
+                if f.done():
+                    continue
+                if error is not None:
+                    f.set_exception(FetchError('HTTP {}'.format(error)))
+                else:
+                    f.set_result({'data': result})
+
+        req = HTTPRequest(url, method='POST', headers=req_headers, body=body, streaming_callback=on_chunk,
+                          connect_timeout=timeout, request_timeout=timeout)
+        try:
+            await self.pool.fetch(req)
+        except Exception as e:
+            error = e
+        else:
+            error = FetchError('No result in batch response')
+        for f in futures:
+            if not f.done():
+                f.set_exception(error)
 
     def sign(self, body, name, rtype, timestamp, nonce):
         s = (self.api_secret + name + rtype + timestamp + nonce).encode('utf-8')
         h = hashlib.sha256(body + s).hexdigest()
         return h
+
+
+class ConnectionPool:
+    """
+    与slave节点之间的HTTP连接池
+
+    每个连接对应一个curl句柄，句柄复用时保持keep-alive连接，max_connections限制同时打开的连接数。
+    curl不提供空闲连接的数量，统计信息只包括正在使用和等待连接的请求
+    """
+
+    def __init__(self, max_connections):
+        self.max_connections = max_connections
+        self._client = CurlAsyncHTTPClient(max_clients=max_connections, force_instance=True)
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self.in_use = 0
+        self.waiting = 0
+        self.requests = 0
+        self.wait_time = 0
+        self.max_wait_time = 0
+
+    async def fetch(self, request, span=NOOP_SPAN):
+        """
+        :param span: 记录等待空闲连接耗时的span
+        """
+        queue_span = span.child('queue')
+        self.waiting += 1
+        start_time = time.time()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            queue_span.end()
+        wait_time = time.time() - start_time
+        self.wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.requests += 1
+        self.in_use += 1
+        try:
+            return await self._client.fetch(request)
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            'max_connections': self.max_connections,
+            'in_use': self.in_use,
+            'waiting': self.waiting,
+            'requests': self.requests,
+            'avg_wait_time': round(self.wait_time / self.requests, 6) if self.requests else 0,
+            'max_wait_time': round(self.max_wait_time, 6)
+        }
+
+    def close(self):
+        self._client.close()
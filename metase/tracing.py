@@ -0,0 +1,214 @@
+# coding=utf-8
+
+"""
+元搜索请求的耗时追踪
+
+span以参数的形式在调用之间显式传递，每个span记录一个阶段（搜索引擎、检索页、slave节点、真实URL、合并排序等）的起止时间，
+子span组成一棵树。不追踪的请求使用NOOP_SPAN，所有操作均为空操作
+
+追踪结果可以在debug=1时随检索结果返回，也可以按OpenTelemetry的OTLP/JSON格式逐行写入trace_file，
+由OpenTelemetry Collector的otlpjsonfile receiver读取
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import binascii
+
+log = logging.getLogger(__name__)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_CODE_ERROR = 2
+
+
+def _random_id(size):
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+class Span:
+    """
+    name: 阶段名称
+    kind: OpenTelemetry的SpanKind
+    attributes: 阶段的属性，例如搜索引擎代号、URL、slave节点地址
+    """
+
+    recording = True
+
+    def __init__(self, name, trace_id=None, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace_id = trace_id or _random_id(16)
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes) if attributes else {}
+        self.error = None
+        self.start_time = time.time()
+        self.end_time = None
+        self.children = []
+
+    def child(self, name, kind=SPAN_KIND_INTERNAL, **attributes):
+        span = Span(name, trace_id=self.trace_id, parent_id=self.span_id, kind=kind, attributes=attributes)
+        self.children.append(span)
+        return span
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.error = str(error) or error.__class__.__name__
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = time.time()
+
+    def walk(self):
+        yield self
+        for c in self.children:
+            yield from c.walk()
+
+    def timing(self, origin=None):
+        """
+        :param origin: 计算相对开始时间的起点，默认为当前span的开始时间
+        :return: 嵌套的dict，start和duration的单位为毫秒，响应返回时尚未结束的span带有unfinished标记
+        """
+        if origin is None:
+            origin = self.start_time
+        end_time = self.end_time if self.end_time is not None else time.time()
+        res = {
+            'name': self.name,
+            'start': round((self.start_time - origin) * 1000, 3),
+            'duration': round((end_time - self.start_time) * 1000, 3)
+        }
+        if self.attributes:
+            res['attributes'] = dict(self.attributes)
+        if self.error is not None:
+            res['error'] = self.error
+        if self.end_time is None:
+            res['unfinished'] = True
+        if self.children:
+            res['children'] = [c.timing(origin) for c in self.children]
+        return res
+
+
+class NoopSpan:
+    """
+    不追踪的请求使用的span
+    """
+
+    recording = False
+
+    def child(self, name, kind=SPAN_KIND_INTERNAL, **attributes):
+        return self
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+    """
+    创建追踪请求的根span，结束后导出到trace_file
+
+    trace_sample_rate: 设置trace_file时追踪的请求比例，debug请求总是追踪
+    """
+
+    def __init__(self, config):
+        self.sample_rate = config.get('trace_sample_rate')
+        self.exporter = None
+        path = config.get('trace_file')
+        if path:
+            self.exporter = FileSpanExporter(path)
+
+    def start_trace(self, name, debug=False, **attributes):
+        """
+        :return: 根span，不追踪时返回NOOP_SPAN
+        """
+        if debug or (self.exporter is not None and random.random() < self.sample_rate):
+            return Span(name, kind=SPAN_KIND_SERVER, attributes=attributes)
+        return NOOP_SPAN
+
+    def finish(self, span):
+        if not span.recording:
+            return
+        span.end()
+        if self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                log.warning('Failed to export trace %s: %s', span.trace_id, e)
+
+
+class FileSpanExporter:
+    """
+    将一次请求的所有span作为一行OTLP/JSON追加到文件中
+    """
+
+    def __init__(self, path, service_name='metase'):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, root):
+        line = json.dumps(self.encode(root), ensure_ascii=False, separators=(',', ':'))
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def encode(self, root):
+        now = time.time()
+        return {
+            'resourceSpans': [{
+                'resource': {
+                    'attributes': [_otlp_attribute('service.name', self.service_name)]
+                },
+                'scopeSpans': [{
+                    'scope': {'name': 'metase'},
+                    'spans': [self._encode_span(s, now) for s in root.walk()]
+                }]
+            }]
+        }
+
+    @staticmethod
+    def _encode_span(span, now):
+        attributes = dict(span.attributes)
+        end_time = span.end_time
+        if end_time is None:
+            end_time = now
+            attributes['unfinished'] = True
+        res = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': span.kind,
+            'startTimeUnixNano': str(int(span.start_time * 1e9)),
+            'endTimeUnixNano': str(int(end_time * 1e9)),
+            'attributes': [_otlp_attribute(k, v) for k, v in attributes.items()]
+        }
+        if span.parent_id is not None:
+            res['parentSpanId'] = span.parent_id
+        if span.error is not None:
+            res['status'] = {'code': STATUS_CODE_ERROR, 'message': span.error}
+        return res
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        v = {'boolValue': value}
+    elif isinstance(value, int):
+        v = {'intValue': str(value)}
+    elif isinstance(value, float):
+        v = {'doubleValue': value}
+    else:
+        v = {'stringValue': str(value)}
+    return {'key': key, 'value': v}
@@ -5,6 +5,7 @@ from os.path import isfile
 import logging
 from importlib import import_module
 from pkgutil import iter_modules
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
 
 def load_object(path):
@@ -92,3 +93,24 @@ def walk_modules(path):
                 submod = import_module(fullpath)
                 mods.append(submod)
     return mods
+
+
+def canonical_url(url):
+    """
+    规范化URL：scheme和host转为小写，去掉fragment，按参数名排序query
+    """
+    s = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(s.query, keep_blank_values=True)))
+    return urlunsplit((s.scheme.lower(), s.netloc.lower(), s.path or '/', query, ''))
+
+
+def rewrite_url(url, rewrites):
+    """
+    将URL中匹配的前缀替换为其他地址，例如将搜索引擎的请求转发到本地的模拟服务
+    :param rewrites: URL前缀到替换地址的dict，使用第一个匹配的前缀
+    """
+    if rewrites:
+        for prefix, target in rewrites.items():
+            if url.startswith(prefix):
+                return target + url[len(prefix):]
+    return url
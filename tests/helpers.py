@@ -0,0 +1,31 @@
+# coding=utf-8
+
+from metase.config import DEFAULT_CONFIG
+from metase.server import MseServer
+
+
+def make_config(**kwargs):
+    config = dict(DEFAULT_CONFIG)
+    config['metrics'] = False
+    config.update(kwargs)
+    return config
+
+
+def make_server(**kwargs):
+    return MseServer(make_config(**kwargs))
+
+
+def make_records(name, n):
+    return [{'title': '{} {}'.format(name, i), 'text': 'text', 'url': 'http://{}.example.com/{}'.format(name, i)}
+            for i in range(n)]
+
+
+def stub_engines(server, results):
+    """
+    跳过下载，各个搜索引擎直接返回results中的检索结果
+    """
+
+    async def process_req_list(req_list, name, task, index, deadline, resolve=True, span=None):
+        task.set_result(index, results.get(name))
+
+    server._process_req_list = process_req_list
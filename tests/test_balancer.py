@@ -0,0 +1,100 @@
+# coding=utf-8
+
+import time
+
+from metase.balancer import SlaveHealth, RandomSelector, PowerOfTwoSelector
+from tests.helpers import make_config
+
+
+class FakeSlave:
+    def __init__(self, address, config):
+        self.address = address
+        self.health = SlaveHealth(config)
+
+
+def make_slaves(n, **kwargs):
+    config = make_config(**kwargs)
+    return [FakeSlave(str(i), config) for i in range(n)]
+
+
+def test_eject_after_consecutive_errors():
+    health = make_slaves(1)[0].health
+    for _ in range(20):
+        health.on_start()
+        health.on_finish('Bing', 0.1)
+    # 失败率的EWMA: 1 - 0.8 ** n，连续失败4次后超过0.5
+    for _ in range(3):
+        health.on_start()
+        health.on_finish('Bing', 0.1, error=True)
+    assert not health.is_ejected('Bing')
+    health.on_start()
+    health.on_finish('Bing', 0.1, error=True)
+    assert health.is_ejected('Bing')
+    assert not health.is_ejected('Baidu')
+
+
+def test_min_requests_before_eject():
+    health = make_slaves(1, slave_eject_min_requests=5)[0].health
+    for _ in range(4):
+        health.on_start()
+        health.on_finish('Bing', 0.1, error=True)
+    assert not health.is_ejected('Bing')
+
+
+def test_readmit_after_eject_time():
+    health = make_slaves(1, slave_eject_time=0.05)[0].health
+    for _ in range(5):
+        health.on_start()
+        health.on_finish('Bing', 0.1, error=True)
+    assert health.is_ejected('Bing')
+    time.sleep(0.06)
+    assert not health.is_ejected('Bing')
+    # 恢复后需要再次积累足够的请求才会被剔除
+    assert health.error_rate['Bing'] < health.eject_error_rate
+    health.on_start()
+    health.on_finish('Bing', 0.1, error=True)
+    assert not health.is_ejected('Bing')
+
+
+def test_cancelled_task_does_not_count():
+    health = make_slaves(1)[0].health
+    health.on_start()
+    assert health.in_flight == 1
+    health.on_finish('Bing')
+    assert health.in_flight == 0
+    assert health.latency is None
+    assert 'Bing' not in health.requests
+
+
+def test_power_of_two_prefers_lower_score():
+    slaves = make_slaves(3)
+    for s, in_flight in zip(slaves, [0, 2, 10]):
+        s.health.in_flight = in_flight
+        s.health.latency = 0.1
+    selector = PowerOfTwoSelector(make_config())
+    selected = set(selector.select(slaves, 'Bing').address for _ in range(100))
+    # 负载最高的节点在任意一对中都不会被选择
+    assert '2' not in selected
+    assert selector.select(slaves[:2], 'Bing') is slaves[0]
+
+
+def test_select_exclude():
+    slaves = make_slaves(2)
+    for selector in (PowerOfTwoSelector(make_config()), RandomSelector(make_config())):
+        for _ in range(20):
+            assert selector.select(slaves, 'Bing', exclude=slaves[0]) is slaves[1]
+        assert selector.select(slaves[:1], 'Bing', exclude=slaves[0]) is None
+        assert selector.select([], 'Bing') is None
+
+
+def test_skip_ejected_slaves():
+    slaves = make_slaves(3)
+    slaves[0].health.ejected_until['Bing'] = time.time() + 60
+    selector = PowerOfTwoSelector(make_config())
+    for _ in range(20):
+        assert selector.select(slaves, 'Bing') is not slaves[0]
+    assert selector.select(slaves, 'Baidu') is not None
+    # 所有节点都被剔除时依然选择其中之一
+    for s in slaves:
+        s.health.ejected_until['Bing'] = time.time() + 60
+    assert selector.select(slaves, 'Bing') in slaves
@@ -0,0 +1,157 @@
+# coding=utf-8
+
+import time
+import asyncio
+import hashlib
+
+from tornado.web import Application
+from tornado.testing import AsyncTestCase, AsyncHTTPTestCase, gen_test
+from xpaw import HttpRequest
+
+from metase import codec
+from metase.errors import FetchError, OverloadError
+from metase.server import BatchFetchHandler
+from metase.slave import Slave
+from tests.helpers import make_server
+
+
+def page_result(url):
+    return [{'title': 'title', 'text': 'text', 'url': url}]
+
+
+class StubBatchFetchHandler(BatchFetchHandler):
+    """
+    按URL模拟下载结果：fail: 异常，busy: 过载，slow: 延迟返回
+    """
+
+    async def _handle(self, req, name, rtype):
+        if 'slow' in req.url:
+            await asyncio.sleep(0.1)
+        if 'fail' in req.url:
+            raise RuntimeError('failed')
+        if 'busy' in req.url:
+            raise OverloadError('busy')
+        if rtype == 'url':
+            return 'http://real.com/'
+        return page_result(req.url)
+
+
+def test_batch_result_frames():
+    rtypes = ['page', 'url', 'page']
+    data = codec.encode_batch_result(2, 'page', result=page_result('http://a.com/')) + \
+        codec.encode_batch_result(0, 'page', error=500) + \
+        codec.encode_batch_result(1, 'url', result='http://b.com/')
+    reader = codec.BatchResultReader(rtypes)
+    res = []
+    # 按字节分块，帧可能被拆分到多个块中
+    for i in range(len(data)):
+        res.extend(reader.feed(data[i:i + 1]))
+    assert res == [(2, page_result('http://a.com/'), None), (0, None, 500), (1, 'http://b.com/', None)]
+
+
+class BatchFetchHandlerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        self.server = make_server(slave_batch_size=3, slave_batch_delay=0.01)
+        return Application([(r'/api/v1/batch_fetch', StubBatchFetchHandler, dict(server=self.server))])
+
+    def _slave(self):
+        return Slave('127.0.0.1:{}'.format(self.get_http_port()), self.server)
+
+    def _post(self, body, on_chunk):
+        timestamp = str(int(time.time()))
+        signature = hashlib.sha256(body + ('batchbatch' + timestamp + '1').encode('utf-8')).hexdigest()
+        url = '/api/v1/batch_fetch?name=batch&rtype=batch&timestamp={}&nonce=1&signature={}'.format(timestamp,
+                                                                                                   signature)
+        return self.fetch(url, method='POST', body=body, streaming_callback=on_chunk)
+
+    def test_stream_results_as_completed(self):
+        tasks = [('Bing', 'page', HttpRequest('http://slow.com/')),
+                 ('Bing', 'page', HttpRequest('http://fail.com/')),
+                 ('Baidu', 'url', HttpRequest('http://a.com/')),
+                 ('Bing', 'page', HttpRequest('http://busy.com/'))]
+        reader = codec.BatchResultReader([t[1] for t in tasks])
+        res = []
+        resp = self._post(codec.encode_tasks(tasks), lambda chunk: res.extend(reader.feed(chunk)))
+        assert resp.code == 200
+        assert sorted(res[:3]) == [(1, None, 500), (2, 'http://real.com/', None), (3, None, 503)]
+        assert res[3] == (0, page_result('http://slow.com/'), None)
+
+    def test_reject_unknown_engine(self):
+        tasks = [('Unknown', 'page', HttpRequest('http://a.com/'))]
+        resp = self._post(codec.encode_tasks(tasks), None)
+        assert resp.code == 400
+
+    def test_reject_bad_signature(self):
+        resp = self.fetch('/api/v1/batch_fetch?name=batch&rtype=batch&timestamp=0&nonce=1&signature=x',
+                          method='POST', body=codec.encode_tasks([]))
+        assert resp.code == 403
+
+    @gen_test
+    async def test_slave_demux(self):
+        slave = self._slave()
+        res = await asyncio.gather(slave.fetch(HttpRequest('http://slow.com/'), 'Bing', coalesce=False),
+                                   slave.fetch(HttpRequest('http://fail.com/'), 'Bing', coalesce=False),
+                                   slave.fetch_url(HttpRequest('http://a.com/'), 'Baidu'),
+                                   return_exceptions=True)
+        assert res[0] == {'data': page_result('http://slow.com/')}
+        assert isinstance(res[1], FetchError)
+        assert res[2] == {'data': 'http://real.com/'}
+        assert slave.pool.requests == 1
+        slave.pool.close()
+
+
+class FakePool:
+    """
+    以小块返回预先设置的帧，模拟流式响应
+    """
+
+    def __init__(self, frames, error=None):
+        self.frames = frames
+        self.error = error
+        self.requests = []
+
+    async def fetch(self, request, span=None):
+        self.requests.append(request)
+        data = b''.join(self.frames)
+        for i in range(0, len(data), 3):
+            request.streaming_callback(data[i:i + 3])
+            await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+
+
+class SlaveBatchTest(AsyncTestCase):
+    def _slave(self, pool, batch_size=2):
+        slave = Slave('127.0.0.1:1', make_server(slave_batch_size=batch_size, slave_batch_delay=0.01))
+        slave.pool = pool
+        return slave
+
+    @gen_test
+    async def test_missing_result(self):
+        pool = FakePool([codec.encode_batch_result(1, 'page', result=page_result('http://b.com/'))])
+        slave = self._slave(pool)
+        res = await asyncio.gather(slave.fetch(HttpRequest('http://a.com/'), 'Bing', coalesce=False),
+                                   slave.fetch(HttpRequest('http://b.com/'), 'Bing', coalesce=False),
+                                   return_exceptions=True)
+        assert isinstance(res[0], FetchError)
+        assert res[1] == {'data': page_result('http://b.com/')}
+        assert len(pool.requests) == 1
+
+    @gen_test
+    async def test_connection_error(self):
+        pool = FakePool([codec.encode_batch_result(0, 'page', result=page_result('http://a.com/'))],
+                        error=ConnectionError('reset'))
+        slave = self._slave(pool)
+        res = await asyncio.gather(slave.fetch(HttpRequest('http://a.com/'), 'Bing', coalesce=False),
+                                   slave.fetch(HttpRequest('http://b.com/'), 'Bing', coalesce=False),
+                                   return_exceptions=True)
+        assert res[0] == {'data': page_result('http://a.com/')}
+        assert isinstance(res[1], ConnectionError)
+
+    @gen_test
+    async def test_flush_after_delay(self):
+        pool = FakePool([codec.encode_batch_result(0, 'page', result=page_result('http://a.com/'))])
+        slave = self._slave(pool, batch_size=10)
+        res = await slave.fetch(HttpRequest('http://a.com/'), 'Bing', coalesce=False)
+        assert res == {'data': page_result('http://a.com/')}
+        assert len(pool.requests) == 1
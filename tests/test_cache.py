@@ -0,0 +1,102 @@
+# coding=utf-8
+
+import time
+
+from metase.cache import LRUCache, SqliteCache, LayeredCache
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(1024, ttl=60)
+    cache.set('a', 'x')
+    cache.set('b', 'y', ttl=-1)
+    assert cache.get('a') == 'x'
+    assert cache.get('b') is None
+    assert 'b' not in cache
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_lru_cache_stale():
+    cache = LRUCache(1024)
+    cache.set('a', 'x', ttl=-1)
+    assert cache.get_stale('a', grace=60) == ('x', True)
+    assert cache.get_stale('a', grace=60) == ('x', True)
+    assert cache.get_stale('a', grace=0) == (None, False)
+    assert len(cache) == 0
+
+
+def test_lru_cache_size_eviction():
+    cache = LRUCache(300, sizeof=lambda v: 100)
+    for k in 'abc':
+        cache.set(k, k)
+    assert cache.size == 300
+    cache.get('a')
+    cache.set('d', 'd')
+    assert 'b' not in cache
+    assert [k for k in 'acd' if k in cache] == ['a', 'c', 'd']
+    assert cache.size == 300
+    cache.sizeof = lambda v: 1000
+    cache.set('big', 'big')
+    assert 'big' not in cache
+    assert len(cache) == 3
+
+
+def test_lru_cache_replace():
+    cache = LRUCache(1024, sizeof=lambda v: len(v))
+    cache.set('a', 'xx')
+    cache.set('a', 'xxxx')
+    assert cache.size == 4
+    cache.delete('a')
+    assert cache.size == 0
+
+
+def test_layered_cache_keeps_remaining_ttl(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    shared = SqliteCache(path, ttl=24 * 3600)
+    writer = LayeredCache(LRUCache(1024, ttl=24 * 3600), shared)
+    writer.set('negative', '', ttl=1)
+    writer.set('positive', 'http://example.com/', ttl=100)
+
+    reader = LayeredCache(LRUCache(1024, ttl=24 * 3600), SqliteCache(path, ttl=24 * 3600))
+    assert reader.get('negative') == ''
+    assert reader.get('positive') == 'http://example.com/'
+    _, expire_time, _ = reader.memory._data['positive']
+    assert expire_time <= time.time() + 100
+    _, expire_time, _ = reader.memory._data['negative']
+    assert expire_time <= time.time() + 1
+    time.sleep(1.1)
+    assert reader.get('negative') is None
+    shared.close()
+
+
+def test_sqlite_cache_purge_expired(tmp_path):
+    cache = SqliteCache(str(tmp_path / 'cache.db'), ttl=100, purge_interval=3600)
+    cache.set('a', 'x', ttl=-1)
+    cache.set('b', 'x', ttl=-1)
+    cache.set('c', 'x')
+    # 两次清理之间过期的条目保留在文件中，直到下一次清理
+    assert len(cache) == 3
+    cache.purge()
+    assert len(cache) == 1
+    assert cache.get('c') == 'x'
+    cache.close()
+
+
+def test_sqlite_cache_purge_on_set(tmp_path):
+    cache = SqliteCache(str(tmp_path / 'cache.db'), ttl=100, purge_interval=0)
+    cache.set('a', 'x', ttl=-1)
+    cache.set('b', 'x')
+    assert len(cache) == 1
+    cache.close()
+
+
+def test_sqlite_cache_max_entries(tmp_path):
+    cache = SqliteCache(str(tmp_path / 'cache.db'), max_entries=2, purge_interval=0)
+    cache.set('forever', 'x')
+    cache.set('short', 'x', ttl=10)
+    cache.set('long', 'x', ttl=100)
+    assert len(cache) == 2
+    assert cache.get('short') is None
+    assert cache.get('forever') == 'x'
+    assert cache.get('long') == 'x'
+    cache.close()
@@ -0,0 +1,163 @@
+# coding=utf-8
+
+import random
+
+import pytest
+from xpaw import HttpRequest, HttpHeaders
+
+from metase import codec
+from metase.errors import CodecError
+
+
+def make_request():
+    headers = HttpHeaders()
+    headers.add('Cookie', 'a=1')
+    headers.add('User-Agent', 'Mozilla/5.0')
+    return HttpRequest('http://www.baidu.com/s?wd=%E6%90%9C%E7%B4%A2&pn=10', method='POST', headers=headers,
+                       body=b'\x00\x01body', allow_redirects=False)
+
+
+def assert_same_request(a, b):
+    assert a.url == b.url
+    assert a.method == b.method
+    assert list(a.headers.get_all()) == list(b.headers.get_all())
+    assert a.body == b.body
+    assert a.allow_redirects == b.allow_redirects
+
+
+RECORDS = [{'title': '标题', 'text': 'x' * 300, 'url': 'http://example.com/1'},
+           {'title': 't', 'text': None, 'url': 'http://example.com/2'}]
+
+
+def test_request_round_trip():
+    req = make_request()
+    assert_same_request(codec.decode_request(codec.encode_request(req)), req)
+    plain = codec.decode_request(codec.encode_request(HttpRequest('http://example.com/')))
+    assert plain.url == 'http://example.com/'
+    assert plain.headers is None
+
+
+def test_tasks_round_trip():
+    req = make_request()
+    tasks = codec.decode_tasks(codec.encode_tasks([('Baidu', 'page', req), ('Sogou', 'url', req)]))
+    assert [(name, rtype) for name, rtype, _ in tasks] == [('Baidu', 'page'), ('Sogou', 'url')]
+    for _, _, r in tasks:
+        assert_same_request(r, req)
+
+
+def test_result_round_trip():
+    assert codec.decode_result('page', codec.encode_result('page', RECORDS)) == RECORDS
+    assert codec.decode_result('page', codec.encode_result('page', [])) == []
+    assert codec.decode_result('url', codec.encode_result('url', 'http://example.com/')) == 'http://example.com/'
+    assert codec.decode_result('url', codec.encode_result('url', None)) is None
+
+
+def test_batch_result_reader():
+    data = codec.encode_batch_result(1, 'url', result='http://example.com/') \
+        + codec.encode_batch_result(0, 'page', result=RECORDS) \
+        + codec.encode_batch_result(2, 'page', error=503)
+    reader = codec.BatchResultReader(['page', 'url', 'page'])
+    res = []
+    for i in range(0, len(data), 7):
+        res.extend(reader.feed(data[i:i + 7]))
+    assert res == [(1, 'http://example.com/', None), (0, RECORDS, None), (2, None, 503)]
+
+
+def test_large_values():
+    text = 'x' * 70000
+    records = [{'title': str(i), 'text': text, 'url': 'http://example.com/{}'.format(i)} for i in range(20)]
+    assert codec.decode_result('page', codec.encode_result('page', records)) == records
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'MS',
+    b'XX\x01\x03\x90',
+    b'MS\x02\x03\x90',
+    b'MS\x01\x01\x90',
+    b'MS\x01\x03\x90\x90',
+    b'MS\x01\x03\x91',
+    b'MS\x01\x03\xdd\xff\xff\xff\xff',
+    b'MS\x01\x03\xc6\x00\x00\x00\x10ab',
+    b'MS\x01\x03\xa3\xff\xfe\xfd',
+    b'MS\x01\x03\xc1',
+    b'MS\x01\x03' + b'\x91' * 100000 + b'\x90',
+])
+def test_reject_malformed_message(data):
+    with pytest.raises(CodecError):
+        codec.decode_result('page', data)
+
+
+@pytest.mark.parametrize('obj', [
+    1,
+    [],
+    ['http://example.com/', 'GET', None, None],
+    [1, 'GET', None, None, True],
+    ['http://example.com/', None, None, None, True],
+    ['http://example.com/', 'GET', 'headers', None, True],
+    ['http://example.com/', 'GET', [['a']], None, True],
+    ['http://example.com/', 'GET', [['a', 1]], None, True],
+    ['http://example.com/', 'GET', None, 'body', True],
+    ['http://example.com/', 'GET', None, None, 1],
+])
+def test_reject_bad_request(obj):
+    with pytest.raises(CodecError):
+        codec.decode_request(codec._encode(codec.KIND_REQUEST, obj))
+
+
+@pytest.mark.parametrize('obj', [None, 1, [1], [['t', 'x']], [['t', 'x', 1]]])
+def test_reject_bad_page_result(obj):
+    with pytest.raises(CodecError):
+        codec.decode_result('page', codec._encode(codec.KIND_RESULT, obj))
+
+
+def test_reject_bad_batch_result():
+    for obj in (1, [0, None], [5, None, None], [True, None, None], [0, 'error', None]):
+        body = codec._encode(codec.KIND_BATCH_RESULT, obj)
+        reader = codec.BatchResultReader(['url'])
+        with pytest.raises(CodecError):
+            reader.feed(codec._LENGTH.pack(len(body)) + body)
+
+
+def _mutate(rnd, data):
+    data = bytearray(data)
+    for _ in range(rnd.randint(1, 4)):
+        op = rnd.randint(0, 2)
+        pos = rnd.randrange(len(data))
+        if op == 0:
+            data[pos] = rnd.randrange(256)
+        elif op == 1:
+            del data[pos:pos + rnd.randint(1, 8)]
+        else:
+            data[pos:pos] = bytes(rnd.randrange(256) for _ in range(rnd.randint(1, 8)))
+        if len(data) == 0:
+            break
+    return bytes(data)
+
+
+def test_fuzz_decode():
+    rnd = random.Random(0)
+    req = make_request()
+    samples = [
+        (codec.decode_request, codec.encode_request(req)),
+        (codec.decode_tasks, codec.encode_tasks([('Baidu', 'page', req), ('Sogou', 'url', req)])),
+        (lambda d: codec.decode_result('page', d), codec.encode_result('page', RECORDS)),
+        (lambda d: codec.decode_result('url', d), codec.encode_result('url', 'http://example.com/')),
+    ]
+    for _ in range(5000):
+        for decode, data in samples:
+            try:
+                decode(_mutate(rnd, data))
+            except CodecError:
+                pass
+
+
+@pytest.mark.parametrize('value', [0, 127, 128, -1, -32, -33, 2 ** 63 - 1, -2 ** 63])
+def test_int_round_trip(value):
+    assert codec._decode(codec.KIND_RESULT, codec._encode(codec.KIND_RESULT, [value])) == [value]
+
+
+@pytest.mark.parametrize('obj', [2 ** 63, -2 ** 63 - 1, 10 ** 30, 1.5, {'a': 1}])
+def test_reject_unsupported_value(obj):
+    with pytest.raises(CodecError):
+        codec._encode(codec.KIND_RESULT, [obj])
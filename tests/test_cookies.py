@@ -0,0 +1,138 @@
+# coding=utf-8
+
+import os
+import shutil
+import asyncio
+import tempfile
+
+import pytest
+from tornado.web import Application
+from tornado.testing import AsyncTestCase, AsyncHTTPTestCase, gen_test
+
+from metase.cookies import MemoryCookieStore, FileCookieStore, HttpCookieStore, CookieRefresher
+from metase.server import CookieHandler
+from tests.helpers import make_config, make_server
+
+
+class CookieStoreTest(AsyncTestCase):
+    @gen_test
+    async def test_memory_store(self):
+        store = MemoryCookieStore(make_config())
+        assert await store.get('Bing', 0) == {}
+        await store.update('Bing', 0, {'a': '1'})
+        await store.update('Bing', 0, {'b': '2'})
+        await store.update('Bing', 1, {'a': '3'})
+        assert await store.get('Bing', 0) == {'a': '1', 'b': '2'}
+        assert await store.dump() == {'Bing': {'0': {'a': '1', 'b': '2'}, '1': {'a': '3'}}}
+
+    @gen_test
+    async def test_file_store_shared(self):
+        path = self.get_tmp_path()
+        writer = FileCookieStore(make_config(cookie_store_file=path, cookie_store_reload_interval=0))
+        reader = FileCookieStore(make_config(cookie_store_file=path, cookie_store_reload_interval=0))
+        assert await reader.get('Bing', 0) == {}
+        await writer.update('Bing', 0, {'a': '1'})
+        assert await writer.get('Bing', 0) == {'a': '1'}
+        assert await reader.get('Bing', 0) == {'a': '1'}
+        await reader.update('Bing', 0, {'b': '2'})
+        assert await writer.dump() == {'Bing': {'0': {'a': '1', 'b': '2'}}}
+
+    @gen_test
+    async def test_file_store_reload_interval(self):
+        path = self.get_tmp_path()
+        writer = FileCookieStore(make_config(cookie_store_file=path))
+        reader = FileCookieStore(make_config(cookie_store_file=path, cookie_store_reload_interval=3600))
+        await writer.update('Bing', 0, {'a': '1'})
+        assert await reader.get('Bing', 0) == {'a': '1'}
+        await writer.update('Bing', 0, {'a': '2'})
+        # 两次检查之间不读取文件
+        assert await reader.get('Bing', 0) == {'a': '1'}
+        reader._check_time -= 3600
+        assert await reader.get('Bing', 0) == {'a': '2'}
+
+    @gen_test
+    async def test_file_store_invalid_data(self):
+        path = self.get_tmp_path()
+        with open(path, 'w') as f:
+            f.write('not json')
+        store = FileCookieStore(make_config(cookie_store_file=path))
+        assert await store.get('Bing', 0) == {}
+        await store.update('Bing', 0, {'a': '1'})
+        assert await store.get('Bing', 0) == {'a': '1'}
+
+    def test_file_store_requires_path(self):
+        with pytest.raises(ValueError):
+            FileCookieStore(make_config())
+
+    def get_tmp_path(self):
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d)
+        return os.path.join(d, 'cookies.json')
+
+
+class HttpCookieStoreTest(AsyncHTTPTestCase):
+    def get_app(self):
+        self.server = make_server(api_secret='secret')
+        return Application([(r'/cookies', CookieHandler, dict(server=self.server))])
+
+    @gen_test
+    async def test_pull(self):
+        await self.server.cookie_store.update('Bing', 0, {'a': '1'})
+        store = HttpCookieStore(make_config(api_secret='secret', cookie_store_url=self.get_url('/cookies')))
+        await store.pull()
+        assert await store.get('Bing', 0) == {'a': '1'}
+        # 本地更新的Cookie在下次拉取时被覆盖
+        await store.update('Bing', 0, {'a': '2'})
+        assert await store.get('Bing', 0) == {'a': '2'}
+        await store.pull()
+        assert await store.get('Bing', 0) == {'a': '1'}
+        store.close()
+
+    @gen_test
+    async def test_reject_wrong_secret(self):
+        store = HttpCookieStore(make_config(api_secret='other', cookie_store_url=self.get_url('/cookies')))
+        with pytest.raises(Exception):
+            await store.pull()
+        store.close()
+
+
+class FakeSearchEngine:
+    name = 'Bing'
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.refreshes = 0
+
+    async def refresh_cookies(self):
+        self.refreshes += 1
+        if self.fail:
+            raise RuntimeError('failed')
+        return {'n': str(self.refreshes)}
+
+
+class CookieRefresherTest(AsyncTestCase):
+    @gen_test
+    async def test_refresh_sessions(self):
+        store = MemoryCookieStore(make_config())
+        refresher = CookieRefresher(store, 0.05, jitter=0)
+        se = FakeSearchEngine()
+        refresher.start(se, 2)
+        await asyncio.sleep(0.12)
+        refresher.stop()
+        assert se.refreshes >= 4
+        cookies = await store.dump()
+        assert sorted(cookies['Bing']) == ['0', '1']
+        n = se.refreshes
+        await asyncio.sleep(0.1)
+        assert se.refreshes == n
+
+    @gen_test
+    async def test_reschedule_after_failure(self):
+        store = MemoryCookieStore(make_config())
+        refresher = CookieRefresher(store, 0.02, jitter=0)
+        se = FakeSearchEngine(fail=True)
+        refresher.start(se, 1)
+        await asyncio.sleep(0.1)
+        refresher.stop()
+        assert se.refreshes >= 2
+        assert await store.dump() == {}
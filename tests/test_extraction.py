@@ -0,0 +1,12 @@
+# coding=utf-8
+
+from metase.search_engines.yahoo import Yahoo
+
+
+def test_yahoo_skips_item_without_real_url():
+    page = '<html><body>' \
+           '<div class="algo-sr"><h3><a href="https://r.search.yahoo.com/_ylt=x/RU=http%3a%2f%2fexample.com%2f/RK=0">' \
+           'A</a></h3><p class="lh-l">a</p></div>' \
+           '<div class="algo-sr"><h3><a href="https://ad.example.com/">B</a></h3><p class="lh-l">b</p></div>' \
+           '</body></html>'
+    assert list(Yahoo.extraction.extract(page)) == [{'title': 'A', 'text': 'a', 'url': 'http://example.com/'}]
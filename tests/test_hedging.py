@@ -0,0 +1,85 @@
+# coding=utf-8
+
+import asyncio
+
+from tornado.testing import AsyncTestCase, gen_test
+from xpaw import HttpRequest
+
+from metase.balancer import SlaveHealth
+from metase.hedging import HedgeBudget
+from tests.helpers import make_server, make_config
+
+
+def test_hedge_budget():
+    budget = HedgeBudget(0.5, burst=2)
+    assert not budget.acquire()
+    budget.on_request()
+    assert not budget.acquire()
+    budget.on_request()
+    assert budget.acquire()
+    assert not budget.acquire()
+    for _ in range(10):
+        budget.on_request()
+    assert budget.tokens == 2
+    assert budget.acquire()
+    assert budget.acquire()
+    assert not budget.acquire()
+    assert budget.requests == 12
+    assert budget.hedges == 3
+
+
+class FakeSlave:
+    def __init__(self, address, delay):
+        self.address = address
+        self.delay = delay
+        self.health = SlaveHealth(make_config())
+        self.requests = 0
+
+    async def fetch(self, request, name, span=None, coalesce=True):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        return {'data': [{'title': 't', 'text': 't', 'url': self.address}]}
+
+
+class HedgeTest(AsyncTestCase):
+    def _server(self, *slaves):
+        server = make_server(hedge_budget=1, hedge_min_samples=5)
+        server.slave_map = {'Bing': list(slaves)}
+        self.window = server.latency[('Bing', 'page')]
+        for _ in range(5):
+            self.window.add(0.02)
+        return server
+
+    @gen_test
+    async def test_hedge_slow_request(self):
+        slow, fast = FakeSlave('slow', 0.3), FakeSlave('fast', 0.01)
+        server = self._server(slow, fast)
+        resp = await server._hedged_fetch(slow, HttpRequest('http://a.com/'), 'Bing')
+        assert resp['data'][0]['url'] == 'fast'
+        assert fast.requests == 1
+        assert server.hedge_budget.hedges == 1
+        # 对冲请求的耗时不计入窗口，第一个请求完成后记录其实际耗时
+        assert len(self.window) == 5
+        await asyncio.sleep(0.35)
+        assert len(self.window) == 6
+        assert max(self.window._samples) >= 0.3
+
+    @gen_test
+    async def test_no_hedge_for_fast_request(self):
+        a, b = FakeSlave('a', 0), FakeSlave('b', 0)
+        server = self._server(a, b)
+        resp = await server._hedged_fetch(a, HttpRequest('http://a.com/'), 'Bing')
+        assert resp['data'][0]['url'] == 'a'
+        assert b.requests == 0
+        assert server.hedge_budget.hedges == 0
+        assert len(self.window) == 6
+
+    @gen_test
+    async def test_no_backup_slave_keeps_budget(self):
+        slow = FakeSlave('slow', 0.1)
+        server = self._server(slow)
+        resp = await server._hedged_fetch(slow, HttpRequest('http://a.com/'), 'Bing')
+        assert resp['data'][0]['url'] == 'slow'
+        assert server.hedge_budget.hedges == 0
+        # 本次请求增加的令牌没有被消耗
+        assert server.hedge_budget.tokens == 1
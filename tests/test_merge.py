@@ -0,0 +1,98 @@
+# coding=utf-8
+
+from metase.merge import merge_results, rank_results
+from metase.ranking import DefaultFuser, CombMNZFuser
+from metase.dedup import canonicalize_url, NearDuplicateIndex
+
+from tests.helpers import make_records
+
+WEIGHTS = {'A': 1, 'B': 1, 'C': 2}
+
+
+def shared(url, title='title', text='text'):
+    return {'title': title, 'text': text, 'url': url}
+
+
+def test_merge_counts():
+    results = {
+        'A': make_records('a', 3) + [shared('http://x.com/1')],
+        'B': [shared('http://x.com/1'), shared('http://x.com/2')],
+        'C': [shared('http://x.com/2'), shared('http://x.com/2')]
+    }
+    records, counts = merge_results(results, DefaultFuser({}), WEIGHTS)
+    assert len(records) == 5
+    assert counts == {'A': 4, 'B': 2, 'C': 1}
+    merged = {r['url']: r for r in records}
+    assert merged['http://x.com/1']['sources'] == ['A', 'B']
+    assert merged['http://x.com/2']['sources'] == ['B', 'C']
+    for s, n in counts.items():
+        assert n == sum(1 for r in records if s in r['sources'])
+
+
+def test_merge_keeps_best_title():
+    results = {
+        'A': make_records('a', 5) + [shared('http://x.com/1', title='low')],
+        'C': [shared('http://x.com/1', title='high')]
+    }
+    records, _ = merge_results(results, DefaultFuser({}), WEIGHTS)
+    r = [r for r in records if r['url'] == 'http://x.com/1'][0]
+    assert r['title'] == 'high'
+
+
+def test_merge_combine():
+    results = {'A': [shared('http://x.com/1')], 'B': [shared('http://x.com/1')]}
+    fuser = CombMNZFuser({})
+    score = fuser.rank_scores(1)[0]
+    records, _ = merge_results(results, fuser, WEIGHTS)
+    assert records[0]['relevance'] == score * 2 * 2
+
+
+def test_merge_url_key():
+    results = {
+        'A': [shared('http://www.x.com/1?utm_source=a')],
+        'B': [shared('http://x.com/1')]
+    }
+    records, counts = merge_results(results, DefaultFuser({}), WEIGHTS, url_key=canonicalize_url)
+    assert len(records) == 1
+    assert counts == {'A': 1, 'B': 1}
+
+
+def test_merge_near_duplicates():
+    text = 'python is a programming language that lets you work quickly and integrate systems more effectively'
+    results = {
+        'A': [shared('http://x.com/1', title='Python', text=text), shared('http://x.com/3', text=text)],
+        'B': [shared('http://y.com/1', title='Python', text=text), shared('http://y.com/2', title='other')]
+    }
+    records, counts = merge_results(results, DefaultFuser({}), WEIGHTS, near_duplicate=NearDuplicateIndex())
+    assert len(records) == 2
+    assert counts == {'A': 1, 'B': 2}
+    r = [r for r in records if r['title'] == 'Python'][0]
+    assert r['sources'] == ['A', 'B']
+
+
+def test_rank_results():
+    records = [{'relevance': v} for v in [1.0, 5.0, 2.5, 0.1]]
+    res = rank_results(list(records))
+    assert [r['id'] for r in res] == [1, 2, 3, 4]
+    assert [r['relevance'] for r in res] == [10, 5, 2, 1]
+    top = rank_results([{'relevance': v} for v in [1.0, 5.0, 2.5, 0.1]], top_k=2)
+    assert [r['relevance'] for r in top] == [10, 5]
+    assert rank_results([]) == []
+
+
+def test_merge_near_duplicate_limit():
+    text = 'python is a programming language that lets you work quickly and integrate systems more effectively'
+    results = {
+        'A': [shared('http://x.com/1', text='other text ' * 5)] + [shared('http://x.com/2', text=text)],
+        'B': [shared('http://y.com/2', text=text)]
+    }
+    records, counts = merge_results(results, DefaultFuser({}), WEIGHTS, near_duplicate=NearDuplicateIndex(),
+                                    near_duplicate_limit=1)
+    assert len(records) == 3
+    assert counts == {'A': 2, 'B': 1}
+    records, counts = merge_results(results, DefaultFuser({}), WEIGHTS, near_duplicate=NearDuplicateIndex(),
+                                    near_duplicate_limit=3)
+    assert len(records) == 2
+    assert counts == {'A': 2, 'B': 1}
+    r = [r for r in records if r['text'] == text][0]
+    assert sorted(r['sources']) == ['A', 'B']
@@ -0,0 +1,16 @@
+# coding=utf-8
+
+from tornado.testing import AsyncTestCase, gen_test
+
+from tests.helpers import make_server
+
+
+class MetricsTest(AsyncTestCase):
+    @gen_test
+    async def test_render_slave_pool_stats(self):
+        server = make_server(port=9281)
+        text = server.metrics.render()
+        assert 'metase_slave_connections_in_use{slave="localhost:9281"} 0' in text
+        assert 'metase_slave_connections_waiting{slave="localhost:9281"} 0' in text
+        assert 'metase_slave_pool_requests_total{slave="localhost:9281"} 0' in text
+        assert '# TYPE metase_slave_pool_requests_total counter' in text
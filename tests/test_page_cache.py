@@ -0,0 +1,67 @@
+# coding=utf-8
+
+import time
+import asyncio
+import hashlib
+
+from tornado.web import Application
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from xpaw import HttpRequest
+
+from metase import codec
+from metase.server import FetchHanlder
+from metase.utils import canonical_url
+from tests.helpers import make_server
+
+URL = 'http://www.bing.com/search?q=python'
+
+OLD = [{'title': 'old', 'text': 'text', 'url': 'http://www.example.com/old'}]
+NEW = [{'title': 'new', 'text': 'text', 'url': 'http://www.example.com/new'}]
+
+
+class StubFetchHandler(FetchHanlder):
+    fetches = 0
+
+    async def _fetch_result(self, req, name, rtype):
+        StubFetchHandler.fetches += 1
+        await asyncio.sleep(0.05)
+        return NEW, True
+
+
+class PageCacheTest(AsyncHTTPTestCase):
+    def get_app(self):
+        StubFetchHandler.fetches = 0
+        self.server = make_server(page_cache_stale_ttl=60)
+        return Application([(r'/fetch', StubFetchHandler, dict(server=self.server))])
+
+    def _url(self, body):
+        timestamp = str(int(time.time()))
+        signature = hashlib.sha256(body + ('Bingpage' + timestamp + '1').encode('utf-8')).hexdigest()
+        return self.get_url('/fetch?name=Bing&rtype=page&timestamp={}&nonce=1&signature={}'.format(timestamp,
+                                                                                                  signature))
+
+    async def _fetch_page(self):
+        body = codec.encode_request(HttpRequest(URL))
+        resp = await self.http_client.fetch(self._url(body), method='POST', body=body)
+        return codec.decode_result('page', resp.body)
+
+    @gen_test
+    async def test_stale_hit_refreshes_once(self):
+        key = ('Bing', canonical_url(URL))
+        self.server.page_cache.set(key, OLD, ttl=-1)
+        res = await asyncio.gather(*[self._fetch_page() for _ in range(3)])
+        assert res == [OLD, OLD, OLD]
+        assert StubFetchHandler.fetches == 1
+        await asyncio.sleep(0.1)
+        assert StubFetchHandler.fetches == 1
+        assert self.server.page_cache.get_stale(key, count=False) == (NEW, False)
+        assert not self.server.page_refreshing
+        assert await self._fetch_page() == NEW
+        assert StubFetchHandler.fetches == 1
+
+    @gen_test
+    async def test_expired_beyond_grace(self):
+        key = ('Bing', canonical_url(URL))
+        self.server.page_cache.set(key, OLD, ttl=-61)
+        assert await self._fetch_page() == NEW
+        assert StubFetchHandler.fetches == 1
@@ -0,0 +1,85 @@
+# coding=utf-8
+
+import json
+import base64
+
+from tornado.web import Application
+from tornado.testing import AsyncHTTPTestCase
+
+from metase.server import ResolveHandler
+from tests.helpers import make_server
+
+
+def test_resolve_token():
+    server = make_server(api_secret='secret')
+    token = server._make_resolve_token('Baidu', 'http://www.baidu.com/link?url=1')
+    assert server.parse_resolve_token(token) == ('Baidu', 'http://www.baidu.com/link?url=1')
+
+
+def test_reject_tampered_token():
+    server = make_server(api_secret='secret')
+    token = server._make_resolve_token('Baidu', 'http://www.baidu.com/link?url=1')
+    data, signature = token.rsplit('.', 1)
+    assert server.parse_resolve_token(data + '.' + '0' * len(signature)) is None
+    forged = base64.urlsafe_b64encode(json.dumps(['Baidu', 'http://evil.com/', 2 ** 40]).encode('utf-8'))
+    assert server.parse_resolve_token(forged.decode('ascii') + '.' + signature) is None
+    other = make_server(api_secret='other')
+    assert other.parse_resolve_token(token) is None
+    for token in ('', '.', 'abc', 'a.b.c', '!!!.' + signature):
+        assert server.parse_resolve_token(token) is None
+
+
+def test_reject_expired_token():
+    server = make_server(api_secret='secret', resolve_token_ttl=-1)
+    token = server._make_resolve_token('Baidu', 'http://www.baidu.com/link?url=1')
+    assert server.parse_resolve_token(token) is None
+
+
+def test_reject_unknown_engine():
+    server = make_server(api_secret='secret')
+    token = server._make_resolve_token('Unknown', 'http://www.example.com/')
+    assert server.parse_resolve_token(token) is None
+
+
+def test_no_tokens_without_secret():
+    token = make_server(api_secret='secret')._make_resolve_token('Baidu', 'http://www.baidu.com/link?url=1')
+    server = make_server(api_secret='')
+    assert server.parse_resolve_token(token) is None
+    _, _, resolve_top, _, _ = server._search_params({'resolve_top': 5})
+    assert resolve_top is None
+    _, _, resolve_top, _, _ = make_server(api_secret='secret')._search_params({'resolve_top': 5})
+    assert resolve_top == 5
+
+
+class ResolveHandlerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        self.server = make_server(api_secret='secret', max_resolve_tokens=3)
+
+        async def get_real_url(result, name, task, index, span=None):
+            result['url'] = 'http://real.com/{}'.format(index)
+            result.pop('resolve_token', None)
+            task.set_result(index, True)
+
+        self.server._get_real_url = get_real_url
+        return Application([(r'/resolve', ResolveHandler, dict(server=self.server))])
+
+    def test_resolve(self):
+        token = self.server._make_resolve_token('Baidu', 'http://www.baidu.com/link?url=1')
+        resp = self.fetch('/resolve', method='POST', body=json.dumps([token, 'bad']))
+        assert resp.code == 200
+        assert json.loads(resp.body.decode('utf-8'))['data'] == {token: 'http://real.com/0', 'bad': None}
+        resp = self.fetch('/resolve?tokens={}'.format(token))
+        assert json.loads(resp.body.decode('utf-8'))['data'] == {token: 'http://real.com/0'}
+
+    def test_max_resolve_tokens(self):
+        resp = self.fetch('/resolve', method='POST', body=json.dumps(['a', 'b', 'c', 'd']))
+        assert resp.code == 400
+        resp = self.fetch('/resolve?tokens=a,b,c,d')
+        assert resp.code == 400
+        resp = self.fetch('/resolve', method='POST', body=json.dumps(['a', 'b', 'c']))
+        assert resp.code == 200
+
+    def test_reject_bad_body(self):
+        for body in ('{', '{"a": 1}', '[1]'):
+            resp = self.fetch('/resolve', method='POST', body=body)
+            assert resp.code == 400
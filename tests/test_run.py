@@ -0,0 +1,49 @@
+# coding=utf-8
+
+import os
+
+import pytest
+
+from metase import run
+
+
+class FakeServer:
+    def __init__(self, config):
+        self.config = config
+
+    def on_start(self, sockets=None):
+        pass
+
+
+class FakeIOLoop:
+    def start(self):
+        raise RuntimeError('worker crashed')
+
+
+@pytest.fixture
+def pid_file(tmpdir, monkeypatch):
+    monkeypatch.setattr(run, 'MseServer', FakeServer)
+    monkeypatch.setattr(run.IOLoop, 'current', staticmethod(lambda: FakeIOLoop()))
+    monkeypatch.setattr(run, 'bind_sockets', lambda *args, **kwargs: [])
+    return str(tmpdir.join('metase.pid'))
+
+
+def test_remove_pid_file_in_single_process(pid_file):
+    with pytest.raises(RuntimeError):
+        run.run_server({'pid_file': pid_file, 'workers': 1, 'log_level': 'warning'})
+    assert not os.path.exists(pid_file)
+
+
+def test_worker_keeps_pid_file(pid_file, monkeypatch):
+    parent_pid = os.getpid()
+
+    def fork_processes(workers, max_restarts=None):
+        # 模拟fork后的工作进程
+        monkeypatch.setattr(run.os, 'getpid', lambda: parent_pid + 1)
+        return 0
+
+    monkeypatch.setattr(run, 'fork_processes', fork_processes)
+    with pytest.raises(RuntimeError):
+        run.run_server({'pid_file': pid_file, 'workers': 2, 'log_level': 'warning'})
+    with open(pid_file) as f:
+        assert f.read() == str(parent_pid)
@@ -0,0 +1,78 @@
+# coding=utf-8
+
+import json
+
+from tornado.web import Application
+from tornado.testing import AsyncHTTPTestCase
+
+from metase.config import DEFAULT_CONFIG
+from metase.server import MseServer, SearchHandler
+from metase.tracing import Span, NOOP_SPAN
+
+
+def make_records(n):
+    return [{'title': 'title {}'.format(i), 'text': 'text', 'url': 'http://www.example.com/{}'.format(i)}
+            for i in range(n)]
+
+
+class SearchHandlerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        config = dict(DEFAULT_CONFIG)
+        config['metrics'] = False
+        self.server = MseServer(config)
+        self.calls = []
+
+        async def meta_search(query, **kwargs):
+            self.calls.append((query, kwargs))
+            callback = kwargs.get('callback')
+            if callback is not None:
+                callback({'meta': {'request': {}, 'response': {}}, 'records': make_records(1)})
+            return {'meta': {'request': {'data_source_results': 20}, 'response': {}}, 'records': make_records(3)}
+
+        self.server.meta_search = meta_search
+        return Application([(r'/search', SearchHandler, dict(server=self.server))])
+
+    def test_stream_ndjson(self):
+        resp = self.fetch('/search?query=q&sources=Bing&stream=ndjson')
+        assert resp.code == 200
+        assert resp.headers['Content-Type'] == 'application/x-ndjson'
+        events = [json.loads(line) for line in resp.body.decode('utf-8').splitlines()]
+        assert [e['event'] for e in events] == ['partial', 'final']
+        assert len(events[0]['data']['records']) == 1
+        assert len(events[1]['data']['records']) == 3
+        (query, kwargs), = self.calls
+        assert query == 'q'
+        assert kwargs['sources'] == 'Bing'
+        assert kwargs['span'] is NOOP_SPAN
+
+    def test_stream_sse_debug(self):
+        resp = self.fetch('/search?query=q&stream=sse&debug=1')
+        assert resp.code == 200
+        assert resp.headers['Content-Type'] == 'text/event-stream'
+        events = resp.body.decode('utf-8').split('\n\n')
+        assert events[0].startswith('event: partial\ndata: ')
+        assert events[1].startswith('event: final\ndata: ')
+        final = json.loads(events[1].split('data: ', 1)[1])
+        assert final['meta']['response']['timing']['name'] == 'search'
+        (_, kwargs), = self.calls
+        assert isinstance(kwargs['span'], Span)
+
+    def test_search_debug(self):
+        resp = self.fetch('/search?query=q&debug=1')
+        assert resp.code == 200
+        data = json.loads(resp.body.decode('utf-8'))
+        assert len(data['records']) == 3
+        assert data['meta']['response']['timing']['name'] == 'search'
+
+    def test_page(self):
+        resp = self.fetch('/search?query=q&page=1&page_size=2')
+        assert resp.code == 200
+        data = json.loads(resp.body.decode('utf-8'))
+        assert [r['title'] for r in data['records']] == ['title 0', 'title 1']
+        assert data['meta']['request']['page'] == 1
+        assert data['meta']['request']['session'] is not None
+        assert len(self.calls) == 1
+
+    def test_reject_stream_with_page(self):
+        resp = self.fetch('/search?query=q&page=1&stream=ndjson')
+        assert resp.code == 400
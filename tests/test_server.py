@@ -0,0 +1,139 @@
+# coding=utf-8
+
+import time
+
+from tornado.testing import AsyncTestCase, gen_test
+
+from metase.gather import GatherTask
+from tests.helpers import make_server, make_records, stub_engines
+
+
+class ResultCacheTest(AsyncTestCase):
+    def _search(self, results):
+        server = make_server()
+        stub_engines(server, results)
+        return server
+
+    @gen_test
+    async def test_cache_complete_results(self):
+        server = self._search({'Bing': make_records('bing', 10), 'Google': make_records('google', 10)})
+        res = await server.meta_search('q', sources='Bing,Google')
+        assert len(res['records']) == 20
+        assert len(server.result_cache) == 1
+        (_, expire_time, _), = server.result_cache._data.values()
+        assert expire_time > time.time() + server.config['result_cache_partial_ttl']
+        res = await server.meta_search('q', sources='Bing,Google')
+        assert res['meta']['response']['cache']['hit'] is True
+
+    @gen_test
+    async def test_do_not_cache_empty_results(self):
+        server = self._search({})
+        res = await server.meta_search('q', sources='Bing,Google')
+        assert len(res['records']) == 0
+        assert len(server.result_cache) == 0
+
+    @gen_test
+    async def test_partial_results_use_short_ttl(self):
+        server = self._search({'Bing': make_records('bing', 10)})
+        await server.meta_search('q', sources='Bing,Google')
+        assert len(server.result_cache) == 1
+        (_, expire_time, _), = server.result_cache._data.values()
+        assert expire_time <= time.time() + server.config['result_cache_partial_ttl']
+
+
+class SearchPageTest(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = make_server(result_cache_size=0)
+        stub_engines(self.server, {'Bing': make_records('bing', 30), 'Google': make_records('google', 30)})
+
+    @gen_test
+    async def test_reuse_session(self):
+        res = await self.server.search_page('q', 1, 10, sources='Bing,Google')
+        session = res['meta']['request']['session']
+        res = await self.server.search_page(' Q ', 2, 10, session=session, sources='Google,Bing')
+        assert res['meta']['request']['session'] == session
+        assert [r['id'] for r in res['records']] == list(range(11, 21))
+
+    @gen_test
+    async def test_new_session_for_different_params(self):
+        res = await self.server.search_page('q', 1, 10, sources='Bing,Google')
+        session = res['meta']['request']['session']
+        res = await self.server.search_page('q', 2, 10, session=session, sources='Bing')
+        assert res['meta']['request']['session'] != session
+        assert all(r['sources'] == ['Bing'] for r in res['records'])
+        res = await self.server.search_page('q', 2, 10, session=session, sources='Bing,Google', fusion='rrf')
+        assert res['meta']['request']['session'] != session
+
+
+class Request:
+    def __init__(self, url):
+        self.url = url
+
+
+class PageWaveTest(AsyncTestCase):
+    def _server(self, pages, **kwargs):
+        """
+        :param pages: 第i个检索页的检索结果，None表示下载失败
+        """
+        kwargs.setdefault('page_wave_size', 2)
+        server = make_server(engine_max_results={'Bing': None}, **kwargs)
+        self.fetched = []
+
+        async def get_response(request, name, task, index, deadline, resolve=True, span=None):
+            i = int(request.url)
+            self.fetched.append(i)
+            task.set_result(index, pages[i])
+
+        server._get_response = get_response
+        return server
+
+    async def _process(self, server, n):
+        task = GatherTask(1)
+        await server._process_req_list([Request(str(i)) for i in range(n)], 'Bing', task, 0, time.time() + 10)
+        return task.result[0]
+
+    @staticmethod
+    def _page(i, n=10):
+        return [{'title': 't', 'text': 't', 'url': 'http://www.example.com/{}/{}'.format(i, j)} for j in range(n)]
+
+    @gen_test
+    async def test_all_pages_in_one_wave_by_default(self):
+        pages = [self._page(i) for i in range(3)] + [[]] + [self._page(i) for i in range(4, 8)]
+        server = self._server(pages, page_wave_size=None)
+        res = await self._process(server, 8)
+        assert sorted(self.fetched) == list(range(8))
+        assert len(res) == 70
+
+    @gen_test
+    async def test_wave_growth(self):
+        pages = [self._page(i) for i in range(14)]
+        server = self._server(pages)
+        res = await self._process(server, 14)
+        # 2 + 4 + 8
+        assert sorted(self.fetched) == list(range(14))
+        assert len(res) == 140
+
+    @gen_test
+    async def test_stop_on_short_page(self):
+        pages = [self._page(0), self._page(1), self._page(2), self._page(3, n=2)] + \
+                [self._page(i) for i in range(4, 14)]
+        server = self._server(pages)
+        res = await self._process(server, 14)
+        assert sorted(self.fetched) == [0, 1, 2, 3, 4, 5]
+        assert len(res) == 52
+
+    @gen_test
+    async def test_stop_on_duplicate_pages(self):
+        pages = [self._page(0), self._page(1)] + [self._page(0)] * 12
+        server = self._server(pages)
+        await self._process(server, 14)
+        assert sorted(self.fetched) == list(range(6))
+
+    @gen_test
+    async def test_failed_page_does_not_stop(self):
+        pages = [self._page(0), None] + [self._page(i) for i in range(2, 14)]
+        server = self._server(pages)
+        res = await self._process(server, 14)
+        assert sorted(self.fetched) == list(range(14))
+        assert len(res) == 130
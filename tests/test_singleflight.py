@@ -0,0 +1,72 @@
+# coding=utf-8
+
+import asyncio
+
+from tornado.testing import AsyncTestCase, gen_test
+
+from metase.singleflight import SingleFlight
+
+
+class SingleFlightTest(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = SingleFlight()
+        self.calls = 0
+
+    async def _work(self, value, event=None, error=None):
+        self.calls += 1
+        if event is not None:
+            await event.wait()
+        if error is not None:
+            raise error
+        return value
+
+    @gen_test
+    async def test_share_result(self):
+        event = asyncio.Event()
+        futures = [asyncio.ensure_future(self.flight.do('k', self._work, i, event=event)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert 'k' in self.flight
+        assert len(self.flight) == 1
+        event.set()
+        assert await asyncio.gather(*futures) == [0, 0, 0]
+        assert self.calls == 1
+        assert 'k' not in self.flight
+        assert len(self.flight) == 0
+
+    @gen_test
+    async def test_different_keys(self):
+        res = await asyncio.gather(self.flight.do('a', self._work, 1), self.flight.do('b', self._work, 2))
+        assert res == [1, 2]
+        assert self.calls == 2
+
+    @gen_test
+    async def test_call_again_after_done(self):
+        assert await self.flight.do('k', self._work, 1) == 1
+        assert await self.flight.do('k', self._work, 2) == 2
+        assert self.calls == 2
+
+    @gen_test
+    async def test_share_error(self):
+        event = asyncio.Event()
+        futures = [asyncio.ensure_future(self.flight.do('k', self._work, 0, event=event, error=ValueError('boom')))
+                   for _ in range(2)]
+        await asyncio.sleep(0)
+        event.set()
+        res = await asyncio.gather(*futures, return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in res)
+        assert self.calls == 1
+        assert len(self.flight) == 0
+
+    @gen_test
+    async def test_cancel_one_caller(self):
+        event = asyncio.Event()
+        first = asyncio.ensure_future(self.flight.do('k', self._work, 1, event=event))
+        second = asyncio.ensure_future(self.flight.do('k', self._work, 2, event=event))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        event.set()
+        assert await second == 1
+        assert first.cancelled()
+        assert self.calls == 1
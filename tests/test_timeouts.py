@@ -0,0 +1,55 @@
+# coding=utf-8
+
+from tests.helpers import make_server
+
+
+def add_samples(server, name, stage, latency, n=20):
+    window = server.latency[(name, stage)]
+    for _ in range(n):
+        window.add(latency)
+
+
+def test_stage_timeout_without_enough_samples():
+    server = make_server(adaptive_timeout_min_samples=20)
+    assert server._stage_timeout('Bing', 'page', 8) == 8
+    add_samples(server, 'Bing', 'page', 2.0, n=19)
+    assert server._stage_timeout('Bing', 'page', 8) == 8
+    assert server._stage_timeout('Bing', 'page', -1) == 0
+
+
+def test_stage_timeout_clamps():
+    server = make_server(adaptive_timeout_factor=1.5, adaptive_timeout_min=1)
+    add_samples(server, 'Bing', 'page', 2.0)
+    assert server._stage_timeout('Bing', 'page', 8) == 3.0
+    # 不超过剩余时间
+    assert server._stage_timeout('Bing', 'page', 2) == 2
+    add_samples(server, 'Google', 'page', 0.1)
+    # 不低于adaptive_timeout_min
+    assert server._stage_timeout('Google', 'page', 8) == 1
+
+
+def test_engine_timeout():
+    server = make_server(engine_timeouts={'Google': 5})
+    assert server._engine_timeout('Google', 8) == 5
+    assert server._engine_timeout('Google', 3) == 3
+    assert server._engine_timeout('Bing', 8) == 8
+    add_samples(server, 'Bing', 'page', 2.0)
+    assert server._engine_timeout('Bing', 8) == 3.0
+    assert server._engine_timeout('Bing', -1) == 0
+
+
+def test_engine_timeout_with_real_url_stage():
+    server = make_server(page_stage_share=0.6, adaptive_timeout_factor=1.5, adaptive_timeout_min=1)
+    # 样本不足时不超过剩余时间
+    assert server._engine_timeout('Baidu', 10) == 10
+    add_samples(server, 'Baidu', 'page', 2.0)
+    add_samples(server, 'Baidu', 'url', 0.5)
+    assert server._engine_timeout('Baidu', 10) == 3.0 + 1
+    # 下载检索页的时间不超过剩余时间的page_stage_share
+    assert server._engine_timeout('Baidu', 4) == 4 * 0.6 + 1
+
+
+def test_early_stop_ratio():
+    server = make_server(early_stop_ratio=0.8, early_stop_ratios={'Bing': 0.5})
+    assert server._early_stop_ratio('Bing') == 0.5
+    assert server._early_stop_ratio('Google') == 0.8